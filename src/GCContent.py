@@ -1,7 +1,77 @@
+from functools import partial
+from itertools import repeat
 import matplotlib.pyplot as plt
+import numpy as np
 
 from utility.FileHandlingUtils import FileHandler
+from utility.ParallelUtils import ParallelUtils
 from utility.PlotsUtils import PlotsUtils
+from utility.SequenceUtils import SequenceUtils
+
+
+class GCBins:
+    """
+    Fixed-size counters of the GC content of a stream of reads. Each batch of reads is added in O(reads) time with
+    bincount, so the GC content of every read never needs to be kept, or written to a CSV file and read back in.
+    """
+
+    def __init__(self, binSize=10, keepMembers=False):
+        """
+        :param binSize: The size of the bins, in GC %.
+        :param keepMembers: Whether to also keep the list of sequences in each bin. Off by default, as this holds every
+        sequence in memory.
+        """
+        self.binSize = int(binSize)
+        self.binStarts = list(range(0, 100, self.binSize))
+        self.counts = np.zeros(len(self.binStarts), dtype=np.int64)
+        # GC content is given to 2dp, so it can also be counted exactly, with a counter for each 0.01 %.
+        self.exactCounts = np.zeros(10001, dtype=np.int64)
+        self.members = [[] for _ in self.binStarts] if keepMembers else None
+
+    def update(self, gcContent, sequences=None):
+        """
+        Adds a batch of reads to the counters.
+        :param gcContent: Array of the GC % of each read.
+        :param sequences: The sequences of the reads. Only needed if the members of the bins are kept.
+        """
+        binIndexes = np.minimum(gcContent // self.binSize, len(self.binStarts) - 1).astype(np.int64)
+        self.counts += np.bincount(binIndexes, minlength=len(self.binStarts))
+        self.exactCounts += np.bincount(np.rint(gcContent * 100).astype(np.int64), minlength=10001)
+
+        if self.members is not None and sequences is not None:
+            for sequence, binIndex in zip(sequences, binIndexes.tolist()):
+                self.members[binIndex].append(sequence)
+
+    def consumeProfile(self, batch, profile):
+        """
+        Adds a batch of reads profiled by ReadProfiler to the counters, so that the GC content is not found again.
+        :param batch: The ReadBatch of the reads.
+        :param profile: The profile of the batch, from ReadProfiler.profileBatch().
+        """
+        self.update(profile["GC"], batch.getSequences() if self.members is not None else None)
+
+    def getExactValues(self):
+        """
+        :return: Array of the GC % that each of the exact counters is for.
+        """
+        return np.arange(10001) / 100
+
+    def getBinnedData(self):
+        """
+        Gives the bins in the same form as GCCalculator.binByGCContent().
+        :return: Dictionary containing the bins, and the count of reads in each, or the list of sequences in each if
+        the members are kept.
+        """
+        binnedData = dict()
+
+        for index, binStart in enumerate(self.binStarts):
+            if self.members is not None:
+                binnedData.update({f"{binStart} - {binStart + self.binSize}": self.members[index]})
+
+            else:
+                binnedData.update({f"{binStart} - {binStart + self.binSize}": int(self.counts[index])})
+
+        return binnedData
 
 
 class GCCalculator:
@@ -16,6 +86,8 @@ class GCCalculator:
     def GCCounter(self, data):
         """
         Helper function that finds the overall GC content of all the kmers.
+        :param data: A dictionary with the sequences as keys, or any iterable of sequences, such as
+        FileHandler.iterSequences().
         :return: A dictionary containing the kmer and the overall GC content of it.
         """
         if data is None:  # If there is no data to process, return none
@@ -28,16 +100,85 @@ class GCCalculator:
 
             return outputData
 
-    def calculateAndWriteToCSV(self, filepath, outputFilename="gc_counts_total_and_bases"):
+    def getGCContentBatch(self, batch):
+        """
+        Finds the GC content, base composition and N content of every read in a batch at once. The reads are encoded
+        into a uint8 array and counted in a single vectorised pass, rather than one read at a time.
+        :param batch: A ReadBatch of the reads.
+        :return: A dictionary of arrays, with a value for each read: "GC" is the GC % to 2dp, as getGCContent()
+        gives, "A", "C", "G", "T" and "N" are the counts of each base, and "Length" is the length of the read.
+        """
+        counts, lengths = SequenceUtils().countBases(batch)
+
+        return {"GC": self.getGCContentFromCounts(counts, lengths), "A": counts[:, 0], "C": counts[:, 1],
+                "G": counts[:, 2], "T": counts[:, 3], "N": counts[:, 4], "Length": lengths}
+
+    def getGCContentFromCounts(self, counts, lengths):
+        """
+        Finds the GC content of reads whose bases have already been counted, such as by SequenceUtils.countBases().
+        :param counts: Matrix of the counts of A, C, G, T and N, with a row for each read.
+        :param lengths: Array of the length of each read.
+        :return: Array of the GC % of each read, to 2dp.
+        """
+        gcContent = np.zeros(len(lengths))
+        np.divide((counts[:, 1] + counts[:, 2]) * 100, lengths, out=gcContent, where=lengths > 0)
+
+        return np.round(gcContent, 2)
+
+    def streamGCContent(self, filepath, bins):
+        """
+        Streams the GC content of every read in a file, a batch at a time, adding each batch to the bin counters as it
+        goes.
+        :param filepath: The file of reads.
+        :param bins: A GCBins object to update.
+        :return: Yields a [sequences, GC content] batch of columns for each batch of reads.
+        """
+        handler = FileHandler()
+
+        for batch in handler.iterBatches(filepath):
+            gcContent = self.getGCContentBatch(batch)["GC"]
+            sequences = batch.getSequences()
+            bins.update(gcContent, sequences)
+
+            yield [sequences, gcContent]
+
+    def calculateAndWriteToCSV(self, filepath, outputFilename="gc_counts_total_and_bases", batchMode=True,
+                               bins=None, writeCSV=True):
         """
         Function that calculates the traits of the sequences, and writes them to an output CSV file.
         :param filepath: The file of data for the traits to be calculated from.
         :param outputFilename: The name of the file to be outputted.
-        :return: The found data, and the filename.
+        :param batchMode: If True, the reads are processed in batches by getGCContentBatch(), and every read is
+        written, including repeated sequences. If False, GCCounter() is used.
+        :param bins: The GCBins to count the reads into in batch mode. A new one with the default bin size is made if
+        this is not given.
+        :param writeCSV: Whether to write the CSV file in batch mode. The bins are filled either way.
+        :return: The found data, and the filename. In batch mode, the data is the GCBins, so that the GC content of
+        each read does not need to be held in memory.
         """
         handler = FileHandler()
-        data = handler.getDataFromInputFile(filepath)
-        total = self.GCCounter(data)
+
+        if batchMode:
+            if bins is None:
+                bins = GCBins()
+
+            batches = self.streamGCContent(filepath, bins)
+
+            if writeCSV:
+                try:
+                    handler.writeColumnsToCSV(["Sequence", "Total GC content"], batches, outputFile=outputFilename)
+
+                except FileNotFoundError:
+                    print("File entered not found. Please try again.")
+
+            else:
+                for _ in batches:
+                    continue
+
+            return bins, outputFilename
+
+        # Streams the sequences, rather than holding every record of the input file in memory.
+        total = self.GCCounter(handler.iterSequences(filepath))
 
         try:
             handler.writeToCSVConvertData(
@@ -88,10 +229,21 @@ class GCCalculator:
 
         return binnedData
 
+    def getBinHeight(self, binValue):
+        """
+        Finds the height of a bar in the bar chart, from a bin made by either binByGCContent() or GCBins.
+        :param binValue: The list of k-mers in the bin, or the count of the bin.
+        :return: The height of the bar, which is the number of reads in the bin either way.
+        """
+        if type(binValue) == list:
+            return len(binValue)
+
+        return binValue
+
     def plotBarChart(self, binnedData, filename="GC_content_bar", yLabel="Default", xLabel="Default", title="Default"):
         """
         Plots a bar chart from data found by other functions in this class.
-        :param binnedData: Data, which has been binned using binByGCContent() function.
+        :param binnedData: Data, which has been binned using binByGCContent() function, or GCBins.getBinnedData().
         :param filename: Name of output plot.
         :param yLabel: Y label for the plot
         :param xLabel: X label for the plot.
@@ -102,21 +254,37 @@ class GCCalculator:
         if len(binnedData) > 1:
             for index, dictionary in enumerate(binnedData):
                 plots.makeBarChart([item for item in dictionary.keys()],
-                                   [len(item) - 1 for item in dictionary.values()],
+                                   [self.getBinHeight(item) for item in dictionary.values()],
                                    axs[index], yLabel, xLabel, title)
 
         else:
             plots.makeBarChart([item for item in binnedData[0].keys()],
-                               [len(item) - 1 for item in binnedData[0].values()],
+                               [self.getBinHeight(item) for item in binnedData[0].values()],
                                axs, yLabel, xLabel, title)
 
         plt.savefig(f"../Data/output/plots/{filename}.png", bbox_inches="tight")
 
+    def plotHistogramOnAxes(self, plots, data, barColour, ax):
+        """
+        Plots a single histogram of GC content, from either a dataframe of a CSV file, or GCBins.
+        :param plots: The PlotsUtils object to plot with.
+        :param data: The dataframe, or GCBins.
+        :param barColour: The colour of the bars.
+        :param ax: The axes to plot on.
+        """
+        if isinstance(data, GCBins):
+            plots.makeHistogramFromCounts(data.getExactValues(), data.exactCounts, "", "", "",
+                                          barColour=barColour, ax=ax)
+
+        else:
+            plots.makeHistogram(data.loc[:, "Total GC content"], "", "", "", barColour=barColour, ax=ax)
+
     def plotHistograms(self, files, yLabel="Count", xLabel="", title="", barColour="blue", filename="histogram"):
         """
         Plots histograms from data taken from input file(s). If multiple files are inputted, multiple plots are added to
         the same figure.
-        :param files: Input files, from the -f command line option
+        :param files: Input files, from the -f command line option. GCBins can be passed instead of CSV files, in
+        which case the histogram is drawn from the bin counters without reading a file.
         :param yLabel: Y label for
         :param xLabel:
         :param title:
@@ -129,17 +297,19 @@ class GCCalculator:
         handler = FileHandler()
 
         for file in files:
-            dataframes.append(handler.convertCSVToDataFrame(file))
+            if isinstance(file, GCBins):
+                dataframes.append(file)
+
+            else:
+                dataframes.append(handler.convertCSVToDataFrame(file))
 
         fig, axs = plt.subplots(len(files))
         if len(files) > 1:
             for index, ax in enumerate(axs):
-                plots.makeHistogram(dataframes[index].loc[:, "Total GC content"], "", "", "",
-                                    barColour=barColour, ax=ax)
+                self.plotHistogramOnAxes(plots, dataframes[index], barColour, ax)
 
         else:
-            plots.makeHistogram(dataframes[0].loc[:, "Total GC content"], "", "", "",
-                                barColour=barColour, ax=axs)
+            self.plotHistogramOnAxes(plots, dataframes[0], barColour, axs)
 
         fig.suptitle(title)
         fig.supxlabel(xLabel)
@@ -174,9 +344,53 @@ class GCCalculator:
 
         return outputData
 
+    def processFile(self, filepath, outputFilename, binSize=10, batchMode=True, keepMembers=False, writeCSV=True,
+                    cache=None):
+        """
+        Finds the GC content of the reads of one file for main(), and bins them.
+        :param filepath: The input file.
+        :param outputFilename: The name of the CSV file of the GC content of each read.
+        :param binSize: Size of bins to use to bin the data
+        :param batchMode: As in main().
+        :param keepMembers: As in main().
+        :param writeCSV: As in main().
+        :param cache: A ResultCache to restore the bins and the CSV file from, if the file has been binned before with
+        the same options. If None, the file is always processed.
+        :return: A tuple of the binned data, and the GCBins in batch mode or None otherwise.
+        """
+        print(filepath)
+        binFile = partial(self.binFile, filepath, outputFilename, int(binSize), batchMode, keepMembers, writeCSV)
+
+        if cache is None:
+            return binFile()
+
+        parameters = {"binSize": int(binSize), "batchMode": batchMode, "keepMembers": keepMembers,
+                      "writeCSV": writeCSV, "format": FileHandler.outputFormat}
+        return cache.run("gc", [filepath], parameters, {"table": FileHandler().getOutputPath(outputFilename)}, binFile)
+
+    def binFile(self, filepath, outputFilename, binSize=10, batchMode=True, keepMembers=False, writeCSV=True):
+        """
+        Finds the GC content of the reads of one file, and bins them. Called by processFile().
+        :param filepath: The input file.
+        :param outputFilename: The name of the CSV file of the GC content of each read.
+        :param binSize: Size of bins to use to bin the data
+        :param batchMode: As in main().
+        :param keepMembers: As in main().
+        :param writeCSV: As in main().
+        :return: A tuple of the binned data, and the GCBins in batch mode or None otherwise.
+        """
+        if batchMode:
+            bins = GCBins(binSize, keepMembers)
+            self.calculateAndWriteToCSV(filepath, outputFilename, batchMode, bins, writeCSV)
+            return bins.getBinnedData(), bins
+
+        self.calculateAndWriteToCSV(filepath, outputFilename, batchMode)
+        return self.binByGCContent(FileHandler().getOutputPath(outputFilename), binSize), None
+
     def main(self, files, barChart=True, histogram=True, csvFileName="gc_counts_total_and_bases",
              binSize=10, yLabel="Number of sequences", xLabel="Bin", title="Plot of GC content",
-             histName="output_histogram", barName="output_bar_chart"):
+             histName="output_histogram", barName="output_bar_chart", batchMode=True, keepMembers=False,
+             writeCSV=True, workers=1, cache=None):
         """
         Main function for this class. creates histogram(s) and bar chart(s) by default.
         :param files: Input files
@@ -189,20 +403,33 @@ class GCCalculator:
         :param title: Title for the figures
         :param histName: Output histogram name
         :param barName: Output bar chart name
+        :param batchMode: Whether to find the GC content with the vectorised batch functions. Default True. In batch
+        mode, the reads are binned as they are streamed, and the CSV file is not read back in.
+        :param keepMembers: In batch mode, whether to keep the list of sequences in each bin, rather than just the count.
+        :param writeCSV: In batch mode, whether to write the CSV file of the GC content of each read.
+        :param workers: The number of files to process at once, each in its own process. Default 1.
+        :param cache: A ResultCache, so that files processed before with the same options are not processed again.
+        Only the plots are made again. Default None, for no caching.
         """
-
-        count = 0
-        binnedData = []
-        for filepath in files:
-            print(filepath)
-            dictOfData, _ = self.calculateAndWriteToCSV(filepath, f"{csvFileName}{count}")
-            binnedData.append(self.binByGCContent(f"../Data/output/csv/{csvFileName}{count}.csv", binSize))
-            count += 1
+        # Each file is processed independently, in its own process if there are several workers. The results are
+        # gathered here for the plots of all the files.
+        results = ParallelUtils(workers).mapOverFiles(self.processFile, files,
+                                                      [f"{csvFileName}{count}" for count in range(len(files))],
+                                                      repeat(binSize), repeat(batchMode), repeat(keepMembers),
+                                                      repeat(writeCSV), repeat(cache))
+        binnedData = [binned for binned, _ in results]
+        allBins = [bins for _, bins in results]
 
         if barChart:
             self.plotBarChart(binnedData, barName, yLabel, xLabel, title)
 
-        filesForHistograms = [f"../Data/output/csv/{csvFileName}{x}.csv" for x in range(0, len(files))]
+        if batchMode:
+            filesForHistograms = allBins
+
+        else:
+            handler = FileHandler()
+            filesForHistograms = [handler.getOutputPath(f"{csvFileName}{x}") for x in range(0, len(files))]
+
         if histogram:
             self.plotHistograms(filesForHistograms, yLabel, xLabel, title, filename=histName)
 
@@ -1,9 +1,16 @@
+import os
+import shutil
 import subprocess
+from functools import partial
 from utility.FileHandlingUtils import FileHandler
 from utility.DataUtils import DataUtils
 
 
 class Assembler:
+    # Where callMegahit() writes the assembly, and the assembly itself.
+    megahitDirectory = "../Data/intermediary/megahit"
+    contigsFile = "../Data/intermediary/megahit/final.contigs.fa"
+
     def __init__(self):
         dataUtils = DataUtils()
         if dataUtils.isPackageInstalled("megahit") and dataUtils.isPackageInstalled("bowtie2"):
@@ -16,10 +23,16 @@ class Assembler:
         """
         Calls Megahit to assemble the reads in the input files. These must be fastq files.
         :param inputFiles: List of input files
+        :return: Whether the assembly was made.
         """
-        command = f"megahit -o ../Data/intermediary/megahit -r {inputFiles}"
+        # Megahit will not run if its output directory exists, so the assembly of the last run is removed first.
+        shutil.rmtree(self.megahitDirectory, ignore_errors=True)
+
+        command = f"megahit -o {self.megahitDirectory} -r {inputFiles}"
         # Call Megahit to assemble the file(s) passed to it. This works because parsed.f is a list of files.
-        subprocess.run(command.split(" "))
+        completed = subprocess.run(command.split(" "))
+
+        return completed.returncode == 0 and os.path.exists(self.contigsFile)
 
     def callBowtie(self, genomeFileName, inputFiles, unmappedReadsFileName, mappedReadsFileName):
         """
@@ -29,19 +42,62 @@ class Assembler:
         :param unmappedReadsFileName: Name of output file of unmapped reads.
         :param mappedReadsFileName: Name of output file of mapped reads.
         """
-        createGenome = f"bowtie2-build -q ../Data/intermediary/megahit/final.contigs.fa " \
+        self.buildIndex(genomeFileName)
+        self.alignReads(genomeFileName, inputFiles, unmappedReadsFileName, mappedReadsFileName)
+
+    def buildIndex(self, genomeFileName):
+        """
+        Calls bowtie2-build to index the assembly created with callMegahit() function.
+        :param genomeFileName: Name of the binary files created by Bowtie2
+        :return: Whether the index was made.
+        """
+        createGenome = f"bowtie2-build -q {self.contigsFile} " \
                        f"../Data/intermediary/bowtie/{genomeFileName} "
-        subprocess.run(createGenome.split(" "))  # Creates a custom bowtie genome, to allow it to find the mapped reads.
+        # Creates a custom bowtie genome, to allow it to find the mapped reads.
+        return subprocess.run(createGenome.split(" ")).returncode == 0
 
+    def alignReads(self, genomeFileName, inputFiles, unmappedReadsFileName, mappedReadsFileName):
+        """
+        Calls bowtie2 to align the reads to the index made by buildIndex().
+        :param genomeFileName: Name of the binary files created by Bowtie2
+        :param inputFiles: Input files
+        :param unmappedReadsFileName: Name of output file of unmapped reads.
+        :param mappedReadsFileName: Name of output file of mapped reads.
+        :return: Whether bowtie2 succeeded.
+        """
         findUnmapped = f"bowtie2 --quiet -t --no-hd -x ../Data/intermediary/bowtie/{genomeFileName} -U {inputFiles} " \
                        f"--un ../Data/output/bowtie/{unmappedReadsFileName}.fa " \
                        f"--al ../Data/output/bowtie/{mappedReadsFileName}.fa"
         # Searches the created genome against the input files. Again, supports list of .fasta files input so will work.
 
-        subprocess.run(findUnmapped.split())
+        return subprocess.run(findUnmapped.split()).returncode == 0
+
+    def runStep(self, name, function, *args):
+        """
+        Runs a step of main() for a ResultCache, raising an error if it fails, so that the cache does not store it.
+        :param name: The name of the step, for the error.
+        :param function: The step, which returns whether it succeeded.
+        :param args: The arguments of the step.
+        """
+        if not function(*args):
+            raise RuntimeError(f"{name} failed, so the unmapped reads could not be found.")
+
+    def getIndexFiles(self, genomeFileName):
+        """
+        :param genomeFileName: Name of the binary files created by Bowtie2
+        :return: Dictionary of the name and path of each file of the index. Large genomes are given .bt2l files
+        instead of .bt2, so both are listed.
+        """
+        indexFiles = dict()
+        for suffix in (".1", ".2", ".3", ".4", ".rev.1", ".rev.2"):
+            for extension in (".bt2", ".bt2l"):
+                indexFiles[f"index{suffix}{extension}"] = \
+                    f"../Data/intermediary/bowtie/{genomeFileName}{suffix}{extension}"
+
+        return indexFiles
 
     def main(self, inputFiles, genomeFileName="bowtieGenome", unmappedFileName="unmappedReads",
-             mappedFileName="mappedReads"):
+             mappedFileName="mappedReads", cache=None):
         """
         The main function in this class. Calls all required fucntions to make an assembly,
         align the set of original reads, and find the mapped and unmapped reads.
@@ -49,13 +105,39 @@ class Assembler:
         :param genomeFileName: Name of binary files produced by Bowtie2-build
         :param unmappedFileName: Name of output file of unmapped reads.
         :param mappedFileName: Name of output file of mapped reads.
+        :param cache: A ResultCache, so that the assembly, the Bowtie2 index and the alignment are each restored rather
+        than made again, if their input files have not changed. Default None, for no caching.
         """
         if self.installed:
             filesForTools = ", ".join(inputFiles)
-            # Creates assembly.
-            self.callMegahit(filesForTools)
-            # Finds mapped and unmapped reads.
-            self.callBowtie(genomeFileName, filesForTools, unmappedFileName, mappedFileName)
+
+            if cache is None:
+                # Creates assembly.
+                if not self.callMegahit(filesForTools):
+                    print("Megahit failed, so the unmapped reads could not be found.")
+                    return
+
+                # Finds mapped and unmapped reads.
+                self.callBowtie(genomeFileName, filesForTools, unmappedFileName, mappedFileName)
+                return
+
+            # An assembly made again has a new modification time, even from the same reads, so the later stages are
+            # keyed by the key of the assembly stage, rather than by the assembly file.
+            assemblyKey = cache.findKey("megahit", inputFiles, {})
+            try:
+                cache.run("megahit", inputFiles, {}, {"contigs": self.contigsFile},
+                          partial(self.runStep, "Megahit", self.callMegahit, filesForTools))
+                # The index depends only on the assembly.
+                cache.run("bowtie2-build", [], {"assembly": assemblyKey}, self.getIndexFiles(genomeFileName),
+                          partial(self.runStep, "bowtie2-build", self.buildIndex, genomeFileName))
+                cache.run("bowtie2", inputFiles, {"assembly": assemblyKey},
+                          {"unmapped": f"../Data/output/bowtie/{unmappedFileName}.fa",
+                           "mapped": f"../Data/output/bowtie/{mappedFileName}.fa"},
+                          partial(self.runStep, "bowtie2", self.alignReads, genomeFileName, filesForTools,
+                                  unmappedFileName, mappedFileName))
+
+            except RuntimeError as error:
+                print(error)
 
         else:
             print("Please check installations of Bowtie2 and Megahit.")
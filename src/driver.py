@@ -1,9 +1,15 @@
 import argparse
 import traceback
+from itertools import repeat
 
 from jellyfishForKmers import JellyFish
+from kmerCounter import KmerCounter
+from utility.KmerTableUtils import KmerCountTable
+from utility.CacheUtils import ResultCache
+from utility.ParallelUtils import ParallelUtils
 from entropyFinder import EntropyFinder
 from GCContent import GCCalculator
+from readProfiler import ReadProfiler
 from similarityCalculator import FindMatches
 from utility.DataUtils import *
 from utility.StatisticsUtils import Statistics as Stats
@@ -11,44 +17,153 @@ from assembleAndFindUnmapped import Assembler
 from BLAST import BLAST
 
 
+def countKmersOfFile(file, count, k, useNative, canonical, writeCSV, finder, cache=None):
+    """
+    Counts the k-mers of one input file, with Jellyfish or the native counter. Run for each file by
+    searchFilesWithJellyfish(), in a worker process if there are several workers.
+    :param file: The input file.
+    :param count: The index of the file, which the output names are keyed by.
+    :param k: The length of the k-mers.
+    :param useNative: Whether to use the native counter.
+    :param canonical: Whether the native counter counts canonical k-mers.
+    :param writeCSV: Whether to write a csv file of the counts.
+    :param finder: The JellyFish instance.
+    :param cache: A ResultCache to restore the counts from, if the file has been counted before with the same
+    options. If None, the file is always counted.
+    """
+    print(file)
+    # The counts are saved as tables. A CSV file of them is only written if asked for.
+    csvName = f"{k}mer_output{count}" if writeCSV else None
+    tableName = f"{k}mer_counts{count}"
+
+    def countKmers():
+        if useNative:
+            KmerCounter(k, canonical=canonical).runKmerCounter(file, tableName=tableName, csvName=csvName)
+
+        else:
+            finder.runJellyfish(file, k, tableName=tableName, csvName=csvName)
+
+    try:
+        if cache is None:
+            countKmers()
+
+        else:
+            tablePath = f"../Data/intermediary/{tableName}"
+            artifacts = {"counts": f"{tablePath}.npy", "header": f"{tablePath}.json",
+                         "codes": f"{tablePath}.codes.npy"}
+            if writeCSV:
+                artifacts["csv"] = FileHandler().getOutputPath(csvName)
+
+            # Jellyfish does not count canonical k-mers here, so the option only changes the native counts.
+            parameters = {"k": k, "engine": "native" if useNative else "jellyfish",
+                          "canonical": canonical and useNative, "writeCSV": writeCSV,
+                          "format": FileHandler.outputFormat}
+            cache.run("kmers", [file], parameters, artifacts, countKmers)
+    except:
+        print("An error has occurred with Jellyfish. The accepted filetypes are fasta and fastq.")
+        print(traceback.format_exc())
+
+
 def searchFilesWithJellyfish():
     finder = JellyFish()
-    count = 0
-    for file in parsed.f:
-        print(file)
-        try:
-            if parsed.k:
-                finder.runJellyfish(file, parsed.k, jellyfishOutputFile=f"{parsed.k}mer_counts{count}.fa",
-                                    csvName=f"{parsed.k}mer_output{count}")
+    k = 7
+    if parsed.k:
+        k = int(parsed.k)
+
+    # The native counter is used if asked for, or if Jellyfish is not installed.
+    useNative = parsed.kmer_engine == "native" or not finder.packageInstalled
+    if useNative and parsed.kmer_engine != "native":
+        print("Counting kmers with the native counter instead.")
+
+    ParallelUtils(getWorkers()).mapOverFiles(countKmersOfFile, parsed.f, range(len(parsed.f)), repeat(k),
+                                             repeat(useNative), repeat(parsed.canonical == "True"),
+                                             repeat(parsed.kmer_csv == "True"), repeat(finder), repeat(getCache()))
 
-            else:
-                finder.runJellyfish(file, jellyfishOutputFile=f"7mer_counts{count}.fa",
-                                    csvName=f"7mer_output{count}")
-        except:
-            print("An error has occurred with Jellyfish. The accepted filetypes are fasta and fastq.")
-            print(traceback.format_exc())
 
-        count += 1
+def getCache():
+    """
+    :return: A ResultCache if -use_cache is True, of the size set with -cache_size, or None.
+    """
+    if parsed.use_cache != "True":
+        return None
+
+    if parsed.cache_size:
+        return ResultCache(maxSize=int(float(parsed.cache_size) * 1024 ** 3))
+
+    return ResultCache()
+
+
+def getWorkers():
+    """
+    :return: The number of processes set with -workers. Default 1.
+    """
+    if parsed.workers:
+        return int(parsed.workers)
 
+    return 1
 
-def proportionsStatsTest(filePath, outputfile="hypothesis_test_results", significanceLevel=0.05):
+
+def isKmerUnion():
+    """
+    :return: Whether k-mers found in only one of the files are compared, with a count of 0 in the other, as set with
+    -kmer_union. Default True.
+    """
+    if parsed.kmer_union:
+        return parsed.kmer_union != "False"
+
+    return True
+
+
+def loadKmerTables():
+    """
+    Loads the tables of k-mer counts of the first two files, saved by searchFilesWithJellyfish().
+    :return: A tuple of the two KmerCountTables.
+    """
+    k = parsed.k if parsed.k else 7
+    return (KmerCountTable.load(f"../Data/intermediary/{k}mer_counts0"),
+            KmerCountTable.load(f"../Data/intermediary/{k}mer_counts1"))
+
+
+def writeKmerComparison(tableOne, tableTwo, csvName):
+    """
+    Writes the raw and normalised counts of the k-mers of two tables to a CSV file.
+    :param tableOne: The first KmerCountTable.
+    :param tableTwo: The second KmerCountTable.
+    :param csvName: Name of the output CSV file.
+    """
+    handler = FileHandler()
+    handler.writeToCSVConvertData(["kmer", "Num in set one", "Num in set Two", "Raw Difference",
+                                   "Normalised in set One", "Normalised set Two", "Norm Difference"],
+                                  dataUtils.getRawAndNormalisedFromTables(tableOne, tableTwo, isKmerUnion()),
+                                  outputFile=csvName)
+
+
+def proportionsStatsTest(tableOne, tableTwo, outputfile="hypothesis_test_results", significanceLevel=0.05):
     """
     Runs a hypothesis test on the proportions of the k-mers in two files.
-    :param filePath:
+    :param tableOne: The KmerCountTable of the first file.
+    :param tableTwo: The KmerCountTable of the second file.
     :param outputfile: Name of the output file.
     :param significanceLevel: The level of significance to test on.
     """
     if significanceLevel != 0.05:
-        statsFinder = Stats(significanceLevel=significanceLevel)
+        statsFinder = Stats(significanceLevel=float(significanceLevel))
 
     else:
         statsFinder = Stats()
 
-    try:
-        statsFinder.testProportions(filepath=f"../Data/output/csv/{filePath}.csv", outputFile=outputfile)
+    sample = False
+    if parsed.sample_kmers:
+        sample = parsed.sample_kmers == "True"
 
-    except FileNotFoundError:
-        print(f"File ../Data/output/csv/{filePath} not found.")
+    topK = None
+    if parsed.top_kmers:
+        topK = int(parsed.top_kmers)
+
+    statsFinder.testProportionsOfTables(tableOne, tableTwo, outputFile=outputfile, sample=sample,
+                                        correction=parsed.p_correction,
+                                        significantOutputFile=parsed.significant_kmers_name, topK=topK,
+                                        union=isKmerUnion())
 
 
 def findEntropy(yLabelForGraph="Entropy", xLabelForGraph="Position in Dictionary",
@@ -88,18 +203,17 @@ def findEntropy(yLabelForGraph="Entropy", xLabelForGraph="Position in Dictionary
 
     calculator = EntropyFinder()
 
-    count = 0
-    for file in parsed.f:
-        calculator.main(file, yLabelForGraph, xLabelForGraph, title,
-                        plotName=f"{plotName}_for_file{count}",
-                        outlierFileName=f"{csvFileName}_for_file_{count}",
-                        allEntropyFileName=f"all_entropies_for_file_{count}",
-                        lineChart=lineChart)
-
-        count += 1
+    # The files are processed at once if there are several workers. The strip plot of all of them is made after.
+    ParallelUtils(getWorkers()).mapOverFiles(calculator.main, parsed.f, repeat(yLabelForGraph), repeat(xLabelForGraph),
+                                             repeat(title),
+                                             [f"{plotName}_for_file{count}" for count in range(len(parsed.f))],
+                                             [f"{csvFileName}_for_file_{count}" for count in range(len(parsed.f))],
+                                             [f"all_entropies_for_file_{count}" for count in range(len(parsed.f))],
+                                             repeat(lineChart), repeat(True), repeat(getCache()))
 
     if stripPlot:
-        files = [f"../Data/output/csv/all_entropies_for_file_{count}.csv" for count in range(0, len(parsed.f))]
+        handler = FileHandler()
+        files = [handler.getOutputPath(f"all_entropies_for_file_{count}") for count in range(0, len(parsed.f))]
         if parsed.output_strip_plot_name:
             calculator.createStripPlots(files, title=title, filename=parsed.output_strip_plot_name)
 
@@ -167,21 +281,87 @@ def findGC(yLabelForGraph="Entropy", xLabelForGraph="Position in Dictionary",
     try:
         calculator.main(parsed.f, barChart, histogram, csvFileName=f"{csvFileName}", binSize=binSize,
                         yLabel=yLabelForGraph, xLabel=xLabelForGraph, title=title, histName=histName,
-                        barName=barName)
+                        barName=barName, workers=getWorkers(), cache=getCache())
 
     except FileNotFoundError:
         print(f"One file in files parsed not found for gc content calculation. Please try again.")
         print(traceback.format_exc())
 
 
-def findSimilar(number=3, cutoff=0.6, sampleFirst=True, sampleSecond=True, percentage=0.001, seed="Random",
+def profileReads(yLabelForGraph="Number of sequences", xLabelForGraph="Bin", title="Default",
+                 profileName="read_profile", histName="output_histogram", barName="output_bar_chart",
+                 stripPlotName="strip_plots", outlierFileName="entropy_outliers", histogram=True, barChart=True,
+                 stripPlot=True, binSize=10):
+    """
+    Provides the interface between the command line and the read profiler. Gives the outputs of -find_gc and
+    -find_entropy from one pass over each file.
+    :param yLabelForGraph: The y labels for the GC graphs.
+    :param xLabelForGraph: The x labels for the GC graphs.
+    :param title: Titles for graphs.
+    :param profileName: Name of the CSV files of the per-read profiles.
+    :param histName: The name of the output histogram file.
+    :param barName: The name of the output bar chart.
+    :param stripPlotName: The name of the output strip plot.
+    :param outlierFileName: Name of the CSV files of entropy outliers.
+    :param histogram: Whether to produce a histogram.
+    :param barChart: Whether to produce a bar chart.
+    :param stripPlot: Whether to produce a strip plot.
+    :param binSize: The bin size for the GC content. Default 10.
+    """
+    if parsed.yLabel:
+        yLabelForGraph = parsed.yLabel
+
+    if parsed.xLabel:
+        xLabelForGraph = parsed.xLabel
+
+    if parsed.title:
+        title = parsed.title
+
+    if parsed.csv_filename:
+        profileName = parsed.csv_filename
+
+    if parsed.hist_name:
+        histName = parsed.hist_name
+
+    if parsed.bar_name:
+        barName = parsed.bar_name
+
+    if parsed.output_strip_plot_name:
+        stripPlotName = parsed.output_strip_plot_name
+
+    if parsed.bar_chart:
+        barChart = parsed.bar_chart != "False"
+
+    if parsed.histogram:
+        histogram = parsed.histogram != "False"
+
+    if parsed.strip_plot:
+        stripPlot = parsed.strip_plot != "False"
+
+    if parsed.bin_size:
+        binSize = int(parsed.bin_size)
+
+    profiler = ReadProfiler()
+
+    try:
+        profiler.main(parsed.f, profileName, binSize, barChart, histogram, stripPlot, yLabelForGraph, xLabelForGraph,
+                      title, histName, barName, stripPlotName, outlierFileName, workers=getWorkers(),
+                      cache=getCache())
+
+    except FileNotFoundError:
+        print(f"One file in files parsed not found for profiling. Please try again.")
+        print(traceback.format_exc())
+
+
+def findSimilar(number=3, cutoff=0.6, sampleFirst=False, sampleSecond=False, percentage=0.001, seed="Random",
                 outputCSVName="default_csv_name", produceHistogram=True, outputHistogramName="default_histogram",
-                xLabel="Default", yLabel="Default", title="Default"):
+                xLabel="Default", yLabel="Default", title="Default", workers=1):
     """
     Function that provides an interface between the command line and the similarity calculator class.
     :param number: The number of the closest matches to find. Default 3.
     :param cutoff: The value of the cutoff, for which after no more matches are found. Default 0.6.
-    :param sampleFirst: Whether the program should sample the first set or not.
+    :param sampleFirst: Whether the program should sample the first set or not. Default False, as the SimilarityIndex
+    can compare the whole sets.
     :param sampleSecond: As above.
     :param percentage: The percentage of the sets to sample.
     :param seed: Sets the seed for the sample. Default random.
@@ -192,6 +372,7 @@ def findSimilar(number=3, cutoff=0.6, sampleFirst=True, sampleSecond=True, perce
     :param xLabel: X Label for histogram.
     :param yLabel: Y Label for histogram.
     :param title: Title for histogram.
+    :param workers: The number of processes to compare the sequences with. Default 1.
     :return:
     """
 
@@ -199,13 +380,13 @@ def findSimilar(number=3, cutoff=0.6, sampleFirst=True, sampleSecond=True, perce
         number = parsed.number_of_closest
 
     if parsed.cutoff:
-        cutoff = int(parsed.cutoff)
+        cutoff = float(parsed.cutoff)
 
     if parsed.sample_first:
-        sampleFirst = parsed.sample_first
+        sampleFirst = parsed.sample_first == "True"
 
     if parsed.sample_second:
-        sampleSecond = parsed.sample_second
+        sampleSecond = parsed.sample_second == "True"
 
     if parsed.sample_percentage:
         percentage = float(parsed.sample_percentage)
@@ -231,11 +412,14 @@ def findSimilar(number=3, cutoff=0.6, sampleFirst=True, sampleSecond=True, perce
     if parsed.hist_name:
         outputHistogramName = parsed.hist_name
 
+    if parsed.workers:
+        workers = getWorkers()
+
     files = parsed.f
     if len(files) != 2:
         print("Error: There must be 2 for comparison")
 
-    matches = FindMatches(number, cutoff)
+    matches = FindMatches(int(number), cutoff, workers)
 
     try:
         matches.main(files[0], files[1], sampleFirst, sampleSecond, percentage, seed, outputCSVName,
@@ -246,20 +430,42 @@ def findSimilar(number=3, cutoff=0.6, sampleFirst=True, sampleSecond=True, perce
         print(f"File {files[0]} or {files[1]} not found. Please try again.")
 
 
-def getUnmappedReads(outputFilename="unmapped_reads"):
+def getUnmappedReads(outputFilename="unmapped_reads", matchBy="sequence", backend="hash", falsePositiveRate=0.01,
+                     filterFile=None, exactRecheck=False):
     """
     Function to provide the functionality to get the unmapped reads from an assembly and a set of reads.
     :param outputFilename: The name of the file to output.
+    :param matchBy: Whether to match reads by "sequence" or read "id".
+    :param backend: "hash" to hold a set of hashes of the mapped reads, or "bloom" to use a Bloom filter of them.
+    :param falsePositiveRate: The false positive rate of the Bloom filter.
+    :param filterFile: File to save the Bloom filter to, or load it from if it already exists.
+    :param exactRecheck: Whether to recheck reads flagged by the Bloom filter, so that none are missed.
     :return:
     """
     if parsed.fastq_name:
         outputFilename = parsed.fastq_name
 
+    if parsed.match_by:
+        matchBy = parsed.match_by
+
+    if parsed.unmapped_backend:
+        backend = parsed.unmapped_backend
+
+    if parsed.bloom_fp_rate:
+        falsePositiveRate = float(parsed.bloom_fp_rate)
+
+    if parsed.bloom_file:
+        filterFile = f"../Data/intermediary/{parsed.bloom_file}.npz"
+
+    if parsed.bloom_recheck:
+        exactRecheck = parsed.bloom_recheck == "True"
+
     files = parsed.f
 
     try:
         handler = FileHandler()
-        handler.writeToFASTQ(handler.getUnmappedReads(files[0], files[1]), outputName=outputFilename)
+        handler.writeToFASTQ(handler.iterUnmappedReads(files[0], files[1], matchBy, backend, falsePositiveRate,
+                                                       filterFile, exactRecheck), outputName=outputFilename)
         print(f"Unmapped reads found and written to '../Data/output/fastq/{outputFilename}.fastq'")
 
     except FileNotFoundError:
@@ -321,7 +527,7 @@ def assembleAndFindUnmapped(assemblyFileName="bowtieGenome", mappedReadsFileName
         unmappedReadsFileName = parsed.unmapped_reads_file_name
 
     assembler = Assembler()
-    assembler.main(parsed.f, assemblyFileName, unmappedReadsFileName, mappedReadsFileName)
+    assembler.main(parsed.f, assemblyFileName, unmappedReadsFileName, mappedReadsFileName, cache=getCache())
 
 
 def queryBLAST(program, blastOutputName="blast_output.csv", outfmt=10, makeDatabase=False, fileForDatabase="",
@@ -359,6 +565,15 @@ def queryBLAST(program, blastOutputName="blast_output.csv", outfmt=10, makeDatab
 
 
 def run():
+    if parsed.clear_cache == "True":
+        print("Clearing the cache")
+        ResultCache().clear()
+
+    if parsed.output_format:
+        # Set on the class, so every table written from here on uses the format. ParallelUtils passes it on to worker
+        # processes.
+        FileHandler.outputFormat = parsed.output_format
+
     if parsed.assemble_and_find_unmapped:
         print("Assembling")
         assembleAndFindUnmapped()
@@ -386,35 +601,14 @@ def run():
         print("Comparing kmers")
         searchFilesWithJellyfish()
 
-        handler = FileHandler()
-        if parsed.k:
-            if parsed.csv_filename:
-                handler.writeToCSVConvertData(
-                    ["kmer", "Num in set one", "Num in set Two", "Raw Difference", "Normalised in set One",
-                     "Normalised set Two", "Norm Difference"], dataUtils.getRawAndNormalised(
-                        f"../Data/output/fa/{parsed.k}mer_counts0.fa", f"../Data/output/fa/{parsed.k}mer_counts1.fa"),
-                    outputFile=parsed.csv_filename)
-            else:
-                handler.writeToCSVConvertData(
-                    ["kmer", "Num in set one", "Num in set Two", "Raw Difference", "Normalised in set One",
-                     "Normalised set Two", "Norm Difference"], dataUtils.getRawAndNormalised(
-                        f"../Data/output/fa/{parsed.k}mer_counts0.fa", f"../Data/output/fa/{parsed.k}mer_counts1.fa"),
-                    outputFile=f"{parsed.k}mer_counts_raw_and_normalised")
-
-        else:
-            if parsed.csv_filename:
-                handler.writeToCSVConvertData(
-                    ["kmer", "Num in set one", "Num in set Two", "Raw Difference", "Normalised in set One",
-                     "Normalised set Two", "Norm Difference"], dataUtils.getRawAndNormalised(
-                        f"../Data/output/fa/7mer_counts0.fa", f"../Data/output/fa/7mer_counts1.fa"),
-                    outputFile=parsed.csv_filename)
+        k = parsed.k if parsed.k else 7
+        csvName = parsed.csv_filename if parsed.csv_filename else f"{k}mer_counts_raw_and_normalised"
+        try:
+            tableOne, tableTwo = loadKmerTables()
+            writeKmerComparison(tableOne, tableTwo, csvName)
 
-            else:
-                handler.writeToCSVConvertData(
-                    ["kmer", "Num in set one", "Num in set Two", "Raw Difference", "Normalised in set One",
-                     "Normalised set Two", "Norm Difference"], dataUtils.getRawAndNormalised(
-                        f"../Data/output/fa/7mer_counts0.fa", f"../Data/output/fa/7mer_counts1.fa"),
-                    outputFile="7mer_counts_raw_and_normalised")
+        except FileNotFoundError:
+            print("The kmer counts of both files were not found.")
 
         parsed.compare_kmers = False
 
@@ -422,60 +616,19 @@ def run():
         print("Finding stats for kmers")
         searchFilesWithJellyfish()
 
-        handler = FileHandler()
-        if parsed.k:
-            if parsed.csv_filename:
-                handler.writeToCSVConvertData(
-                    ["kmer", "Num in set one", "Num in set Two", "Raw Difference", "Normalised in set One",
-                     "Normalised set Two", "Norm Difference"], dataUtils.getRawAndNormalised(
-                        f"../Data/output/fa/{parsed.k}mer_counts0.fa", f"../Data/output/fa/{parsed.k}mer_counts1.fa"),
-                    outputFile=f"{parsed.csv_filename}")
-
-                if parsed.s_l:
-                    proportionsStatsTest(f"{parsed.csv_filename}", significanceLevel=parsed.s_l)
-
-                else:
-                    proportionsStatsTest(f"{parsed.csv_filename}")
-
-            else:
-                handler.writeToCSVConvertData(
-                    ["kmer", "Num in set one", "Num in set Two", "Raw Difference", "Normalised in set One",
-                     "Normalised set Two", "Norm Difference"], dataUtils.getRawAndNormalised(
-                        f"../Data/output/fa/{parsed.k}mer_counts0.fa", f"../Data/output/fa/{parsed.k}mer_counts1.fa"),
-                    outputFile=f"{parsed.k}mer_counts_raw_and_normalised")
-
-                if parsed.s_l:
-                    proportionsStatsTest(f"{parsed.k}mer_counts_raw_and_normalised", significanceLevel=parsed.s_l)
-
-                else:
-                    proportionsStatsTest(f"{parsed.k}mer_counts_raw_and_normalised")
+        outputfile = parsed.o if parsed.o else "hypothesis_test_results"
+        significanceLevel = parsed.s_l if parsed.s_l else 0.05
+        try:
+            tableOne, tableTwo = loadKmerTables()
 
-        else:
+            # The tests read the tables directly, so the CSV file of the counts is only written if it is named.
             if parsed.csv_filename:
-                handler.writeToCSVConvertData(
-                    ["kmer", "Num in set one", "Num in set Two", "Raw Difference", "Normalised in set One",
-                     "Normalised set Two", "Norm Difference"], dataUtils.getRawAndNormalised(
-                        f"../Data/output/fa/7mer_counts0.fa", f"../Data/output/fa/7mer_counts1.fa"),
-                    outputFile=f"{parsed.csv_filename}")
+                writeKmerComparison(tableOne, tableTwo, parsed.csv_filename)
 
-                if parsed.s_l:
-                    proportionsStatsTest(f"{parsed.csv_filename}", significanceLevel=parsed.s_l)
+            proportionsStatsTest(tableOne, tableTwo, outputfile, significanceLevel)
 
-                else:
-                    proportionsStatsTest(f"{parsed.csv_filename}")
-
-            else:
-                handler.writeToCSVConvertData(
-                    ["kmer", "Num in set one", "Num in set Two", "Raw Difference", "Normalised in set One",
-                     "Normalised set Two", "Norm Difference"], dataUtils.getRawAndNormalised(
-                        f"../Data/output/fa/7mer_counts0.fa", f"../Data/output/fa/7mer_counts1.fa"),
-                    outputFile="7mer_counts_raw_and_normalised")
-
-                if parsed.s_l:
-                    proportionsStatsTest("7mer_counts_raw_and_normalised", significanceLevel=parsed.s_l)
-
-                else:
-                    proportionsStatsTest("7mer_counts_raw_and_normalised")
+        except FileNotFoundError:
+            print("The kmer counts of both files were not found.")
 
         parsed.stats_for_kmers = False
 
@@ -489,6 +642,11 @@ def run():
         findGC()
         parsed.find_gc = False
 
+    elif parsed.profile:
+        print("Profiling reads")
+        profileReads()
+        parsed.profile = False
+
     elif parsed.find_similar:
         print("Finding similar sequences")
         findSimilar()
@@ -509,23 +667,58 @@ if __name__ == "__main__":
                                                  "Produces a fastq file as output, with name 'unmapped_reads'. Use "
                                                  "-fastq_name to change this. ")
     arguments.add_argument("-fastq_name", help="Name of the fastq file outputted by -get_unmapped.")
-
-    arguments.add_argument("-kmers", help="Calls Jellyfish on files specified in -f, returns .fa files and csv files "
-                                          "of them.", required=False)
+    arguments.add_argument("-match_by", help="Whether -get_unmapped matches reads by their 'sequence' or read 'id'. "
+                                             "Default sequence.")
+    arguments.add_argument("-unmapped_backend", help="Set to bloom for -get_unmapped to use a Bloom filter of the "
+                                                     "mapped reads, for very large files. Default hash.")
+    arguments.add_argument("-bloom_fp_rate", help="False positive rate of the Bloom filter. Default 0.01.")
+    arguments.add_argument("-bloom_file", help="Name to save the Bloom filter under in Data/intermediary, or to load "
+                                               "it from if it exists, so it can be reused for other files.")
+    arguments.add_argument("-bloom_recheck", help="Set to True to recheck the reads flagged by the Bloom filter, so "
+                                                  "that no unmapped reads are missed. Slower, as the file of mapped "
+                                                  "reads is read again for every million reads. Default False.")
+
+    arguments.add_argument("-kmers", help="Calls Jellyfish on files specified in -f, and saves tables of the kmer "
+                                          "counts. Use -kmer_csv to also write csv files of them.", required=False)
     arguments.add_argument("-k", help="The value of k for jellyfish to search with: 7 as default.", required=False)
+    arguments.add_argument("-kmer_engine", help="Set to native to count kmers in Python rather than with Jellyfish. "
+                                                "The native counter is also used if Jellyfish is not installed.",
+                           required=False)
+    arguments.add_argument("-kmer_csv", help="Set to True to also write a csv file of the kmer counts of each file. "
+                                             "Default False, as the counts are saved as tables.",
+                           required=False)
+    arguments.add_argument("-canonical", help="Set to True for the native counter to count a kmer and its reverse "
+                                              "complement together, as Jellyfish does with -C. Default False.",
+                           required=False)
 
     arguments.add_argument("-compare_kmers", help="Compares sets of kmers in files provided.\n"
                                                   "Uses Jellyfish to get the kmers.\n"
                                                   "Returns a CSV file of the raw counts and difference,\n"
                                                   " as well as the normalised values.",
                            required=False)
+    arguments.add_argument("-kmer_union", help="Set to False for -compare_kmers and -stats_for_kmers to only compare "
+                                               "the kmers found in both files, as they did before. By default, kmers "
+                                               "found in only one file are also compared, with a count of 0 in the "
+                                               "other.", required=False)
+    arguments.add_argument("-output_format", help="Format of the tables of results: csv, parquet or arrow. Parquet "
+                                                  "and Arrow tables have typed columns, are smaller, and are read "
+                                                  "without parsing, but need pyarrow. Default csv.",
+                           choices=["csv", "parquet", "arrow"], required=False)
+    arguments.add_argument("-use_cache", help="Set to True to cache the results of -kmers, -find_gc, -find_entropy, "
+                                              "-profile and -assemble_and_find_unmapped in Data/intermediary/cache. "
+                                              "Running them again on unchanged files with the same options restores "
+                                              "the results instead of recomputing them. Default False.",
+                           required=False)
+    arguments.add_argument("-cache_size", help="The most space the cache may take up, in GB. The least recently used "
+                                               "results are removed past this. Default 10.", required=False)
+    arguments.add_argument("-clear_cache", help="Set to True to remove every result from the cache.", required=False)
     arguments.add_argument("-csv_filename", help="Name of the output csv file from call. Used by count_gc, "
                                                  "compare_kmers, and similarity_calculator.",
                            required=False)
 
-    arguments.add_argument("-stats_for_kmers", help="Takes the CSV file from -compare_kmers. \n"
-                                                    "Performs hypothesis test on the normalised values from random "
-                                                    "subset.\n "
+    arguments.add_argument("-stats_for_kmers", help="Takes the kmer counts from -compare_kmers. \n"
+                                                    "Performs hypothesis test on the normalised values of every "
+                                                    "kmer.\n "
                                                     "Null Hypothesis: The proportions of the occurrences are not "
                                                     "significantly different. \n "
                                                     "Alt Hypothesis: The proportions are significantly different. \n"
@@ -537,6 +730,16 @@ if __name__ == "__main__":
     arguments.add_argument("-o", help="Specifes output filename for hypothesis tests csv. "
                                       "Default: hypothesis_test_results",
                            required=False)
+    arguments.add_argument("-sample_kmers", help="Set to True for -stats_for_kmers to test a 10%% sample of the "
+                                                 "kmers, if there are more than 100. Default False.",
+                           required=False)
+    arguments.add_argument("-p_correction", help="Multiple testing correction for the verdicts of -stats_for_kmers: "
+                                                 "bonferroni or bh (Benjamini-Hochberg). Default none.",
+                           choices=["bonferroni", "bh"], required=False)
+    arguments.add_argument("-significant_kmers_name", help="Name of a csv file for -stats_for_kmers to write the "
+                                                           "significant kmers to, smallest p-value first.",
+                           required=False)
+    arguments.add_argument("-top_kmers", help="The most kmers to write to -significant_kmers_name.", required=False)
 
     arguments.add_argument("-find_entropy", help="This finds the entropy for all of the files inputted. "
                                                  "Returns a line chart showing all of the entropies of the sequences "
@@ -562,16 +765,25 @@ if __name__ == "__main__":
                                               "-similarity_calculator")
     arguments.add_argument("-bar_name", help="Sets the name for the bar chart outputted by -find_gc")
 
+    arguments.add_argument("-profile", help="Finds the GC content, entropy, length, N count and mean quality of "
+                                            "every read in one pass over each file. Produces a CSV file of the "
+                                            "reads and their values, a summary CSV file, the entropy outliers by "
+                                            "read id, and the plots of -find_gc and -find_entropy. Use "
+                                            "-csv_filename to name the profiles.")
+
     arguments.add_argument("-find_similar", help="Compares sequences in first file to those in second. Returns"
                                                           " a CSV file of the sequence in the first file with"
                                                           " closest matches from the second.")
     arguments.add_argument("-number_of_closest", help="The number of closest matches to find. Default is 3.")
-    arguments.add_argument("-sample_first", help="True to sample the first file inputted. Default True.")
-    arguments.add_argument("-sample_second", help="True to sample the second file inputted. Default True.")
+    arguments.add_argument("-sample_first", help="True to sample the first file inputted. Default False.")
+    arguments.add_argument("-sample_second", help="True to sample the second file inputted. Default False.")
     arguments.add_argument("-sample_percentage", help="The percentage to sample from the files. Useful for large files."
                                                       " Default 1 percent.")
     arguments.add_argument("-sample_seed", help="Seed to control the samples. Default is completely random.")
     arguments.add_argument("-cutoff", help="The cutoff to stop searching for the closest match at. Default 0.6.")
+    arguments.add_argument("-workers", help="The number of processes to use for -find_similar, and the number of "
+                                            "files to process at once for -find_entropy, -find_gc and the kmer "
+                                            "commands. Default 1.")
 
     arguments.add_argument("-assemble_and_find_unmapped", help="This uses Megahit to assemble the file(s) specified in "
                                                                "-f. These files must be in .fasta format. Then uses "
@@ -1,12 +1,274 @@
 import math
 from collections import Counter
+from functools import partial
 import matplotlib.pyplot as plt
 import numpy as np
 
 from utility.PlotsUtils import PlotsUtils
 from utility.FileHandlingUtils import FileHandler
+from utility.TableFormatUtils import TableFormatUtils
+from utility.SequenceUtils import SequenceUtils
+
+class EntropyCounts:
+    """
+    Counts of the entropies of a stream of reads. Entropy of DNA is bounded, at most log2(5) with N counted, and is
+    given to 5 significant figures, so it has 5 decimal places from 0.1 upwards, and 6 between 0.01 and 0.1. A counter
+    for every 0.00001 from 0.1, and every 0.000001 below it, holds each of these values exactly in under 3 MB. Only
+    entropies below 0.01, which only reads of over a thousand bases with all but a few bases the same can have, are
+    rounded to the nearest 0.000001. The quartiles found from these counts are the same as np.percentile() gives,
+    without the entropies being kept.
+    """
+
+    def __init__(self, resolution=100000, maxEntropy=2.33, fineResolution=1000000, fineLimit=0.1):
+        """
+        :param resolution: The number of counters per unit of entropy, from fineLimit upwards.
+        :param maxEntropy: The largest entropy that can be counted.
+        :param fineResolution: The number of counters per unit of entropy, below fineLimit.
+        :param fineLimit: The entropy below which fineResolution is used.
+        """
+        self.resolution = resolution
+        self.fineResolution = fineResolution
+        self.fineLimit = fineLimit
+        self.fineCounters = int(round(fineLimit * fineResolution))
+        self.coarseStart = int(round(fineLimit * resolution))
+
+        # The value of each counter, fine counters first.
+        self.values = np.concatenate((np.arange(self.fineCounters) / fineResolution,
+                                      np.arange(self.coarseStart, int(maxEntropy * resolution) + 1) / resolution))
+        self.counts = np.zeros(len(self.values), dtype=np.int64)
+        self.total = 0.0
+
+    def update(self, entropies):
+        """
+        Adds a batch of entropies to the counts.
+        :param entropies: Array of entropy values.
+        """
+        indexes = np.where(entropies < self.fineLimit, np.rint(entropies * self.fineResolution),
+                           np.rint(entropies * self.resolution) - self.coarseStart + self.fineCounters)
+        self.counts += np.bincount(indexes.astype(np.int64), minlength=len(self.counts))
+        self.total += float(entropies.sum())
+
+    def findOrderStatistics(self, ranks):
+        """
+        :param ranks: Array of positions in the sorted entropies, starting at 0.
+        :return: The entropies at those positions.
+        """
+        return self.values[np.searchsorted(np.cumsum(self.counts), ranks, side="right")]
+
+    def consumeProfile(self, batch, profile):
+        """
+        Adds a batch of reads profiled by ReadProfiler to the counts, so that the entropies are not found again.
+        :param batch: The ReadBatch of the reads.
+        :param profile: The profile of the batch, from ReadProfiler.profileBatch().
+        """
+        self.update(profile["Entropy"])
+
+    def findPercentile(self, percentile):
+        """
+        Finds a percentile of the entropies, interpolating between values in the same way as np.percentile().
+        :param percentile: The percentile to find, between 0 and 100.
+        :return: The value of the percentile.
+        """
+        count = int(self.counts.sum())
+        if count == 0:
+            return 0.0
+
+        position = (count - 1) * percentile / 100
+        lower, upper = self.findOrderStatistics(np.array([np.floor(position), np.ceil(position)]))
+
+        return float(lower + (position - np.floor(position)) * (upper - lower))
+
+    def findAverageMinMax(self):
+        """
+        :return: A tuple containing the average, minimum and maximum entropy, as findAverageMinMaxOfDictionary() gives.
+        """
+        count = int(self.counts.sum())
+        if count == 0:
+            return 0, 2, 0
+
+        present = np.flatnonzero(self.counts)
+
+        return self.total / count, float(self.values[present[0]]), float(self.values[present[-1]])
+
 
 class EntropyFinder:
+    def __init__(self, maxTableLength=512):
+        """
+        Initialises the class
+        :param maxTableLength: The longest read length that the table of entropy terms is built for. The entropy of
+        longer reads, such as contigs, is calculated directly instead.
+        """
+        self.maxTableLength = maxTableLength
+        self.entropyTable = None
+
+    def getEntropyTable(self):
+        """
+        Builds, once, the table of -p * log2(p) for every possible (count, length) pair up to maxTableLength, where p is
+        count / length. The entropy of a read is then the sum of the table entries for each of its base counts.
+        :return: The table, indexed as table[count, length].
+        """
+        if self.entropyTable is None:
+            counts = np.arange(self.maxTableLength + 1).reshape(-1, 1)
+            lengths = np.arange(self.maxTableLength + 1).reshape(1, -1)
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                probabilities = counts / lengths
+                self.entropyTable = np.where((counts > 0) & (counts <= lengths),
+                                             -probabilities * np.log2(probabilities), 0.0)
+
+        return self.entropyTable
+
+    def roundToSignificantFigures(self, values, figures=5):
+        """
+        Rounds an array of values to a number of significant figures, as "{:.5}".format() does for a single value.
+        :param values: Array of values.
+        :param figures: The number of significant figures.
+        :return: The rounded array.
+        """
+        magnitudes = np.floor(np.log10(np.where(values > 0, values, 1)))
+        scales = 10 ** (figures - 1 - magnitudes)
+        return np.round(values * scales) / scales
+
+    def findEntropyBatch(self, batch):
+        """
+        Finds the Shannon entropy of every read in a batch at once. The bases of all the reads are counted into a
+        matrix, and the -p * log2(p) term of each count is read from a precomputed table, rather than a Counter and a
+        dictionary of probabilities being made for each read.
+        :param batch: A ReadBatch of the reads.
+        :return: An array of the entropy of each read, to 5 significant figures, as findEntropy() gives.
+        """
+        return self.findEntropyFromCounts(*SequenceUtils().countBases(batch), batch)
+
+    def findEntropyFromCounts(self, counts, lengths, batch=None):
+        """
+        Finds the Shannon entropy of reads whose bases have already been counted, such as by
+        SequenceUtils.countBases(). The counts do not tell lower case bases from upper case, or other characters from
+        N, so if the batch is given, the entropy of any read with such characters is found with findEntropy(), which
+        counts every character separately.
+        :param counts: Matrix of the counts of A, C, G, T and N, with a row for each read.
+        :param lengths: Array of the length of each read.
+        :param batch: The ReadBatch that was counted. If None, every character other than A, C, G and T is taken to be
+        N, in either case.
+        :return: An array of the entropy of each read, to 5 significant figures.
+        """
+        if len(lengths) == 0:
+            return np.zeros(0)
+
+        if lengths.max() <= self.maxTableLength:
+            entropies = self.getEntropyTable()[counts, lengths.reshape(-1, 1)].sum(axis=1)
+
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                probabilities = counts / lengths.reshape(-1, 1)
+                entropies = np.where(counts > 0, -probabilities * np.log2(probabilities), 0.0).sum(axis=1)
+
+        entropies = self.roundToSignificantFigures(entropies)
+
+        if batch is not None:
+            for index in SequenceUtils().findNonStandardReads(batch):
+                entropies[index] = self.findEntropy(batch.getSequence(index))
+
+        return entropies
+
+    def findEntropyOfFile(self, filepath, outputFilename="all_entropies", keepEntropies=False):
+        """
+        Finds the entropy of every read in a file in a single pass, a batch at a time. The entropy of each read is
+        written to a CSV file, and counted into an EntropyCounts at the same time, so the average, minimum, maximum
+        and quartiles can be found without the entropies being kept in memory.
+        :param filepath: The file of reads.
+        :param outputFilename: The name of the CSV file of all entropies.
+        :param keepEntropies: Whether to also return a dictionary of the sequences and their entropies.
+        :return: A tuple of the dictionary of entropies, or None if they are not kept, and the EntropyCounts.
+        """
+        handler = FileHandler()
+        entropyCounts = EntropyCounts()
+        allEntropies = dict() if keepEntropies else None
+
+        def batches():
+            for batch in handler.iterBatches(filepath):
+                entropies = self.findEntropyBatch(batch)
+                sequences = batch.getSequences()
+                entropyCounts.update(entropies)
+
+                if keepEntropies:
+                    allEntropies.update(zip(sequences, entropies.tolist()))
+
+                yield [sequences, entropies]
+
+        handler.writeColumnsToCSV(["Sequence", "Entropy"], batches(), outputFile=outputFilename)
+
+        return allEntropies, entropyCounts
+
+    def findEntropiesAndOutliers(self, filepath, allEntropyFileName="all_entropies", outlierFileName="entropy_outliers",
+                                 keepEntropies=False):
+        """
+        Finds the entropy of every read in a file, and then its outliers, with findEntropyOfFile() and
+        findOutliersStreaming().
+        :param filepath: The file of reads.
+        :param allEntropyFileName: The name of the CSV file of all entropies.
+        :param outlierFileName: The name of the CSV file of outliers.
+        :param keepEntropies: Whether to also return a dictionary of the sequences and their entropies.
+        :return: A tuple of the dictionary of entropies, or None if they are not kept, and the EntropyCounts.
+        """
+        allEntropies, entropyCounts = self.findEntropyOfFile(filepath, allEntropyFileName, keepEntropies)
+        self.findOutliersStreaming(filepath, entropyCounts, outputFilename=outlierFileName)
+
+        return allEntropies, entropyCounts
+
+    def findOutliersStreaming(self, filepath, entropyCounts, outputFilename="entropy_outliers"):
+        """
+        The second pass of finding outliers for large files. The quartiles are found from the counts made in the first
+        pass, then the reads are streamed again and only those with entropy outside the quartiles are written. Memory
+        use is constant, no matter how many reads there are.
+        :param filepath: The file of reads.
+        :param entropyCounts: The EntropyCounts of the file, from findEntropyOfFile().
+        :param outputFilename: The name of the output file.
+        :return: Nothing, but produces a CSV file with name outputFilename.
+        """
+        upperQuartile, lowerQuartile = entropyCounts.findPercentile(75), entropyCounts.findPercentile(25)
+        print(f"Upper Quartile of Entropy: {upperQuartile}\n"
+              f"Lower Quartile: {lowerQuartile}")
+
+        handler = FileHandler()
+
+        def rows():
+            for batch in handler.iterBatches(filepath):
+                entropies = self.findEntropyBatch(batch)
+                outliers = np.flatnonzero((entropies > upperQuartile) | (entropies < lowerQuartile))
+
+                for index in outliers.tolist():
+                    yield batch.getSequence(index), entropies[index]
+
+        handler.writeRowsToCSV(["Sequence", "Entropy"], rows(), outputFile=f"{outputFilename}.csv")
+
+    def findOutliersFromProfile(self, profileFile, entropyCounts, outputFilename="entropy_outliers",
+                                chunkSize=1000000):
+        """
+        Finds the outliers of a file profiled by ReadProfiler. The quartiles are found from the counts made while
+        profiling, and the entropies are read back from the per-read table, a chunk at a time, so the reads file is
+        not parsed again. The outliers are keyed by read id, rather than by sequence.
+        :param profileFile: The CSV file of the per-read profile.
+        :param entropyCounts: The EntropyCounts of the file, filled while profiling.
+        :param outputFilename: The name of the output file.
+        :param chunkSize: The number of rows of the profile to read at a time.
+        :return: Nothing, but produces a CSV file with name outputFilename.
+        """
+        upperQuartile, lowerQuartile = entropyCounts.findPercentile(75), entropyCounts.findPercentile(25)
+        print(f"Upper Quartile of Entropy: {upperQuartile}\n"
+              f"Lower Quartile: {lowerQuartile}")
+
+        handler = FileHandler()
+
+        def rows():
+            for chunk in TableFormatUtils().iterDataFrames(profileFile, ["Read ID", "Entropy"], chunkSize,
+                                                           dtype={"Read ID": str}, keep_default_na=False):
+                entropies = chunk["Entropy"].to_numpy()
+                outliers = (entropies > upperQuartile) | (entropies < lowerQuartile)
+
+                yield from zip(chunk["Read ID"].to_numpy()[outliers].tolist(), entropies[outliers].tolist())
+
+        handler.writeRowsToCSV(["Read ID", "Entropy"], rows(), outputFile=outputFilename)
+
     def findProbabilities(self, sequence):
         """
         Finds the probabilities of each character appearing in the sequence.
@@ -42,17 +304,20 @@ class EntropyFinder:
     def findAverageMinMaxOfDictionary(self, data):
         """
         A function that finds the average, minimum and maximum entropy values within the dictionary.
-        :param data: The dictionary. Sequences must be the keys of it.
+        :param data: The dictionary, or any iterable of sequences such as FileHandler.iterSequences(). Sequences
+        must be the keys of it.
         :return: A tuple containing the average, minimum and maximum.
         """
         average = 0
         minimum = 2
         maximum = 0
+        count = 0
 
         for sequence in data:
             # Finds the entropy of each sequence, and compares it to already found entropies.
             entropy = self.findEntropy(sequence)
             average += entropy
+            count += 1
 
             if minimum > entropy:
                 minimum = entropy
@@ -60,7 +325,7 @@ class EntropyFinder:
             if maximum < entropy:
                 maximum = entropy
 
-        average /= len(data)
+        average /= count
 
         return average, abs(minimum), maximum
 
@@ -68,7 +333,7 @@ class EntropyFinder:
         """
         Finds the entropy of each
         sequence in a dictionary.
-        :param data: Filepath of the input dictionary.
+        :param data: The input dictionary, or any iterable of sequences such as FileHandler.iterSequences().
         :param outputFilename: The name of the file outputted by the function.
         :return: The data that was written to the CSV, as a dictionary.
         """
@@ -127,7 +392,8 @@ class EntropyFinder:
         handler = FileHandler()
 
         for file in files:
-            dataframes.append(handler.convertCSVToDataFrame(file))
+            # Only the entropies are plotted, so other columns, such as those of a read profile, are left out.
+            dataframes.append(handler.convertCSVToDataFrame(file)[["Entropy"]])
 
         return dataframes
 
@@ -158,7 +424,7 @@ class EntropyFinder:
 
     def main(self, filepath, yLabelForGraph="Entropy", xLabelForGraph="Position in Dictionary",
              title="Default", plotName="line_chart", outlierFileName="entropy_outliers",
-             allEntropyFileName="all_entropies", lineChart=False):
+             allEntropyFileName="all_entropies", lineChart=False, batchMode=True, cache=None):
         """
         Main function for this class
         :param lineChart: Switch to create a line chart.
@@ -170,20 +436,42 @@ class EntropyFinder:
         :param outlierFileName: Name of CSV file of outliers. Determined by the Upper and Lower quartile of the
         entropies in input file
         :param allEntropyFileName: Name of CSV file of all entropies.
+        :param batchMode: Whether to find the entropies with the vectorised batch functions. Default True. The file is
+        read twice: once to find every entropy and the quartiles, and once to write the outliers.
+        :param cache: A ResultCache, so that in batch mode a file processed before is not read again. Its CSV files
+        are restored from the cache, and only the line chart is made again. Default None, for no caching.
         """
         handler = FileHandler()
-        data = handler.getDataFromInputFile(filepath)
 
-        average, minEntropy, maxEntropy = self.findAverageMinMaxOfDictionary(data)
+        if batchMode:
+            # The entropies are only kept in memory if they are needed for the line chart.
+            findEntropies = partial(self.findEntropiesAndOutliers, filepath, allEntropyFileName, outlierFileName,
+                                    lineChart)
+
+            if cache is None:
+                allEntropies, entropyCounts = findEntropies()
+
+            else:
+                artifacts = {"entropies": handler.getOutputPath(allEntropyFileName),
+                             "outliers": handler.getOutputPath(outlierFileName)}
+                allEntropies, entropyCounts = cache.run("entropy", [filepath], {"keepEntropies": lineChart,
+                                                                                "format": FileHandler.outputFormat},
+                                                        artifacts, findEntropies)
+
+            average, minEntropy, maxEntropy = entropyCounts.findAverageMinMax()
+
+        else:
+            # The sequences are streamed from the file, so the records of the file are never all held in memory.
+            average, minEntropy, maxEntropy = self.findAverageMinMaxOfDictionary(handler.iterSequences(filepath))
+            allEntropies = self.findEntropyOfEachSequence(handler.iterSequences(filepath), allEntropyFileName)
 
         print(f"Average Entropy of Dataset: {average}\n"
               f"Minimum Entropy of Dataset: {minEntropy}\n"
               f"Maximum Entropy of Dataset: {maxEntropy}")
 
-        allEntropies = self.findEntropyOfEachSequence(data, allEntropyFileName)
-
         if lineChart:
             self.plotDictToLineChart(allEntropies, yLabel=yLabelForGraph, xLabel=xLabelForGraph, graphTitle=title,
                                      filename=plotName)
 
-        self.findOutliersAndWriteToCSV(allEntropies, outputFilename=outlierFileName)
+        if not batchMode:
+            self.findOutliersAndWriteToCSV(allEntropies, outputFilename=outlierFileName)
@@ -1,6 +1,7 @@
 import subprocess
 from utility.FileHandlingUtils import FileHandler
 from utility.DataUtils import DataUtils
+from utility.KmerTableUtils import KmerCountTable
 
 
 class JellyFish:
@@ -8,32 +9,42 @@ class JellyFish:
         dataUtils = DataUtils()
         self.packageInstalled = dataUtils.isPackageInstalled("jellyfish")
 
-    def runJellyfish(self, inputFile, k=7, jellyfishOutputFile=f"mer_counts", csvName="output_csv"):
+    def runJellyfish(self, inputFile, k=7, tableName="mer_counts", csvName=None):
         """
-        Function that calls Jellyfish on input file. Jellyfish creates a .fa file, and a CSV file is made from that,
+        Function that calls Jellyfish on input file. The counts Jellyfish finds are saved as a KmerCountTable in
+        Data/intermediary, which the comparisons and tests read without parsing. A CSV file is only made if asked for,
         in form of k-mer | Number of occurrences
         :param inputFile: Input file of data.
         :param k: Size of k for Jellyfish to search with
-        :param jellyfishOutputFile: Name of output file of Jellyfish
-        :param csvName: Name of output CSV created from the data found by Jellyfish.
+        :param tableName: Name of the saved table.
+        :param csvName: Name of output CSV created from the data found by Jellyfish. None to not write one.
+        :return: The KmerCountTable, or None if Jellyfish is not installed.
         """
         # packageInstalled is a boolean value containing the output of isPackageInstalled("Jellyfish").
         if self.packageInstalled:
             cmd = "jellyfish"
 
+            # The intermediary files are named after the table, so that several files can be counted at once.
+            countsFile = f"../Data/intermediary/{tableName}.jf"
+            dumpFile = f"../Data/intermediary/{tableName}.tsv"
+
             # Command to find the k-mers.
             subprocess.run([cmd, "count", f"-m {k}", "-s 100M", "-t 10", inputFile,
-                            "-o../Data/intermediary/mer_counts.jf"], stdout=subprocess.PIPE)
+                            f"-o{countsFile}"], stdout=subprocess.PIPE)
+
+            # Dumps the counts in columns, k-mer then count, which are quicker to read than the fasta dump.
+            subprocess.run([cmd, "dump", "-c", "-t", countsFile, f"-o{dumpFile}"], stdout=subprocess.PIPE)
 
-            # Converts the binary file to a fasta file.
-            subprocess.run([cmd, "dump", "../Data/intermediary/mer_counts.jf",
-                            f"-o../Data/output/fa/{jellyfishOutputFile}"], stdout=subprocess.PIPE)
+            table = KmerCountTable.fromJellyfishDump(dumpFile, int(k))
+            table.save(f"../Data/intermediary/{tableName}")
 
-            # Takes the output fasta file and converts it to a CSV file, to allow further analysis.
-            writer = FileHandler()
-            writer.writeToCSVConvertData(["kmer", "occurrences"], inputData=f"../Data/output/fa/{jellyfishOutputFile}",
+            if csvName is not None:
+                writer = FileHandler()
+                writer.writeColumnsToCSV(["kmer", "occurrences"], table.iterKmerCountBatches(),
                                          outputFile=f"{csvName}")
 
+            return table
+
         else:
             print("Package Jellyfish is not installed. Please install it using\n"
                   "sudo apt install jellyfish\n"
@@ -0,0 +1,153 @@
+import numpy as np
+
+from utility.FileHandlingUtils import FileHandler
+from utility.KmerTableUtils import KmerCountTable
+from utility.SequenceUtils import SequenceUtils
+
+
+class KmerCounter:
+    """
+    Counts the k-mers of a file in this process, as an alternative to Jellyfish. Reads are encoded two bits per base,
+    and the code of every k-mer is found with array operations, a batch of reads at a time. For small k, codes are
+    counted straight into an array with an entry for every possible k-mer; for larger k, the counts of each batch are
+    merged into sorted arrays of the k-mers that occur.
+    """
+
+    def __init__(self, k=7, canonical=False, denseMaxK=KmerCountTable.denseMaxK, batchSize=100000):
+        """
+        Initialises the class
+        :param k: The length of the k-mers. At most 31, so that codes fit in 64 bits.
+        :param canonical: Whether to count a k-mer and its reverse complement as the same k-mer, as Jellyfish does with
+        -C. Off by default, to give the same counts as runJellyfish().
+        :param denseMaxK: The largest k to count into an array of every possible k-mer, which takes 4^k entries.
+        :param batchSize: The number of reads to encode at a time.
+        """
+        if not 0 < k <= 31:
+            raise ValueError("k must be between 1 and 31")
+
+        self.k = k
+        self.canonical = canonical
+        self.denseMaxK = denseMaxK
+        self.batchSize = batchSize
+        self.sequenceUtils = SequenceUtils()
+
+    def findKmerCodes(self, batch):
+        """
+        Finds the codes of every k-mer of every read in a batch. The code of a k-mer is its bases as 2-bit numbers,
+        the first base highest, so codes sort in the same order as the k-mers. K-mers containing N, or running over the
+        end of a read, are skipped.
+        :param batch: A ReadBatch.
+        :return: A uint64 array of the codes.
+        """
+        codes, offsets = self.sequenceUtils.encodeBatch(batch)
+        lengths = np.diff(offsets)
+        windows = len(codes) - self.k + 1
+
+        if windows <= 0:
+            return np.zeros(0, dtype=np.uint64)
+
+        # A window is kept if it ends inside the read it starts in, and contains no N.
+        readEnds = np.repeat(offsets[1:], lengths)[:windows]
+        nCounts = np.concatenate(([0], np.cumsum(codes == 4)))
+        isValid = (np.arange(windows) + self.k <= readEnds) & (nCounts[self.k:] == nCounts[:windows])
+
+        bases = (codes & 3).astype(np.uint64)
+        kmerCodes = np.zeros(windows, dtype=np.uint64)
+        for position in range(self.k):
+            kmerCodes = (kmerCodes << np.uint64(2)) | bases[position:position + windows]
+
+        if self.canonical:
+            # The complement of a base is 3 minus its code, and the reverse complement reverses the order of the bases.
+            reverseCodes = np.zeros(windows, dtype=np.uint64)
+            for position in range(self.k - 1, -1, -1):
+                reverseCodes = (reverseCodes << np.uint64(2)) | (np.uint64(3) - bases[position:position + windows])
+
+            kmerCodes = np.minimum(kmerCodes, reverseCodes)
+
+        return kmerCodes[isValid]
+
+    def mergeCounts(self, runOne, runTwo):
+        """
+        Merges two sorted runs of k-mer counts, summing the counts of k-mers in both.
+        :param runOne: A tuple of a sorted uint64 array of codes, and a uint64 array of their counts.
+        :param runTwo: Another such tuple.
+        :return: The merged tuple.
+        """
+        codes = np.concatenate((runOne[0], runTwo[0]))
+        # A stable sort of two sorted runs merges them in linear time.
+        order = np.argsort(codes, kind="stable")
+        codes, counts = codes[order], np.concatenate((runOne[1], runTwo[1]))[order]
+
+        if len(codes) == 0:
+            return codes, counts
+
+        starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+        if len(starts) == len(codes):
+            return codes, counts
+
+        return codes[starts], np.add.reduceat(counts, starts)
+
+    def countFile(self, filepath):
+        """
+        Counts the k-mers of an input file.
+        :param filepath: A fasta, fastq, sam or map file, which may be compressed.
+        :return: A tuple of codes and counts. If k is at most denseMaxK, codes is None and counts is a uint64 array
+        indexed by k-mer code. Otherwise, codes is a sorted uint64 array of the k-mers that occur, and counts holds the
+        count of each.
+        """
+        handler = FileHandler()
+
+        if self.k <= self.denseMaxK:
+            counts = np.zeros(4 ** self.k, dtype=np.uint64)
+
+            for batch in handler.iterBatches(filepath, self.batchSize):
+                # Added in place, so no array of every possible k-mer is made for each batch.
+                np.add.at(counts, self.findKmerCodes(batch), np.uint64(1))
+
+            return None, counts
+
+        # The counts of each batch are kept as a sorted run, and runs are merged whenever the newest is as large as
+        # the one before it, as in a merge sort. Each count is merged a logarithmic number of times, rather than the
+        # running counts being merged again for every batch.
+        runs = []
+
+        for batch in handler.iterBatches(filepath, self.batchSize):
+            batchCodes, batchCounts = np.unique(self.findKmerCodes(batch), return_counts=True)
+            run = (batchCodes, batchCounts.astype(np.uint64))
+
+            while runs and len(runs[-1][0]) <= len(run[0]):
+                run = self.mergeCounts(runs.pop(), run)
+
+            runs.append(run)
+
+        run = (np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64))
+        while runs:
+            run = self.mergeCounts(runs.pop(), run)
+
+        return run
+
+    def countFileToTable(self, filepath):
+        """
+        Counts the k-mers of an input file into a KmerCountTable.
+        :param filepath: The input file.
+        :return: The KmerCountTable.
+        """
+        codes, counts = self.countFile(filepath)
+        return KmerCountTable(self.k, counts, codes, self.canonical)
+
+    def runKmerCounter(self, inputFile, tableName="mer_counts", csvName=None):
+        """
+        Counts the k-mers of a file, and saves them as a KmerCountTable in Data/intermediary, as
+        JellyFish.runJellyfish() does.
+        :param inputFile: Input file of data.
+        :param tableName: Name of the saved table.
+        :param csvName: If given, a CSV file of the counts is also written, in form of k-mer | Number of occurrences.
+        :return: The KmerCountTable.
+        """
+        table = self.countFileToTable(inputFile)
+        table.save(f"../Data/intermediary/{tableName}")
+
+        if csvName is not None:
+            FileHandler().writeColumnsToCSV(["kmer", "occurrences"], table.iterKmerCountBatches(), outputFile=csvName)
+
+        return table
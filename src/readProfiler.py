@@ -0,0 +1,256 @@
+from functools import partial
+from itertools import repeat
+import numpy as np
+
+from entropyFinder import EntropyCounts, EntropyFinder
+from GCContent import GCBins, GCCalculator
+from utility.FileHandlingUtils import FileHandler
+from utility.ParallelUtils import ParallelUtils
+from utility.SequenceUtils import SequenceUtils
+
+
+class ProfileSummary:
+    """
+    Running totals of the metrics of a stream of profiled reads, so the aggregate summary of a file is found without
+    the metrics of every read being kept.
+    """
+
+    def __init__(self):
+        self.reads = 0
+        self.bases = 0
+        self.nBases = 0
+        self.readsWithN = 0
+        self.minLength = None
+        self.maxLength = None
+        self.gcTotal = 0.0
+        self.qualityReads = 0
+        self.qualityTotal = 0.0
+
+    def consumeProfile(self, batch, profile):
+        """
+        Adds a batch of profiled reads to the totals.
+        :param batch: The ReadBatch of the reads.
+        :param profile: The profile of the batch, from ReadProfiler.profileBatch().
+        """
+        lengths = profile["Length"]
+        if len(lengths) == 0:
+            return
+
+        self.reads += len(lengths)
+        self.bases += int(lengths.sum())
+        self.nBases += int(profile["N"].sum())
+        self.readsWithN += int(np.count_nonzero(profile["N"]))
+        self.gcTotal += float(profile["GC"].sum())
+
+        batchMin, batchMax = int(lengths.min()), int(lengths.max())
+        self.minLength = batchMin if self.minLength is None else min(self.minLength, batchMin)
+        self.maxLength = batchMax if self.maxLength is None else max(self.maxLength, batchMax)
+
+        hasQuality = ~np.isnan(profile["Mean quality"])
+        self.qualityReads += int(np.count_nonzero(hasQuality))
+        self.qualityTotal += float(profile["Mean quality"][hasQuality].sum())
+
+    def getRows(self, entropyCounts=None):
+        """
+        Gives the summary as rows of metric and value. Averages of reads are over every read, so a read of 1000 bases
+        counts as much as a read of 10.
+        :param entropyCounts: The EntropyCounts of the same reads, for the entropy summary. Optional.
+        :return: A list of (metric, value) tuples.
+        """
+        rows = [("Reads", self.reads), ("Bases", self.bases),
+                ("Mean length", round(self.bases / self.reads, 2) if self.reads else 0),
+                ("Minimum length", self.minLength or 0), ("Maximum length", self.maxLength or 0),
+                ("N bases", self.nBases), ("Reads with N", self.readsWithN),
+                ("Mean GC content", round(self.gcTotal / self.reads, 2) if self.reads else 0)]
+
+        if entropyCounts is not None:
+            average, minimum, maximum = entropyCounts.findAverageMinMax()
+            rows += [("Mean entropy", round(average, 5)), ("Minimum entropy", minimum), ("Maximum entropy", maximum),
+                     ("Lower quartile of entropy", entropyCounts.findPercentile(25)),
+                     ("Upper quartile of entropy", entropyCounts.findPercentile(75))]
+
+        # Fasta files have no qualities, so the mean quality is left empty for them.
+        rows.append(("Mean quality", round(self.qualityTotal / self.qualityReads, 2) if self.qualityReads else None))
+
+        return rows
+
+
+class ReadProfiler:
+    """
+    Finds the GC content, entropy, length, N count and mean quality of every read of a file in one pass. The bases of
+    each batch of reads are counted once, and every metric is found from the counts, so the file is parsed once
+    rather than once for each of -find_gc and -find_entropy. The metrics are written to a per-read table, and passed
+    to consumers, such as GCBins and EntropyCounts, which build the aggregates for the plots and the summary.
+    """
+
+    fieldNames = ["Read ID", "Length", "GC content", "Entropy", "N count", "Mean quality"]
+
+    def __init__(self, batchSize=100000, qualityOffset=33):
+        """
+        Initialises the class
+        :param batchSize: The number of reads to profile at a time.
+        :param qualityOffset: The ASCII offset of the quality scores. 33 for Sanger and Illumina 1.8+ fastq.
+        """
+        self.batchSize = batchSize
+        self.qualityOffset = qualityOffset
+        self.sequenceUtils = SequenceUtils()
+        self.gcCalculator = GCCalculator()
+        self.entropyFinder = EntropyFinder()
+
+    def findMeanQualities(self, batch, lengths):
+        """
+        Finds the mean quality score of every read in a batch, from the quality buffer, without decoding it.
+        :param batch: A ReadBatch.
+        :param lengths: Array of the length of each read.
+        :return: Array of the mean quality of each read, to 2dp. Reads without a quality string of the same length as
+        their sequence, such as those of fasta files or sam rows with '*', are given NaN.
+        """
+        offsets = np.frombuffer(batch.qualityOffsets, dtype=np.uint64).astype(np.int64)
+        qualityLengths = np.diff(offsets)
+        scores = np.frombuffer(batch.qualities, dtype=np.uint8).astype(np.int64) - self.qualityOffset
+
+        # The total of each read is the difference of the running total at its ends.
+        totals = np.concatenate(([0], np.cumsum(scores)))
+        sums = totals[offsets[1:]] - totals[offsets[:-1]]
+
+        hasQuality = (qualityLengths == lengths) & (qualityLengths > 0)
+        means = np.full(len(lengths), np.nan)
+        np.divide(sums, qualityLengths, out=means, where=hasQuality)
+
+        return np.round(means, 2)
+
+    def profileBatch(self, batch):
+        """
+        Finds every metric of every read in a batch at once.
+        :param batch: A ReadBatch of the reads.
+        :return: A dictionary of arrays, with a value for each read: "Length", "GC" (the GC % to 2dp, as
+        GCCalculator.getGCContent() gives), "Entropy" (to 5 significant figures, as EntropyFinder.findEntropy() gives),
+        "N" (the count of N and other bases) and "Mean quality".
+        """
+        counts, lengths = self.sequenceUtils.countBases(batch)
+
+        return {"Length": lengths, "GC": self.gcCalculator.getGCContentFromCounts(counts, lengths),
+                "Entropy": self.entropyFinder.findEntropyFromCounts(counts, lengths, batch), "N": counts[:, 4],
+                "Mean quality": self.findMeanQualities(batch, lengths)}
+
+    def profileFile(self, filepath, outputFilename="read_profile", consumers=()):
+        """
+        Profiles every read of a file in a single pass, a batch at a time. Each batch is written to the per-read table,
+        and given to each consumer, as it is profiled.
+        :param filepath: The file of reads. Can be fasta, fastq, sam or map, and compressed.
+        :param outputFilename: The name of the CSV file of the per-read table.
+        :param consumers: Objects with a consumeProfile(batch, profile) function, such as GCBins and EntropyCounts.
+        :return: The ProfileSummary of the file.
+        """
+        handler = FileHandler()
+        summary = ProfileSummary()
+        consumers = [summary] + list(consumers)
+
+        def batches():
+            for batch in handler.iterBatches(filepath, self.batchSize):
+                profile = self.profileBatch(batch)
+                for consumer in consumers:
+                    consumer.consumeProfile(batch, profile)
+
+                # Lengths and counts are written as unsigned integers in the Parquet and Arrow formats.
+                yield [batch.getReadIds(), profile["Length"].astype(np.uint32), profile["GC"], profile["Entropy"],
+                       profile["N"].astype(np.uint32), profile["Mean quality"]]
+
+        handler.writeColumnsToCSV(self.fieldNames, batches(), outputFile=outputFilename)
+
+        return summary
+
+    def processFile(self, filepath, profileName, summaryName, outlierName, binSize=10, cache=None):
+        """
+        Profiles one file for main(), and writes its summary and entropy outliers.
+        :param filepath: The input file.
+        :param profileName: The name of the CSV file of the per-read table.
+        :param summaryName: The name of the CSV file of the summary.
+        :param outlierName: The name of the CSV file of the entropy outliers.
+        :param binSize: Size of the GC content bins.
+        :param cache: A ResultCache to restore the tables and aggregates from, if the file has been profiled before
+        with the same options. If None, the file is always profiled.
+        :return: A tuple of the GCBins and EntropyCounts of the file.
+        """
+        print(filepath)
+        profile = partial(self.profileAndSummarise, filepath, profileName, summaryName, outlierName, int(binSize))
+
+        if cache is None:
+            return profile()
+
+        handler = FileHandler()
+        artifacts = {"profile": handler.getOutputPath(profileName), "summary": handler.getOutputPath(summaryName),
+                     "outliers": handler.getOutputPath(outlierName)}
+        return cache.run("profile", [filepath], {"binSize": int(binSize), "qualityOffset": self.qualityOffset,
+                                                 "format": FileHandler.outputFormat}, artifacts, profile)
+
+    def profileAndSummarise(self, filepath, profileName, summaryName, outlierName, binSize=10):
+        """
+        Profiles one file, and writes its summary and entropy outliers. Called by processFile().
+        :param filepath: The input file.
+        :param profileName: The name of the CSV file of the per-read table.
+        :param summaryName: The name of the CSV file of the summary.
+        :param outlierName: The name of the CSV file of the entropy outliers.
+        :param binSize: Size of the GC content bins.
+        :return: A tuple of the GCBins and EntropyCounts of the file.
+        """
+        gcBins, entropyCounts = GCBins(binSize), EntropyCounts()
+
+        summary = self.profileFile(filepath, profileName, consumers=[gcBins, entropyCounts])
+        FileHandler().writeRowsToCSV(["Metric", "Value"], summary.getRows(entropyCounts), outputFile=summaryName)
+
+        self.entropyFinder.findOutliersFromProfile(FileHandler().getOutputPath(profileName), entropyCounts,
+                                                   outputFilename=outlierName)
+
+        return gcBins, entropyCounts
+
+    def main(self, files, profileName="read_profile", binSize=10, barChart=True, histogram=True, stripPlot=True,
+             yLabel="Number of sequences", xLabel="Bin", title="Default", histName="output_histogram",
+             barName="output_bar_chart", stripPlotName="strip_plots", outlierFileName="entropy_outliers", workers=1,
+             cache=None):
+        """
+        Main function for this class. Profiles each file once, then makes the outputs of both -find_gc and
+        -find_entropy from the profiles. Output names are keyed by the index of the file.
+        :param files: Input files.
+        :param profileName: Name of the per-read tables. A summary table is also written for each file.
+        :param binSize: Size of the GC content bins.
+        :param barChart: Whether to produce a bar chart of the GC content bins.
+        :param histogram: Whether to produce histograms of GC content.
+        :param stripPlot: Whether to produce strip plots of entropy.
+        :param yLabel: Y label for the GC plots.
+        :param xLabel: X label for the GC plots.
+        :param title: Title for the plots.
+        :param histName: Name of the histogram.
+        :param barName: Name of the bar chart.
+        :param stripPlotName: Name of the strip plot.
+        :param outlierFileName: Name of the CSV files of entropy outliers.
+        :param workers: The number of files to profile at once, each in its own process. Default 1.
+        :param cache: A ResultCache, so that files profiled before with the same options are not profiled again. Only
+        the plots are made again. Default None, for no caching.
+        """
+        count = range(len(files))
+        results = ParallelUtils(workers).mapOverFiles(self.processFile, files,
+                                                      [f"{profileName}_for_file_{x}" for x in count],
+                                                      [f"{profileName}_summary_for_file_{x}" for x in count],
+                                                      [f"{outlierFileName}_for_file_{x}" for x in count],
+                                                      repeat(binSize), repeat(cache))
+        allBins = [gcBins for gcBins, _ in results]
+
+        for index, (_, entropyCounts) in enumerate(results):
+            average, minEntropy, maxEntropy = entropyCounts.findAverageMinMax()
+            print(f"File {index}:\n"
+                  f"Average Entropy of Dataset: {average}\n"
+                  f"Minimum Entropy of Dataset: {minEntropy}\n"
+                  f"Maximum Entropy of Dataset: {maxEntropy}")
+
+        if barChart:
+            self.gcCalculator.plotBarChart([gcBins.getBinnedData() for gcBins in allBins], barName, yLabel, xLabel,
+                                           title)
+
+        if histogram:
+            self.gcCalculator.plotHistograms(allBins, yLabel, xLabel, title, filename=histName)
+
+        if stripPlot:
+            handler = FileHandler()
+            self.entropyFinder.createStripPlots([handler.getOutputPath(f"{profileName}_for_file_{x}") for x in count],
+                                                title=title, filename=stripPlotName)
@@ -1,23 +1,68 @@
 import difflib
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import matplotlib.pyplot as plt
 
 from utility.StatisticsUtils import Statistics
 from utility.FileHandlingUtils import FileHandler
+from utility.IndexUtils import SimilarityIndex
 from utility.PlotsUtils import PlotsUtils
 
+# The set being searched, or its SimilarityIndex. It is shared with worker processes through this, rather than being
+# pickled with every chunk of work: forked workers inherit it without copying, and other workers set it once, in
+# setUpSearchSet().
+sharedSearchSet = None
+
+
+def setUpSearchSet(sequences, useIndex):
+    """
+    Sets the set of sequences to search, in the current process.
+    :param sequences: The sequences to search.
+    :param useIndex: Whether to build a SimilarityIndex of them.
+    """
+    global sharedSearchSet
+    sharedSearchSet = SimilarityIndex(sequences) if useIndex else list(sequences)
+
+
+def findMatchesForChunk(sequences, number, cutoff):
+    """
+    Finds the closest matches of a chunk of sequences in the shared search set. Runs in the worker processes.
+    :param sequences: The chunk of sequences.
+    :param number: The number of closest matches to find.
+    :param cutoff: The similarity cut-off.
+    :return: List of the matches of each sequence, in the same order as the chunk.
+    """
+    results = []
+
+    for sequence in sequences:
+        if isinstance(sharedSearchSet, SimilarityIndex):
+            results.append(sharedSearchSet.findClosestMatches(sequence, number, cutoff))
+
+        else:
+            results.append(difflib.get_close_matches(sequence, sharedSearchSet, n=number, cutoff=cutoff))
+
+    return results
+
+
 class FindMatches:
-    def __init__(self, n=3, cutoff=0.6):
+    def __init__(self, n=3, cutoff=0.6, workers=1):
         """
         Initialises the class
         :param n: The number of closest matches for the program to find.
         :param cutoff: The similarity cut-off.
+        :param workers: The number of processes to compare sequences with.
         """
         self.number = n
         self.cutoff = cutoff
+        self.workers = workers
 
-    def findMatches(self, setOne, setTwo, sampleFirst=True, sampleSecond=True, percentage=0.001, seed="Random"):
+    def findMatches(self, setOne, setTwo, sampleFirst=False, sampleSecond=False, percentage=0.001, seed="Random",
+                    useIndex=True):
         """
-        Uses difflib.get_close_matches() function to find the n closest matches of a sequence.
+        Finds the n closest matches of a sequence, either with a SimilarityIndex of the second set, or with the
+        difflib.get_close_matches() function, which compares every pair of sequences.
         Loops through each of the sequences in the first file, looking for matches in the second.
         :param setOne: The first set, which will be looped through.
         :param setTwo: The second set, to be searched.
@@ -25,6 +70,9 @@ class FindMatches:
         :param sampleSecond: Whether to sample the second set. Useful for large sets.
         :param percentage: The percentage of the set(s) to sample.
         :param seed: A seed to control the sample.
+        :param useIndex: Whether to use the SimilarityIndex. Its similarity is from the edit distance, rather than
+        difflib's ratio. It is fast enough that the sets do not need to be sampled.
+        The sequences of the first set are split into chunks, and compared by self.workers processes.
         :return: A dictionary containing all the sequences from the first file and its closest matches.
         """
         output = dict()
@@ -36,16 +84,51 @@ class FindMatches:
         if sampleSecond:
             setTwo = stats.findRandomSampleDictionary(setTwo, percentage, seed)
 
-        setTwoSequences = setTwo.keys()
-        count = 0
-        for sequence in setOne:
-            count += 1
-            temp = difflib.get_close_matches(sequence, setTwoSequences, n=self.number, cutoff=self.cutoff)
-            output.update({sequence: temp})
+        global sharedSearchSet
+        setUpSearchSet(setTwo.keys(), useIndex)
+
+        sequences = list(setOne)
+        # Several chunks per worker, so that workers which finish early are given more work.
+        chunkSize = max(1, math.ceil(len(sequences) / (max(1, self.workers) * 4)))
+        chunks = [sequences[i:i + chunkSize] for i in range(0, len(sequences), chunkSize)]
+
+        if self.workers > 1:
+            if "fork" in multiprocessing.get_all_start_methods():
+                executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("fork"))
+
+            else:
+                executor = ProcessPoolExecutor(self.workers, initializer=setUpSearchSet,
+                                               initargs=(list(setTwo), useIndex))
+
+            with executor:
+                # map() returns the results in the order of the chunks, so the output is the same for any number of
+                # workers.
+                results = executor.map(findMatchesForChunk, chunks, repeat(self.number), repeat(self.cutoff))
+                self.collectResults(output, chunks, results, len(sequences))
+
+        else:
+            results = map(findMatchesForChunk, chunks, repeat(self.number), repeat(self.cutoff))
+            self.collectResults(output, chunks, results, len(sequences))
+
+        sharedSearchSet = None
 
-            print("{:.2f}% compared".format(count / len(setOne) * 100))
         return output
 
+    def collectResults(self, output, chunks, results, total):
+        """
+        Adds the matches of each chunk to the output, in order, printing the progress after each chunk.
+        :param output: The dictionary of sequences and their matches.
+        :param chunks: The chunks of sequences.
+        :param results: The matches for each chunk, from findMatchesForChunk().
+        :param total: The total number of sequences.
+        """
+        count = 0
+        for chunk, chunkResults in zip(chunks, results):
+            output.update(zip(chunk, chunkResults))
+            count += len(chunk)
+
+            print("{:.2f}% compared".format(count / total * 100))
+
     def findHamming(self, data):
         """
         Finds the hamming distance of two passed sequences. Used in this context to find the distance between a
@@ -55,24 +138,45 @@ class FindMatches:
         """
         stats = Statistics()
 
-        for sequence in data:
-            try:
-                closest = data.get(sequence)[0]
+        # The distances of all sequences with a match are found at once, rather than a pair at a time.
+        matched = [sequence for sequence in data if data.get(sequence)]
+        distances = stats.findHammingPairs(matched, [data.get(sequence)[0] for sequence in matched])
 
-            except IndexError:
-                continue
-
-            data.update({sequence: data.get(sequence) + [stats.findHamming(sequence, closest)]})
+        for sequence, distance in zip(matched, distances.tolist()):
+            data.update({sequence: data.get(sequence) + [distance]})
 
         print("Found hamming distances")
         return data
 
-    def main(self, fileOne, fileTwo, sampleFirst=True, sampleComparison=True, percentage=0.001, seed="Random",
+    def getData(self, filepath, sample, percentage, seed):
+        """
+        Reads the sequences of an input file, or a sample of them. Where the file can be indexed, only the sampled
+        records are read. Otherwise, the file is sampled in a single pass, without loading it.
+        :param filepath: The input file.
+        :param sample: Whether to sample the file.
+        :param percentage: The percentage to sample the file by.
+        :param seed: Seed for the random sample.
+        :return: Dictionary of the sequences, in the form of FileHandler.getDataFromInputFile().
+        """
+        stats = Statistics()
+
+        if sample:
+            data = stats.findRandomSampleFromFile(filepath, percentage, seed)
+
+            if data is not None:
+                return data
+
+            # Files that cannot be indexed, such as compressed ones, are sampled as they are streamed.
+            return stats.sampleRecordsOfFile(filepath, fraction=percentage, seed=seed)
+
+        return FileHandler().getDataFromInputFile(filepath)
+
+    def main(self, fileOne, fileTwo, sampleFirst=False, sampleComparison=False, percentage=0.001, seed="Random",
              outputCSVName="default_csv_name", histogramOfHammingDists=True, xLabel="Default", yLabel="Default",
-             title="Default", histogramFileName="default_histogram"):
+             title="Default", histogramFileName="default_histogram", useIndex=True):
         """
-        Main function for this class. By default, samples the files inputted to 0.001%, as this was designed for very
-        large files.
+        Main function for this class. By default, the whole files are compared, as the SimilarityIndex is fast enough
+        for large files. Either file can still be sampled, such as when matches are found with difflib.
         :param fileOne: First file for comparison. The sequences in this will be compared against the second file.
         :param fileTwo: Second file for comparison. These will be searched through to find matches.
         :param sampleFirst: Whether to sample the first input file.
@@ -86,12 +190,13 @@ class FindMatches:
         :param yLabel: Y label for histogram
         :param title: Title for histogram
         :param histogramFileName: File name of output Histogram
+        :param useIndex: Whether to find matches with a SimilarityIndex, rather than difflib. Default True.
         """
         fileHandler = FileHandler()
-        dataOne = fileHandler.getDataFromInputFile(fileOne)
-        dataTwo = fileHandler.getDataFromInputFile(fileTwo)
+        dataOne = self.getData(fileOne, sampleFirst, percentage, seed)
+        dataTwo = self.getData(fileTwo, sampleComparison, percentage, seed)
 
-        matches = self.findMatches(dataOne, dataTwo, sampleFirst, sampleComparison, percentage, seed)
+        matches = self.findMatches(dataOne, dataTwo, False, False, percentage, seed, useIndex)
         matches = self.findHamming(matches)
 
         fieldNames = ["Sequence"]
@@ -102,7 +207,7 @@ class FindMatches:
 
         if histogramOfHammingDists:
             print("Producing Histogram")
-            df = fileHandler.convertCSVToDataFrame(f"../Data/output/csv/{outputCSVName}.csv")
+            df = fileHandler.convertCSVToDataFrame(fileHandler.getOutputPath(outputCSVName))
             plots = PlotsUtils()
 
             fig, ax = plt.subplots()
@@ -0,0 +1,84 @@
+import json
+import math
+import numpy as np
+
+
+class BloomFilter:
+    """
+    A Bloom filter of 64-bit hashes, such as those from SequenceUtils.hashStrings(). It can say that a hash was
+    definitely not added, or that it probably was, with a false positive rate chosen when it is made. It takes around
+    10 bits per item for a 1% false positive rate, rather than the 64 bits of a set of hashes.
+    """
+
+    def __init__(self, expectedItems, falsePositiveRate=0.01):
+        """
+        Makes an empty filter, sized for the number of items and false positive rate.
+        :param expectedItems: The number of items that will be added.
+        :param falsePositiveRate: The chance that an item which was not added is reported as added.
+        """
+        expectedItems = max(1, int(expectedItems))
+        bitCount = math.ceil(-expectedItems * math.log(falsePositiveRate) / math.log(2) ** 2)
+
+        self.bits = np.zeros(math.ceil(bitCount / 64), dtype=np.uint64)
+        self.size = len(self.bits) * 64
+        self.hashCount = max(1, round(self.size / expectedItems * math.log(2)))
+        self.count = 0
+        # What the filter was built from, such as the file and how its reads were keyed, so that a saved filter is
+        # only reused for the same reads.
+        self.metadata = dict()
+
+    def findPositions(self, hashes):
+        """
+        Finds the bit positions for each hash, using double hashing: the i-th position is h1 + i * h2, where h1 and h2
+        are the two halves of the 64-bit hash.
+        :param hashes: A uint64 array of hashes.
+        :return: Array of positions, with a row for each hash and a column for each of the hashCount positions.
+        """
+        lower = hashes & np.uint64(0xFFFFFFFF)
+        upper = (hashes >> np.uint64(32)) | np.uint64(1)
+        steps = np.arange(self.hashCount, dtype=np.uint64)
+
+        return (lower.reshape(-1, 1) + steps * upper.reshape(-1, 1)) % np.uint64(self.size)
+
+    def add(self, hashes):
+        """
+        Adds an array of hashes to the filter.
+        :param hashes: A uint64 array of hashes.
+        """
+        positions = self.findPositions(hashes).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(6), np.uint64(1) << (positions & np.uint64(63)))
+        self.count += len(hashes)
+
+    def contains(self, hashes):
+        """
+        Checks whether each of an array of hashes was probably added to the filter.
+        :param hashes: A uint64 array of hashes.
+        :return: A boolean array. False means the hash was definitely not added.
+        """
+        positions = self.findPositions(hashes)
+        isSet = (self.bits[positions >> np.uint64(6)] >> (positions & np.uint64(63))) & np.uint64(1)
+
+        return isSet.all(axis=1)
+
+    def save(self, filepath):
+        """
+        Saves the filter and its metadata, so the same one can be used for several files without being rebuilt.
+        :param filepath: The file to save to. numpy adds .npz if it is missing.
+        """
+        np.savez(filepath, bits=self.bits, header=np.array([self.size, self.hashCount, self.count], dtype=np.int64),
+                 metadata=np.array(json.dumps(self.metadata, sort_keys=True)))
+
+    @classmethod
+    def load(cls, filepath):
+        """
+        Loads a filter saved by save().
+        :param filepath: The saved file.
+        :return: The BloomFilter. Filters saved without metadata are given empty metadata.
+        """
+        with np.load(filepath) as saved:
+            bloomFilter = cls.__new__(cls)
+            bloomFilter.bits = saved["bits"]
+            bloomFilter.size, bloomFilter.hashCount, bloomFilter.count = (int(value) for value in saved["header"])
+            bloomFilter.metadata = json.loads(str(saved["metadata"])) if "metadata" in saved.files else dict()
+
+        return bloomFilter
@@ -0,0 +1,178 @@
+import json
+import os
+import pickle
+import shutil
+import time
+from hashlib import blake2b
+
+from .FileHandlingUtils import FileHandler
+
+
+class ResultCache:
+    """
+    A cache of the results of stages of the tool, such as k-mer counts and the tables of GC content, so that a stage
+    run again on unchanged input is skipped. Entries are addressed by the contents of the input files and the
+    parameters of the stage, not by the names of the outputs: a hit copies the stored artifacts to wherever the run
+    asks for them. Each entry is a directory holding the artifacts, the pickled result of the stage, and a manifest.
+    When the cache grows past maxSize, the least recently used entries are removed.
+    """
+
+    def __init__(self, directory="../Data/intermediary/cache", maxSize=10 * 1024 ** 3, sampleSize=1 << 20):
+        """
+        Initialises the class
+        :param directory: Where the entries are stored.
+        :param maxSize: The most bytes the entries may take up. Default 10 GB.
+        :param sampleSize: The number of bytes hashed from each of the start, middle and end of an input file.
+        """
+        self.directory = directory
+        self.maxSize = maxSize
+        self.sampleSize = sampleSize
+
+    def findFingerprint(self, filepath):
+        """
+        Finds the fingerprint of an input file with FileHandler.findFingerprint(), from its size, modification time,
+        and a hash of three samples of its contents, so that large files are not read in full.
+        :param filepath: The file.
+        :return: The fingerprint, as a hex string.
+        """
+        return FileHandler().findFingerprint(filepath, self.sampleSize)
+
+    def findKey(self, stage, files, parameters):
+        """
+        Finds the key of a run of a stage.
+        :param stage: The name of the stage, such as "kmers".
+        :param files: The input files of the run. Files made by an earlier stage should not be given, as they have a
+        new modification time whenever the stage is run again. Give the key of that stage as a parameter instead.
+        :param parameters: Dictionary of the parameters that change the result, such as k. Values must be
+        representable as JSON, or as strings.
+        :return: The key, as a hex string.
+        """
+        digest = blake2b(stage.encode(), digest_size=16)
+        for filepath in files:
+            digest.update(self.findFingerprint(filepath).encode())
+
+        digest.update(json.dumps(parameters, sort_keys=True, default=str).encode())
+
+        return digest.hexdigest()
+
+    def getEntryPath(self, key):
+        """
+        :param key: The key of an entry.
+        :return: The directory of the entry.
+        """
+        return f"{self.directory}/{key}"
+
+    def load(self, key, artifacts):
+        """
+        Restores an entry, copying each of its artifacts, with its modification time, to where it is asked for, and
+        marks it as used.
+        :param key: The key of the entry.
+        :param artifacts: Dictionary of the name of each artifact, and the path to copy it to.
+        :return: A tuple of whether the entry was found, and the result stored with it.
+        """
+        entryPath = self.getEntryPath(key)
+
+        try:
+            with open(f"{entryPath}/manifest.json", "r") as file:
+                manifest = json.load(file)
+
+            # Artifacts that the stage did not make are not stored, so only those in the entry are restored.
+            for name in manifest["artifacts"]:
+                if name in artifacts:
+                    os.makedirs(os.path.dirname(artifacts[name]) or ".", exist_ok=True)
+                    shutil.copy2(f"{entryPath}/{name}", artifacts[name])
+
+            with open(f"{entryPath}/result.pickle", "rb") as file:
+                result = pickle.load(file)
+
+        except (FileNotFoundError, json.JSONDecodeError, pickle.UnpicklingError, EOFError):
+            return False, None
+
+        manifest["lastUsed"] = time.time()
+        with open(f"{entryPath}/manifest.json", "w") as file:
+            json.dump(manifest, file)
+
+        return True, result
+
+    def store(self, key, artifacts, result=None):
+        """
+        Stores the artifacts and result of a run as an entry. The entry is written to a temporary directory and then
+        renamed, so an entry that is interrupted is never read. Then old entries are evicted, if needed.
+        :param key: The key of the entry.
+        :param artifacts: Dictionary of the name of each artifact, and its path. Paths that do not exist are skipped.
+        :param result: The result of the run, which must be picklable.
+        """
+        entryPath = self.getEntryPath(key)
+        temporaryPath = f"{entryPath}.{os.getpid()}.tmp"
+        os.makedirs(temporaryPath, exist_ok=True)
+
+        stored = []
+        for name, path in artifacts.items():
+            if os.path.exists(path):
+                shutil.copy2(path, f"{temporaryPath}/{name}")
+                stored.append(name)
+
+        with open(f"{temporaryPath}/result.pickle", "wb") as file:
+            pickle.dump(result, file)
+
+        size = sum(os.path.getsize(f"{temporaryPath}/{name}") for name in os.listdir(temporaryPath))
+        with open(f"{temporaryPath}/manifest.json", "w") as file:
+            json.dump({"artifacts": stored, "size": size, "lastUsed": time.time()}, file)
+
+        shutil.rmtree(entryPath, ignore_errors=True)
+        os.replace(temporaryPath, entryPath)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the entries take up at most maxSize bytes.
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            try:
+                with open(f"{self.getEntryPath(key)}/manifest.json", "r") as file:
+                    manifest = json.load(file)
+
+            except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+                continue
+
+            entries.append((manifest["lastUsed"], manifest["size"], key))
+
+        totalSize = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if totalSize <= self.maxSize:
+                break
+
+            shutil.rmtree(self.getEntryPath(key), ignore_errors=True)
+            totalSize -= size
+
+    def clear(self):
+        """
+        Removes every entry.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def run(self, stage, files, parameters, artifacts, function):
+        """
+        Runs a stage, unless it has been run before on the same input with the same parameters, in which case its
+        artifacts and result are restored from the cache instead.
+        :param stage: The name of the stage.
+        :param files: The input files of the stage.
+        :param parameters: Dictionary of the parameters that change the result.
+        :param artifacts: Dictionary of a name for each file the stage writes, and its path.
+        :param function: The stage, as a function that takes no arguments. If it raises an error, nothing is stored, so
+        a stage that fails should raise rather than return.
+        :return: What the function returned.
+        """
+        key = self.findKey(stage, files, parameters)
+
+        found, result = self.load(key, artifacts)
+        if found:
+            print(f"Using the cached results of {stage}" + (f" for {', '.join(files)}." if files else "."))
+            return result
+
+        result = function()
+        self.store(key, artifacts, result)
+
+        return result
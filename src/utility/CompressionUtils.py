@@ -0,0 +1,224 @@
+import bz2
+import gzip
+import io
+import os
+import queue
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class BackgroundDecompressor(io.RawIOBase):
+    """
+    A binary stream that is filled by a background thread, so that decompression and parsing overlap. The thread puts
+    chunks of decompressed data into a bounded queue, which readinto() takes them from.
+    """
+
+    def __init__(self, chunks, maxQueuedChunks=16):
+        """
+        Starts the background thread.
+        :param chunks: A function that returns an iterable of decompressed byte chunks. It is called in the thread.
+        :param maxQueuedChunks: The most chunks to decompress ahead of the reader.
+        """
+        super().__init__()
+        self.chunks = queue.Queue(maxsize=maxQueuedChunks)
+        self.stopped = threading.Event()
+        self.current = memoryview(b"")
+        self.finished = False
+
+        self.thread = threading.Thread(target=self.fillQueue, args=(chunks,), daemon=True)
+        self.thread.start()
+
+    def fillQueue(self, chunks):
+        """
+        Runs in the background thread. Decompresses chunks into the queue until the data ends or the stream is closed.
+        An exception is passed through the queue, to be raised in the reading thread.
+        :param chunks: The function returning the chunks.
+        """
+        try:
+            for chunk in chunks():
+                if not self.putChunk(chunk):
+                    return
+
+            self.putChunk(None)  # Marks the end of the data.
+
+        except Exception as error:
+            self.putChunk(error)
+
+    def putChunk(self, chunk):
+        """
+        Puts a chunk in the queue, waiting for space, unless the stream has been closed.
+        :param chunk: The chunk.
+        :return: False if the stream was closed before the chunk could be added.
+        """
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(chunk, timeout=0.1)
+                return True
+
+            except queue.Full:
+                continue
+
+        return False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.finished and len(self.current) == 0:
+            chunk = self.chunks.get()
+
+            if chunk is None:
+                self.finished = True
+
+            elif isinstance(chunk, Exception):
+                self.finished = True
+                raise chunk
+
+            else:
+                self.current = memoryview(chunk)
+
+        size = min(len(buffer), len(self.current))
+        buffer[:size] = self.current[:size]
+        self.current = self.current[size:]
+
+        return size
+
+    def close(self):
+        self.stopped.set()
+        super().close()
+
+
+class CompressionUtils:
+    def __init__(self, chunkSize=1 << 20, threads=None):
+        """
+        Initialises the class
+        :param chunkSize: The size of the chunks that streams are decompressed in.
+        :param threads: The number of threads to decompress BGZF blocks with. Defaults to the number of CPUs.
+        """
+        self.chunkSize = chunkSize
+        self.threads = threads or os.cpu_count() or 1
+
+    def findCompression(self, filepath):
+        """
+        Finds how a file is compressed from its first bytes (magic number), rather than its extension.
+        :param filepath: The file.
+        :return: "bgzf", "gzip", "zstd", "bz2", or None if the file is not compressed.
+        """
+        with open(filepath, "rb") as file:
+            header = file.read(18)
+
+        if header[:2] == b"\x1f\x8b":
+            # BGZF is gzip with an extra field, "BC", holding the size of each block.
+            if len(header) >= 14 and header[3] & 4 and header[12:14] == b"BC":
+                return "bgzf"
+
+            return "gzip"
+
+        elif header[:4] == b"\x28\xb5\x2f\xfd":
+            return "zstd"
+
+        elif header[:3] == b"BZh":
+            return "bz2"
+
+        return None
+
+    def iterBGZFBlocks(self, file):
+        """
+        Reads the raw deflate data of each block of a BGZF file. Every block is a complete gzip member, with its size
+        in the header, so blocks can be found without decompressing them.
+        :param file: The BGZF file, opened in binary mode.
+        :return: Yields the compressed data of each block.
+        """
+        while True:
+            header = file.read(12)
+            if len(header) < 12:
+                return
+
+            extraLength = int.from_bytes(header[10:12], "little")
+            extra = file.read(extraLength)
+            blockSize = None
+
+            # Finds the BC subfield among the extra subfields.
+            position = 0
+            while position + 4 <= len(extra):
+                subfieldLength = int.from_bytes(extra[position + 2:position + 4], "little")
+                if extra[position:position + 2] == b"BC":
+                    blockSize = int.from_bytes(extra[position + 4:position + 6], "little") + 1
+                position += 4 + subfieldLength
+
+            if blockSize is None:
+                raise ValueError("BGZF block is missing its block size")
+
+            # The rest of the block is the deflate data, followed by the 8 bytes of CRC32 and uncompressed size.
+            rest = file.read(blockSize - 12 - extraLength)
+            yield rest[:-8]
+
+    def iterBGZFChunks(self, filepath):
+        """
+        Decompresses a BGZF file with a pool of threads, a block per task. zlib releases the GIL, so blocks are
+        inflated in parallel. The results are taken in file order, with a limited number of blocks in flight.
+        :param filepath: The BGZF file.
+        :return: Yields the decompressed blocks, in order.
+        """
+        with open(filepath, "rb") as file, ThreadPoolExecutor(self.threads) as executor:
+            pending = deque()
+
+            for block in self.iterBGZFBlocks(file):
+                pending.append(executor.submit(zlib.decompress, block, -15))
+
+                if len(pending) >= self.threads * 4:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+    def iterStreamChunks(self, opener):
+        """
+        Decompresses a stream in chunks.
+        :param opener: A function that opens the decompressed binary stream.
+        :return: Yields the decompressed chunks.
+        """
+        with opener() as stream:
+            while True:
+                chunk = stream.read(self.chunkSize)
+                if not chunk:
+                    return
+
+                yield chunk
+
+    def openText(self, filepath):
+        """
+        Opens a file for reading as text, decompressing it in a background thread if it is compressed.
+        :param filepath: The file, which may be gzip, BGZF, zstd or bz2 compressed, or not compressed.
+        :return: A text stream of the file.
+        """
+        compression = self.findCompression(filepath)
+
+        if compression is None:
+            return open(filepath, "r")
+
+        if compression == "bgzf":
+            chunks = lambda: self.iterBGZFChunks(filepath)
+
+        elif compression == "gzip":
+            chunks = lambda: self.iterStreamChunks(lambda: gzip.open(filepath, "rb"))
+
+        elif compression == "bz2":
+            chunks = lambda: self.iterStreamChunks(lambda: bz2.open(filepath, "rb"))
+
+        else:
+            if zstandard is None:
+                raise ImportError(f"{filepath} is zstd compressed. Please install zstandard using "
+                                  f"'pip install zstandard' to read it.")
+
+            chunks = lambda: self.iterStreamChunks(
+                lambda: zstandard.ZstdDecompressor().stream_reader(open(filepath, "rb"), closefd=True))
+
+        return io.TextIOWrapper(io.BufferedReader(BackgroundDecompressor(chunks), self.chunkSize))
@@ -1,5 +1,7 @@
 import subprocess
 from .FileHandlingUtils import FileHandler
+from .SequenceUtils import SequenceUtils
+import numpy as np
 import pandas as pd
 
 class DataUtils:
@@ -25,119 +27,76 @@ class DataUtils:
             print(f"{package} not installed.")
             return False
 
-    # Returns the difference in the counts of Kmers, along with the number of occurrences in both sets.
-
-    def compareRawKmerCountsFromJellyfish(self, dataOne, dataTwo):
+    def alignCounts(self, codesOne, countsOne, codesTwo, countsTwo, union=True):
         """
-        Finds the difference of the raw counts of k-mers in the files
-        :param dataOne: The first set of data
-        :param dataTwo: The second set of data
-        :return: A dictionary containing the k-mer, its number of occurrences in both sets, and the difference
-        between them.
+        Lines up the counts of two sets of k-mers by k-mer code.
+        :param codesOne: Sorted array of the codes of the k-mers of the first set.
+        :param countsOne: Array of their counts.
+        :param codesTwo: Sorted array of the codes of the k-mers of the second set.
+        :param countsTwo: Array of their counts.
+        :param union: Whether to keep the k-mers in either set, with a count of 0 in the set they are missing from,
+        rather than only those in both.
+        :return: A tuple of the sorted codes, and the int64 counts of each in the first and second sets.
         """
-        handler = FileHandler()
-        setOne = handler.getDataFAFile(dataOne)
-        setTwo = handler.getDataFAFile(dataTwo)
-
-        if len(setOne) > len(setTwo):
-            intersection = handler.intersection(setOne, setTwo)  # If the first set is larger than the second
-        else:
-            intersection = handler.intersection(setTwo, setOne)  # If the second set is larger than the first
+        if union:
+            codes = np.union1d(codesOne, codesTwo)
+            alignedOne = np.zeros(len(codes), dtype=np.int64)
+            alignedTwo = np.zeros(len(codes), dtype=np.int64)
+            alignedOne[np.searchsorted(codes, codesOne)] = countsOne
+            alignedTwo[np.searchsorted(codes, codesTwo)] = countsTwo
 
-        for kmer in intersection:
-            occurrences = intersection.get(kmer)
-            # Finds the difference between occurrences of k-mers, and appends it to the list.
-            occurrences.append(abs(int(occurrences[0] - occurrences[1])))
+            return codes, alignedOne, alignedTwo
 
-            # Updates the dictionary to contain the new list.
-            intersection.update({kmer: occurrences})
+        codes, indexesOne, indexesTwo = np.intersect1d(codesOne, codesTwo, assume_unique=True, return_indices=True)
 
-        return intersection
+        return codes, countsOne[indexesOne].astype(np.int64), countsTwo[indexesTwo].astype(np.int64)
 
-    def findTotalKmersFromJellyFishFA(self, data):
+    def compareKmerCounts(self, codesOne, countsOne, totalOne, codesTwo, countsTwo, totalTwo, k, union=True):
         """
-        A function that finds the total number of k-mers in a file outputted by Jellyfish
-        :param data: Dictionary containing k-mer: occurrences
-        :return: int total number of k-mers
+        Finds the raw difference, normalised counts and normalised difference of every k-mer of two sets at once.
+        :param codesOne: Sorted array of the codes of the k-mers of the first set.
+        :param countsOne: Array of their counts.
+        :param totalOne: The total number of k-mers in the first set.
+        :param codesTwo: Sorted array of the codes of the k-mers of the second set.
+        :param countsTwo: Array of their counts.
+        :param totalTwo: The total number of k-mers in the second set.
+        :param k: The length of the k-mers.
+        :param union: As in alignCounts().
+        :return: A dictionary of each k-mer, and its counts in both sets, raw difference, normalised counts and
+        normalised difference.
         """
-        total = 0
-        for i, kmer in enumerate(data):
-            total += int(data.get(kmer)[0][1:])
+        codes, alignedOne, alignedTwo = self.alignCounts(codesOne, countsOne, codesTwo, countsTwo, union)
 
-        return total
+        # Normalised to 8 decimal places.
+        normalisedOne = np.round(alignedOne / totalOne, 8)
+        normalisedTwo = np.round(alignedTwo / totalTwo, 8)
 
-    def normalise(self, occurrences, total):
-        """
-        Finds the normalised value of the occurrences of a k-mer.
-        :param occurrences: Number of occurrences of individual k-mer.
-        :param total: Total number of k-mers
-        :return: A float value of te normalised value. 8dp
-        """
-        return float(("{:.8f}".format(occurrences / total)))
+        columns = (alignedOne.tolist(), alignedTwo.tolist(), np.abs(alignedOne - alignedTwo).tolist(),
+                   normalisedOne.tolist(), normalisedTwo.tolist(), np.abs(normalisedOne - normalisedTwo).tolist())
 
-    def findDifferenceInNormalised(self, occurrences_setOne, total_setOne, occurrences_setTwo, total_set2):
-        """
-        Finds the difference between two normalised values.
-        :param occurrences_setOne: Number of occurrences of a k-mer in set one
-        :param total_setOne: Total number of k-mers in set one
-        :param occurrences_setTwo: Number of occurrences of a k-mer in set two
-        :param total_set2: Total number of k-mers in set two
-        :return: Tuple containing the two normalised values, and the difference between them.
-        """
-        return (self.normalise(occurrences_setOne, total_setOne), self.normalise(occurrences_setTwo, total_set2),
-                abs(self.normalise(occurrences_setOne, total_setOne) - self.normalise(occurrences_setTwo, total_set2)))
+        return {kmer: list(values) for kmer, *values in zip(SequenceUtils().decodeKmers(codes, k), *columns)}
 
-    def compareNormalisedKmerCounts(self, dataOne, dataTwo):
+    def alignTables(self, tableOne, tableTwo, union=True):
         """
-        Updates the set of intersecting kmers with the normalised numbers, and the difference.
-
-        This is required for the implementation of the writeToCSV function, as it must have the same number of
-        column labels and instances of data.
-        :param dataOne: The first input file.
-        :param dataTwo: The second input file.
+        Lines up the counts of the k-mers of two KmerCountTables.
+        :param tableOne: The first KmerCountTable.
+        :param tableTwo: The second KmerCountTable.
+        :param union: As in alignCounts().
+        :return: A tuple of the sorted codes, and their counts in the first and second tables.
         """
-        handler = FileHandler()
-        setOne = handler.getDataFAFile(dataOne)
-        setTwo = handler.getDataFAFile(dataTwo)
-
-        if len(setOne) > len(setTwo):
-            intersection = handler.intersection(setOne, setTwo)
-        else:
-            intersection = handler.intersection(setTwo, setOne)
-
-        totalKmersSetOne = self.findTotalKmersFromJellyFishFA(setOne)
-        totalKmersSetTwo = self.findTotalKmersFromJellyFishFA(setTwo)
-
-        # The below functionality follows the same basic format as compareRawKmerCountsFromJellyfish.
-        for kmer in intersection:
-            occurrences = intersection.get(kmer)
-
-            setOneNormalised, setTwoNormalised, difference = self.findDifferenceInNormalised(occurrences[0],
-                                                                                             totalKmersSetOne,
-                                                                                             occurrences[1],
-                                                                                             totalKmersSetTwo)
-
-            normalisedNums = [item for item in [setOneNormalised, setTwoNormalised, difference]]
+        return self.alignCounts(*tableOne.getCodesAndCounts(), *tableTwo.getCodesAndCounts(), union)
 
-            intersection.update({kmer: normalisedNums})
-
-        return intersection
-
-    def getRawAndNormalised(self, dataOne, dataTwo):
+    def getRawAndNormalisedFromTables(self, tableOne, tableTwo, union=True):
         """
-        Uses helper functions to find all values for all k-mers.
-        :param dataOne: The first input file.
-        :param dataTwo: The second input file.
-        :return:
+        Finds the raw and normalised counts of every k-mer of two KmerCountTables, with compareKmerCounts().
+        :param tableOne: The first KmerCountTable.
+        :param tableTwo: The second KmerCountTable.
+        :param union: Whether to include the k-mers that are only in one of the tables. Default True.
+        :return: A dictionary of each k-mer, and its counts, raw difference, normalised counts and normalised
+        difference.
         """
-        rawData = self.compareRawKmerCountsFromJellyfish(dataOne, dataTwo)
-        normalisedData = self.compareNormalisedKmerCounts(dataOne, dataTwo)
-
-        allData = dict()
-        for kmer in rawData:
-            allData.update({kmer: rawData.get(kmer) + normalisedData.get(kmer)})
-
-        return allData
+        return self.compareKmerCounts(*tableOne.getCodesAndCounts(), tableOne.total, *tableTwo.getCodesAndCounts(),
+                                      tableTwo.total, tableOne.k, union)
 
     def convertToMPLFormat(self, data, dataHeader):
         """
@@ -1,22 +1,645 @@
 import csv
+import io
+import mmap
+import os
 import subprocess
 import sys
+from array import array
+from hashlib import blake2b
 from itertools import islice
+import numpy as np
 import pandas as pd
 
+from .BloomFilterUtils import BloomFilter
+from .CompressionUtils import CompressionUtils
+from .SequenceUtils import SequenceUtils
+from .TableFormatUtils import TableFormatUtils
+
+
+class ReadRecord:
+    """
+    A single read. Uses __slots__, so no dictionary is made for each instance, and the metadata list is only built
+    when it is asked for.
+
+    A record can be unpacked as (sequence, metadata), the same form as the items of the getData... dictionaries.
+    """
+    __slots__ = ("header", "sequence", "quality", "fields")
+
+    def __init__(self, header, sequence, quality=None, fields=None):
+        """
+        :param header: The identifier line of the read, e.g. "@read1" or ">contig1".
+        :param sequence: The sequence of the read.
+        :param quality: The quality string of the read, if the file has one.
+        :param fields: The metadata columns of tabular files (sam and map), in the order of the old metadata lists.
+        """
+        self.header = header
+        self.sequence = sequence
+        self.quality = quality
+        self.fields = fields
+
+    def metadata(self):
+        """
+        Builds the metadata list in the same form as the getData... functions always have.
+        :return: A list of the metadata of the read.
+        """
+        if self.fields:
+            return list(self.fields)
+
+        elif self.quality is not None:
+            return [self.header, self.sequence, "+", self.quality]
+
+        return [self.header]
+
+    def __iter__(self):
+        yield self.sequence
+        yield self.metadata()
+
+    def __repr__(self):
+        return f"ReadRecord({self.header!r}, {self.sequence!r})"
+
+
+class ReadBatch:
+    """
+    A compact set of reads. The sequences, qualities and headers of all reads are held in three contiguous byte
+    buffers, with arrays of offsets marking where each read starts and ends. This costs a few bytes per read on top of
+    the data itself, rather than several Python objects per read, and duplicate sequences are all kept.
+    """
+
+    def __init__(self):
+        self.sequences = bytearray()
+        self.qualities = bytearray()
+        self.headers = bytearray()
+        # Read i is sequences[offsets[i]:offsets[i + 1]], and the same for the other buffers.
+        self.offsets = array("Q", [0])
+        self.qualityOffsets = array("Q", [0])
+        self.headerOffsets = array("Q", [0])
+        # Only sam and map reads have fields. None is stored for the others, to keep the indexes aligned.
+        self.fields = []
+
+    def append(self, record):
+        """
+        Adds a read to the end of the batch.
+        :param record: A ReadRecord.
+        """
+        self.appendBytes(record.header.encode("ascii"), record.sequence.encode("ascii"),
+                         None if record.quality is None else record.quality.encode("ascii"), record.fields)
+
+    def appendBytes(self, header, sequence, quality=None, fields=None):
+        """
+        Adds a read to the end of the batch from bytes, or memoryview slices of a MappedReadFile, without decoding it.
+        :param header: The header line.
+        :param sequence: The sequence.
+        :param quality: The quality string, if the read has one.
+        :param fields: The metadata columns of sam and map reads.
+        """
+        self.sequences += sequence
+        self.offsets.append(len(self.sequences))
+
+        if quality is not None:
+            self.qualities += quality
+        self.qualityOffsets.append(len(self.qualities))
+
+        self.headers += header
+        self.headerOffsets.append(len(self.headers))
+
+        self.fields.append(fields)
+
+    def getSequence(self, index):
+        """
+        :param index: The position of the read in the batch.
+        :return: The sequence of the read, as a string.
+        """
+        return self.sequences[self.offsets[index]:self.offsets[index + 1]].decode("ascii")
+
+    def getSequences(self):
+        """
+        Decodes the sequence buffer once, and slices it into the sequence of every read.
+        :return: A list of the sequences, as strings.
+        """
+        text = self.sequences.decode("ascii")
+        return [text[self.offsets[i]:self.offsets[i + 1]] for i in range(len(self))]
+
+    def getReadIds(self):
+        """
+        Decodes the header buffer once, and finds the id of every read: the first word of its header, without the
+        leading @ or >, as FileHandler.getReadKey() gives.
+        :return: A list of the read ids, as strings.
+        """
+        text = self.headers.decode("ascii")
+        readIds = []
+
+        for i in range(len(self)):
+            words = text[self.headerOffsets[i]:self.headerOffsets[i + 1]].split(maxsplit=1)
+            readId = words[0] if words else ""
+            readIds.append(readId[1:] if readId[:1] in ("@", ">") else readId)
+
+        return readIds
+
+    def getLengths(self):
+        """
+        :return: An array of the length of every sequence in the batch.
+        """
+        return array("Q", [self.offsets[i + 1] - self.offsets[i] for i in range(len(self))])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("ReadBatch index out of range")
+
+        qualityStart, qualityEnd = self.qualityOffsets[index], self.qualityOffsets[index + 1]
+        quality = None
+        if qualityEnd > qualityStart:
+            quality = self.qualities[qualityStart:qualityEnd].decode("ascii")
+
+        return ReadRecord(self.headers[self.headerOffsets[index]:self.headerOffsets[index + 1]].decode("ascii"),
+                          self.getSequence(index), quality, self.fields[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class MappedReadFile:
+    """
+    Random access to the records of an uncompressed fasta or fastq file, through a memory map of the file. An index
+    of where each record is, with the columns of a samtools .fai file, is built a chunk of the file at a time and
+    saved as a binary .npy file, so a record can be found by its number without reading the records before it.
+
+    The index takes 40 bytes per record, so this is for reading records out of order, such as sampling them. Files
+    read from start to end should be streamed with FileHandler.iterBatches() instead.
+
+    Sequences on a single line are returned as memoryview slices of the map, so they are never copied. Sequences
+    split over several lines have their line breaks removed, in one pass.
+    """
+
+    # The version of the index format. It is stored in the index, so an index of an older format is rebuilt.
+    indexVersion = 2
+
+    def __init__(self, filepath, indexPath=None, saveIndex=True, chunkSize=1 << 26):
+        """
+        Maps the file, and loads or builds its index.
+        :param filepath: The fasta or fastq file.
+        :param indexPath: Where the index is kept. Defaults to the file path with .idx.npy added.
+        :param saveIndex: Whether to save the index if it has to be built. If False, it is built in memory.
+        :param chunkSize: The number of bytes to search for line breaks at a time, when building the index.
+        :raises ValueError: If the file is not fasta or fastq, or its lines cannot be indexed, such as fastq records
+        over more than four lines, or fasta sequences with lines of different lengths.
+        """
+        self.filepath = filepath
+        self.indexPath = indexPath or f"{filepath}.idx.npy"
+        self.chunkSize = chunkSize
+
+        self.file = open(filepath, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        # An empty file cannot be mapped, so an empty bytes object stands in for it.
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.view = memoryview(self.map)
+
+        if self.size and self.map[:1] == b"@":
+            self.isFASTQ = True
+        elif not self.size or self.map[:1] == b">":
+            self.isFASTQ = False
+        else:
+            self.close()
+            raise ValueError(f"{filepath} is not an uncompressed fasta or fastq file")
+
+        problem = None
+        try:
+            if not self.loadIndex():
+                if saveIndex:
+                    self.saveIndex()
+                    self.loadIndex()
+                else:
+                    self.buildIndex()
+
+        except ValueError as error:
+            # The error is raised again outside this block, once its traceback, which holds numpy views of the map,
+            # has been freed. The map cannot be closed while they exist.
+            problem = str(error)
+
+        if problem is not None:
+            self.close()
+            raise ValueError(problem)
+
+    def iterLines(self, data):
+        """
+        Finds the start and end of every line in the file, a chunk at a time, so that only one chunk is compared at
+        once.
+        :param data: The file, as a uint8 array.
+        :return: Yields a tuple of the int64 arrays of the starts and ends of the lines that end in each chunk. Line
+        ends exclude the line break.
+        """
+        lineStart = 0
+
+        for chunkStart in range(0, self.size, self.chunkSize):
+            breaks = np.flatnonzero(data[chunkStart:chunkStart + self.chunkSize] == 10).astype(np.int64) + chunkStart
+            if len(breaks) == 0:
+                continue
+
+            starts = np.concatenate(([lineStart], breaks[:-1] + 1))
+            lineStart = int(breaks[-1]) + 1
+
+            yield starts, breaks
+
+        if lineStart < self.size:
+            # The last line has no line break after it.
+            yield np.array([lineStart], dtype=np.int64), np.array([self.size], dtype=np.int64)
+
+    def iterIndexRows(self):
+        """
+        Builds the index a chunk of the file at a time, so only the lines of one chunk are held at once. The columns
+        are those of a .fai file: the length of each sequence, the offset of its first base, the number of bases on
+        each line and the number of bytes on each line, then the offset of the qualities for fastq, or 0 for fasta.
+        :return: Yields an int64 array of the rows of the records that end in each chunk.
+        """
+        data = np.frombuffer(self.map, dtype=np.uint8)
+        # The lines of a fastq record that is split between chunks, or the fasta record that the next chunk may add
+        # sequence lines to.
+        pendingStarts, pendingEnds = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        openRecord = None
+
+        for starts, ends in self.iterLines(data):
+            lineLengths = ends - starts
+            if np.any(data[ends[lineLengths > 0] - 1] == ord("\r")):
+                raise ValueError(f"{self.filepath} has Windows line breaks")
+
+            if self.isFASTQ:
+                starts, ends = np.concatenate((pendingStarts, starts)), np.concatenate((pendingEnds, ends))
+                complete = len(starts) // 4 * 4
+                pendingStarts, pendingEnds = starts[complete:], ends[complete:]
+
+                yield self.findFASTQRows(data, starts[:complete], ends[:complete])
+
+            else:
+                rows, openRecord = self.findFASTARows(data, starts, ends, openRecord)
+                yield rows
+
+        if len(pendingStarts):
+            raise ValueError(f"{self.filepath} does not have four lines for every record")
+
+        if openRecord is not None and openRecord["lineCount"]:
+            yield self.closeRecord(openRecord)
+
+    def findFASTQRows(self, data, starts, ends):
+        """
+        Finds the index rows of whole fastq records. As in iterFASTQFile(), each record is four lines: header,
+        sequence, plus line and qualities.
+        :param data: The file, as a uint8 array.
+        :param starts: The starts of the lines of the records.
+        :param ends: The ends of the lines.
+        :return: The rows.
+        """
+        lineLengths = ends - starts
+        if np.any(data[starts[0::4]] != ord("@")) or np.any(data[starts[2::4]] != ord("+")) \
+                or np.any(lineLengths[3::4] != lineLengths[1::4]):
+            raise ValueError(f"{self.filepath} does not have four lines for every record")
+
+        offsets, lengths = starts[1::4], lineLengths[1::4]
+
+        return np.column_stack((lengths, offsets, lengths, starts[2::4] - offsets, starts[3::4]))
+
+    def findFASTARows(self, data, starts, ends, openRecord):
+        """
+        Finds the index rows of the fasta records that end in a chunk. The last record of the chunk may continue in
+        the next one, so it is returned open, as a dictionary of its totals so far, rather than as a row.
+        :param data: The file, as a uint8 array.
+        :param starts: The starts of the lines of the chunk.
+        :param ends: The ends of the lines.
+        :param openRecord: The record left open by the previous chunk, or None.
+        :return: A tuple of the rows, and the record left open.
+        """
+        lineLengths = ends - starts
+        isHeader = np.zeros(len(starts), dtype=bool)
+        isHeader[lineLengths > 0] = data[starts[lineLengths > 0]] == ord(">")
+        headerLines = np.flatnonzero(isHeader)
+
+        if len(headerLines) == 0:
+            # Lines before the first header of the file are not part of a record, as in iterFAFile().
+            if openRecord is not None:
+                self.extendRecord(openRecord, starts, lineLengths)
+
+            return np.zeros((0, 5), dtype=np.int64), openRecord
+
+        rows = []
+        if openRecord is not None:
+            self.extendRecord(openRecord, starts[:headerLines[0]], lineLengths[:headerLines[0]])
+            if openRecord["lineCount"]:
+                rows.append(self.closeRecord(openRecord))
+
+        # The records between the first and last headers end in this chunk, so are indexed together.
+        first, last = headerLines[0], headerLines[-1]
+        rows.append(self.findWholeFASTARows(starts[first:last], lineLengths[first:last], isHeader[first:last]))
+
+        openRecord = {"lineCount": 0, "length": 0, "offset": 0, "lineBases": 0, "secondStart": 0, "lastLength": 0}
+        self.extendRecord(openRecord, starts[last + 1:], lineLengths[last + 1:])
+
+        return np.concatenate(rows), openRecord
+
+    def findWholeFASTARows(self, starts, lineLengths, isHeader):
+        """
+        Finds the index rows of fasta records whose lines are all given, starting with a header line.
+        :param starts: The starts of the lines.
+        :param lineLengths: The lengths of the lines.
+        :param isHeader: Boolean array, True for each header line.
+        :return: The rows.
+        """
+        if len(starts) == 0:
+            return np.zeros((0, 5), dtype=np.int64)
+
+        # Every line is given the number of the record it belongs to.
+        recordIds = np.cumsum(isHeader) - 1
+        isSequence = ~isHeader
+        headerLines = np.flatnonzero(isHeader)
+
+        sequenceRecords = recordIds[isSequence]
+        sequenceLengths = lineLengths[isSequence]
+        lineCounts = np.bincount(sequenceRecords, minlength=len(headerLines))
+        lengths = np.bincount(sequenceRecords, weights=sequenceLengths, minlength=len(headerLines)).astype(np.int64)
+
+        hasSequence = lineCounts > 0
+        firstLineBases = np.zeros(len(headerLines), dtype=np.int64)
+        firstLineBases[hasSequence] = lineLengths[headerLines[hasSequence] + 1]
+
+        # The offsets of the bases can only be found from the line lengths if every line of a sequence but the
+        # last has the same number of bases, as samtools also requires.
+        isLastLine = np.ones(len(sequenceRecords), dtype=bool)
+        isLastLine[:-1] = sequenceRecords[1:] != sequenceRecords[:-1]
+        expectedLengths = firstLineBases[sequenceRecords]
+        if np.any(sequenceLengths[~isLastLine] != expectedLengths[~isLastLine]) \
+                or np.any(sequenceLengths[isLastLine] > expectedLengths[isLastLine]):
+            raise ValueError(f"{self.filepath} has sequences with lines of different lengths")
+
+        # As in iterFAFile(), a header without sequence lines is not a record.
+        lineCounts, firstLines = lineCounts[hasSequence], headerLines[hasSequence] + 1
+        offsets, lineBases = starts[firstLines], firstLineBases[hasSequence]
+        lineWidths = np.where(lineCounts > 1, starts[np.minimum(firstLines + 1, len(starts) - 1)] - offsets,
+                              lineBases + 1)
+
+        return np.column_stack((lengths[hasSequence], offsets, lineBases, lineWidths, np.zeros_like(offsets)))
+
+    def extendRecord(self, record, starts, lineLengths):
+        """
+        Adds sequence lines to a fasta record that is split between chunks.
+        :param record: The totals of the record, from findFASTARows().
+        :param starts: The starts of the lines to add.
+        :param lineLengths: Their lengths.
+        """
+        if len(starts) == 0:
+            return
+
+        count = record["lineCount"]
+        if count == 0:
+            record["offset"], record["lineBases"] = int(starts[0]), int(lineLengths[0])
+
+        if count < 2 <= count + len(starts):
+            record["secondStart"] = int(starts[1 - count])
+
+        # The line that was last is no longer, so it must now be full length too.
+        if (count and record["lastLength"] != record["lineBases"]) or np.any(lineLengths[:-1] != record["lineBases"]):
+            raise ValueError(f"{self.filepath} has sequences with lines of different lengths")
+
+        record["lineCount"] += len(starts)
+        record["length"] += int(lineLengths.sum())
+        record["lastLength"] = int(lineLengths[-1])
+
+    def closeRecord(self, record):
+        """
+        :param record: The totals of a fasta record with at least one sequence line, from findFASTARows().
+        :return: The index row of the record, as an array of one row.
+        """
+        if record["lastLength"] > record["lineBases"]:
+            raise ValueError(f"{self.filepath} has sequences with lines of different lengths")
+
+        lineWidth = record["secondStart"] - record["offset"] if record["lineCount"] > 1 else record["lineBases"] + 1
+
+        return np.array([[record["length"], record["offset"], record["lineBases"], lineWidth, 0]], dtype=np.int64)
+
+    def findIndexHeader(self):
+        """
+        Finds the first row of the saved index, which records the file it was built from, so that an index of a
+        changed file is not used.
+        :return: The row, of the version of the index format, the size of the file, whether it is fastq, and its
+        fingerprint from FileHandler.findFingerprint().
+        """
+        fingerprint = int(FileHandler().findFingerprint(self.filepath)[:15], 16)
+
+        return np.array([self.indexVersion, self.size, int(self.isFASTQ), fingerprint, 0], dtype=np.int64)
+
+    def setIndex(self, index):
+        """
+        Sets the columns of the index.
+        :param index: The rows of the index, without the header.
+        """
+        self.index = index
+        self.lengths, self.offsets, self.lineBases, self.lineWidths = (index[:, i] for i in range(4))
+        self.qualityOffsets = index[:, 4] if self.isFASTQ else None
+
+    def buildIndex(self):
+        """
+        Builds the index in memory, without saving it.
+        """
+        self.setIndex(np.concatenate([np.zeros((0, 5), dtype=np.int64)] + list(self.iterIndexRows())))
+
+    def saveIndex(self):
+        """
+        Builds the index and writes it to indexPath as a .npy file, a chunk at a time, so the whole index is never
+        held in memory. It is written to a temporary file and renamed, so other processes never read part of it.
+        """
+        temporaryPath = f"{self.indexPath}.{os.getpid()}.tmp"
+        # The .npy header is the same length for any number of rows, so it is written again once they are counted.
+        header = {"descr": np.lib.format.dtype_to_descr(np.dtype("<i8")), "fortran_order": False, "shape": (0, 5)}
+
+        with open(temporaryPath, "wb") as file:
+            np.lib.format.write_array_header_1_0(file, header)
+            dataStart = file.tell()
+            file.write(self.findIndexHeader().astype("<i8").tobytes())
+
+            count = 1
+            for rows in self.iterIndexRows():
+                file.write(np.ascontiguousarray(rows, dtype="<i8").tobytes())
+                count += len(rows)
+
+            file.seek(0)
+            np.lib.format.write_array_header_1_0(file, dict(header, shape=(count, 5)))
+            if file.tell() != dataStart:
+                raise ValueError(f"The index of {self.filepath} could not be written")
+
+        os.replace(temporaryPath, self.indexPath)
+
+    def loadIndex(self):
+        """
+        Loads an index saved by saveIndex(), if it was built from the file as it is now. The index is memory mapped
+        rather than read, so only the rows of the records that are used are read from disk.
+        :return: Whether the index was loaded. False if it does not exist, or is of a changed file.
+        """
+        try:
+            index = np.load(self.indexPath, mmap_mode="r")
+
+        except (OSError, ValueError):
+            return False
+
+        if index.ndim != 2 or index.shape[1] != 5 or len(index) == 0 \
+                or not np.array_equal(index[0], self.findIndexHeader()):
+            return False
+
+        self.setIndex(index[1:])
+        return True
+
+    def findEnd(self, offset, length, lineBases, lineWidth):
+        """
+        Finds the end of a sequence or its qualities in the file, from the line lengths.
+        :return: The offset after the last base.
+        """
+        if length == 0:
+            return offset
+
+        fullLines, remainder = divmod(length, lineBases)
+        return offset + fullLines * lineWidth + remainder - (0 if remainder else lineWidth - lineBases)
+
+    def getSlice(self, offset, index):
+        """
+        Gets the bases or qualities of a record, starting at offset.
+        :return: A memoryview of the map if they are on one line, otherwise bytes with the line breaks removed.
+        """
+        length = int(self.lengths[index])
+        lineBases = int(self.lineBases[index])
+        end = self.findEnd(offset, length, lineBases, int(self.lineWidths[index]))
+
+        if length <= lineBases:
+            return self.view[offset:end]
+
+        return bytes(self.view[offset:end]).replace(b"\n", b"")
+
+    def getSequenceView(self, index):
+        """
+        :param index: The number of the record.
+        :return: The sequence of the record, as a memoryview of the file if it is on one line, or bytes otherwise.
+        """
+        return self.getSlice(int(self.offsets[index]), index)
+
+    def getQualityView(self, index):
+        """
+        :param index: The number of the record.
+        :return: The qualities of a fastq record, in the same form as getSequenceView(), or None for fasta.
+        """
+        if not self.isFASTQ:
+            return None
+
+        return self.getSlice(int(self.qualityOffsets[index]), index)
+
+    def getHeaderView(self, index):
+        """
+        :param index: The number of the record.
+        :return: The whole header line of the record, as a memoryview of the file.
+        """
+        headerEnd = int(self.offsets[index]) - 1  # The line break at the end of the header.
+        headerStart = self.map.rfind(b"\n", 0, headerEnd) + 1
+
+        return self.view[headerStart:headerEnd]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("MappedReadFile index out of range")
+
+        quality = self.getQualityView(index)
+
+        return ReadRecord(bytes(self.getHeaderView(index)).decode("ascii"),
+                          bytes(self.getSequenceView(index)).decode("ascii"),
+                          None if quality is None else bytes(quality).decode("ascii"))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def getBatch(self, indexes):
+        """
+        Copies records into a ReadBatch straight from the map, without making strings of them.
+        :param indexes: Iterable of the numbers of the records.
+        :return: The ReadBatch.
+        """
+        batch = ReadBatch()
+
+        for index in indexes:
+            batch.appendBytes(self.getHeaderView(index), self.getSequenceView(index), self.getQualityView(index))
+
+        return batch
+
+    def close(self):
+        self.view.release()
+        if self.size:
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
 
 class FileHandler:
 
     """
     All getData... functions take the filepath as the filename parameter,
     and all return dictionaries returned by the getData... functions are in form: {sequence: [metadata]}
+
+    The iter... functions read the same files, but yield ReadRecord objects one at a time, so that files larger than
+    the available memory can be processed. iterRecords() picks the correct one for a file, and iterBatches() groups
+    the records into compact ReadBatch objects.
+
+    Input files may be compressed with gzip, bgzip, zstd or bzip2. They are recognised from their first bytes, and
+    decompressed in a background thread while they are parsed.
+
+    Tables of results are written to Data/output/csv in outputFormat: CSV by default, or Parquet or Arrow, which need
+    pyarrow. Set FileHandler.outputFormat to change it for every table. They are read back in any of the formats.
     """
 
-    def getDataMAPFile(self, filename):
+    # Extensions of compressed files, which are ignored when finding the type of a file from its extension.
+    compressionExtensions = (".gz", ".bgz", ".zst", ".zstd", ".bz2")
+    # Where the record indexes of input files are cached, by getIndexedFile().
+    indexDirectory = "../Data/intermediary/index"
+    # Where tables of results are written, and the format they are written in: csv, parquet or arrow.
+    outputDirectory = "../Data/output/csv"
+    outputFormat = "csv"
+    # The number of rows formatted at a time when writing a CSV file.
+    csvChunkSize = 100000
+
+    def __init__(self, decompressionThreads=None):
+        """
+        Initialises the class
+        :param decompressionThreads: The number of threads to decompress bgzip files with. Defaults to the number of
+        CPUs.
+        """
+        self.compression = CompressionUtils(threads=decompressionThreads)
+
+    def openInput(self, filepath):
+        """
+        Opens an input file as text, decompressing it if it is compressed.
+        :param filepath: The file.
+        :return: The text stream.
+        """
+        return self.compression.openText(filepath)
+
+    def iterMAPFile(self, filename):
+        """
+        Generator over the records of a .map file. Only one row is held in memory at a time.
+        :param filename: Filepath of the .map file.
+        :return: Yields a ReadRecord for each row.
+        """
         maxValue = sys.maxsize
-        reads = dict()
 
-        with open(filename, "r") as file:
+        with self.openInput(filename) as file:
             csvReader = csv.reader(file, delimiter="\t")  # These files are tab delimited.
             for row in csvReader:
                 try:
@@ -26,57 +649,260 @@ class FileHandler:
                     # If the program encounters an OverflowError, then the max value is made smaller.
                     maxValue = int(maxValue / 10)
 
-                metadata = [row[0], row[1], row[2], row[3], row[5]]
-                reads.update({row[4]: metadata})
+                yield ReadRecord(row[0], row[4], fields=(row[0], row[1], row[2], row[3], row[5]))
 
-        return reads
-
-    def getDataFASTQfile(self, filename):
-        reads = dict()
+    def getDataMAPFile(self, filename):
+        return self.recordsToDictionary(self.iterMAPFile(filename))
 
-        with open(filename, "r") as file:
+    def iterFASTQFile(self, filename):
+        """
+        Generator over the records of a fastq file. Only one record is held in memory at a time.
+        :param filename: Filepath of the fastq file.
+        :return: Yields a ReadRecord for each record.
+        """
+        with self.openInput(filename) as file:
             for row in file:
                 if row[0] == '@':  # If the line begins with '@', we know it is the start of a new record.
-                    lines = islice(file, 3)  # Gets the next 3 lines from the file.
-                    metadata = [row.strip()]
+                    lines = [line.strip() for line in islice(file, 3)]  # Gets the next 3 lines from the file.
 
-                    for line in lines:
-                        metadata.append(line.strip())
+                    yield ReadRecord(row.strip(), lines[0], lines[2])  # The plus line, lines[1], is not kept.
 
-                    reads.update({metadata[1]: metadata})  # metadata[1] is the sequence.
-        return reads
-
-    def getDatasamFile(self, filename):
-        data = dict()
+    def getDataFASTQfile(self, filename):
+        return self.recordsToDictionary(self.iterFASTQFile(filename))
 
-        with open(filename, "r") as file:
+    def iterSAMFile(self, filename):
+        """
+        Generator over the records of a sam file. Only one row is held in memory at a time.
+        :param filename: Filepath of the sam file.
+        :return: Yields a ReadRecord for each row.
+        """
+        with self.openInput(filename) as file:
             csvReader = csv.reader(file, delimiter="\t")  # These files are tab delimited.
             for row in csvReader:
-                metaData = [row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[10]]
-                data.update({row[9]: metaData})
+                yield ReadRecord(row[0], row[9], row[10],
+                                 (row[0], row[1], row[2], row[3], row[4], row[5], row[6], row[7], row[8], row[10]))
+
+    def getDatasamFile(self, filename):
+        return self.recordsToDictionary(self.iterSAMFile(filename))
+
+    def getReadKey(self, record, matchBy="sequence"):
+        """
+        Finds the key a read is matched on when finding unmapped reads.
+        :param record: A ReadRecord.
+        :param matchBy: "sequence" to match reads by their sequence, or "id" to match them by their read id.
+        :return: The key, as a string.
+        """
+        if matchBy == "id":
+            readId = record.header.split()[0] if record.header else ""
+            return readId[1:] if readId[:1] in ("@", ">") else readId
+
+        return record.sequence
+
+    def getReadHashes(self, filepath, matchBy="sequence"):
+        """
+        Finds the 64-bit hashes of the keys of every read in a file, a batch at a time. Only 8 bytes are kept per read,
+        rather than the reads themselves.
+        :param filepath: The file of reads.
+        :param matchBy: "sequence" or "id". See getReadKey().
+        :return: A sorted uint64 array of the unique hashes.
+        """
+        sequenceUtils = SequenceUtils()
+        hashes = [sequenceUtils.hashStrings(self.getReadKey(record, matchBy) for record in batch)
+                  for batch in self.iterBatches(filepath)]
+
+        if not hashes:
+            return np.zeros(0, dtype=np.uint64)
+
+        return np.unique(np.concatenate(hashes))
+
+    def isInHashes(self, hashes, sortedHashes):
+        """
+        Checks which of an array of hashes are in a sorted array of hashes, with a binary search.
+        :param hashes: The hashes to check.
+        :param sortedHashes: A sorted array, from getReadHashes().
+        :return: A boolean array, True where the hash is in sortedHashes.
+        """
+        if len(sortedHashes) == 0:
+            return np.zeros(len(hashes), dtype=bool)
+
+        positions = np.minimum(np.searchsorted(sortedHashes, hashes), len(sortedHashes) - 1)
+        return sortedHashes[positions] == hashes
+
+    def iterUnmappedReads(self, originalReadsFile, assembledReadsFile, matchBy="sequence", backend="hash",
+                          falsePositiveRate=0.01, filterFile=None, exactRecheck=False):
+        """
+        Streams the reads that are in the larger file but not the smaller one. Only a sorted array of 64-bit hashes of
+        the smaller file is held in memory; the larger file is read a batch at a time. Memory use is 8 bytes per read
+        of the smaller file, or less with the "bloom" backend.
+        :param originalReadsFile: Larger input file.
+        :param assembledReadsFile: Smaller input file.
+        :param matchBy: "sequence" to match reads by their sequence, or "id" to match them by their read id.
+        :param backend: "hash" to use a set of hashes, or "bloom" to use a Bloom filter. See iterUnmappedReadsBloom().
+        :param falsePositiveRate: The false positive rate of the Bloom filter.
+        :param filterFile: File to load the Bloom filter from, or save it to if it does not exist yet.
+        :param exactRecheck: Whether reads flagged by the Bloom filter are checked against the smaller file again.
+        :return: Yields a ReadRecord for each unmapped read.
+        """
+        if backend == "bloom":
+            yield from self.iterUnmappedReadsBloom(originalReadsFile, assembledReadsFile, matchBy, falsePositiveRate,
+                                                   filterFile, exactRecheck)
+            return
+
+        sequenceUtils = SequenceUtils()
+        mappedHashes = self.getReadHashes(assembledReadsFile, matchBy)
+
+        for batch in self.iterBatches(originalReadsFile):
+            records = list(batch)
+            hashes = sequenceUtils.hashStrings(self.getReadKey(record, matchBy) for record in records)
+
+            for record, isMapped in zip(records, self.isInHashes(hashes, mappedHashes).tolist()):
+                if not isMapped:
+                    yield record
+
+    def findFingerprint(self, filepath, sampleSize=1 << 20):
+        """
+        Finds a fingerprint of a file from its size, modification time, and a hash of samples of its start, middle and
+        end, so that large files are not read in full. A file that is changed, or replaced by another, is given a new
+        fingerprint.
+        :param filepath: The file.
+        :param sampleSize: The number of bytes hashed from each of the three places.
+        :return: The fingerprint, as a hex string.
+        """
+        status = os.stat(filepath)
+        digest = blake2b(f"{status.st_size}:{status.st_mtime_ns}".encode(), digest_size=16)
+
+        with open(filepath, "rb") as file:
+            for offset in sorted({0, max(0, status.st_size // 2 - sampleSize // 2),
+                                  max(0, status.st_size - sampleSize)}):
+                file.seek(offset)
+                digest.update(file.read(sampleSize))
+
+        return digest.hexdigest()
+
+    def getBloomFilter(self, filepath, matchBy="sequence", falsePositiveRate=0.01, filterFile=None):
+        """
+        Builds a Bloom filter of the reads in a file, or loads it if it has been saved before. A saved filter is only
+        used if it was built from the same file, unchanged, with the same matchBy; otherwise it is rebuilt and saved
+        over.
+        :param filepath: The file of reads.
+        :param matchBy: "sequence" or "id". See getReadKey().
+        :param falsePositiveRate: The false positive rate of the filter.
+        :param filterFile: File to load the filter from. If it does not exist, the built filter is saved to it.
+        :return: The BloomFilter.
+        """
+        metadata = {"file": self.findFingerprint(filepath), "matchBy": matchBy}
+
+        if filterFile is not None:
+            try:
+                bloomFilter = BloomFilter.load(filterFile)
+                if bloomFilter.metadata == metadata:
+                    return bloomFilter
+
+                print(f"The Bloom filter in {filterFile} was not built from {filepath} matched by {matchBy}, so it "
+                      f"will be built again.")
+
+            except FileNotFoundError:
+                pass
+
+        sequenceUtils = SequenceUtils()
+        # The number of reads is needed to size the filter, so they are counted first.
+        bloomFilter = BloomFilter(sum(len(batch) for batch in self.iterBatches(filepath)), falsePositiveRate)
+        bloomFilter.metadata = metadata
+
+        for batch in self.iterBatches(filepath):
+            bloomFilter.add(sequenceUtils.hashStrings(self.getReadKey(record, matchBy) for record in batch))
+
+        if filterFile is not None:
+            bloomFilter.save(filterFile)
+
+        return bloomFilter
+
+    def iterUnmappedReadsBloom(self, originalReadsFile, assembledReadsFile, matchBy="sequence",
+                               falsePositiveRate=0.01, filterFile=None, exactRecheck=False, recheckWindow=1000000):
+        """
+        Streams the unmapped reads using a Bloom filter of the smaller file, for when even a set of hashes of it is
+        too large. Reads not in the filter are definitely unmapped. Reads the filter flags may be false positives, so
+        around falsePositiveRate of the unmapped reads are missed, unless exactRecheck is True.
+
+        To recheck, the larger file is read a window of recheckWindow reads at a time, and the smaller file is streamed
+        once for each window to find which of its flagged reads really are mapped. Only the window is held in memory,
+        and the reads are yielded in the order of the file, but the smaller file is read once per window.
+        :param originalReadsFile: Larger input file.
+        :param assembledReadsFile: Smaller input file.
+        :param matchBy: "sequence" or "id". See getReadKey().
+        :param falsePositiveRate: The false positive rate of the filter.
+        :param filterFile: File to load the filter from, or save it to, so several files can be screened against the
+        same assembly without rebuilding it.
+        :param exactRecheck: Whether to recheck the flagged reads against the smaller file. Default False.
+        :param recheckWindow: The number of reads of the larger file rechecked at a time.
+        :return: Yields a ReadRecord for each unmapped read.
+        """
+        sequenceUtils = SequenceUtils()
+        bloomFilter = self.getBloomFilter(assembledReadsFile, matchBy, falsePositiveRate, filterFile)
+        records, flags, hashes = [], [], []
+
+        for batch in self.iterBatches(originalReadsFile):
+            batchRecords = list(batch)
+            batchHashes = sequenceUtils.hashStrings(self.getReadKey(record, matchBy) for record in batchRecords)
+            isFlagged = bloomFilter.contains(batchHashes)
+
+            if not exactRecheck:
+                for record, flagged in zip(batchRecords, isFlagged.tolist()):
+                    if not flagged:
+                        yield record
+
+                continue
+
+            records += batchRecords
+            flags.append(isFlagged)
+            hashes.append(batchHashes)
+
+            if len(records) >= recheckWindow:
+                yield from self.recheckWindow(records, np.concatenate(flags), np.concatenate(hashes),
+                                              assembledReadsFile, matchBy)
+                records, flags, hashes = [], [], []
+
+        if records:
+            yield from self.recheckWindow(records, np.concatenate(flags), np.concatenate(hashes), assembledReadsFile,
+                                          matchBy)
+
+    def recheckWindow(self, records, isFlagged, hashes, assembledReadsFile, matchBy="sequence"):
+        """
+        Finds which of a window of reads flagged by a Bloom filter really are in the smaller file, by streaming it.
+        Called by iterUnmappedReadsBloom().
+        :param records: The reads of the window, in the order of their file.
+        :param isFlagged: Boolean array, True for each read the filter flagged.
+        :param hashes: The hash of each read.
+        :param assembledReadsFile: The smaller file.
+        :param matchBy: "sequence" or "id". See getReadKey().
+        :return: Yields each unmapped read of the window, in order.
+        """
+        flaggedHashes = np.unique(hashes[isFlagged])
+        isMapped = np.zeros(len(flaggedHashes), dtype=bool)
+
+        if len(flaggedHashes):
+            sequenceUtils = SequenceUtils()
+            for batch in self.iterBatches(assembledReadsFile):
+                batchHashes = sequenceUtils.hashStrings(self.getReadKey(record, matchBy) for record in batch)
+                found = batchHashes[self.isInHashes(batchHashes, flaggedHashes)]
+                isMapped[np.searchsorted(flaggedHashes, found)] = True
 
-        return data
+        mappedHashes = flaggedHashes[isMapped]
+        for record, isUnmapped in zip(records, (~self.isInHashes(hashes, mappedHashes)).tolist()):
+            if isUnmapped:
+                yield record
 
     # Finds the sequences that are in the larger set but not the smaller set
-    def getUnmappedReads(self, originalReadsFile, assembledReadsFile):
+    def getUnmappedReads(self, originalReadsFile, assembledReadsFile, matchBy="sequence"):
         """
         Function that finds the reads that are in a larger file and the smaller one. Purpose to find unmapped
         reads, hence the name.
         :param originalReadsFile: Larger input file.
         :param assembledReadsFile: Smaller input file.
+        :param matchBy: "sequence" to match reads by their sequence, or "id" to match them by their read id.
         :return: A dictionary of the reads in larger file and are in the smaller file.
         """
-        originalReads = self.getDataFromInputFile(originalReadsFile)
-        mappedReads = self.getDataFromInputFile(assembledReadsFile)
-        unmappedReads = dict()
-
-        for read in originalReads:
-            if read in mappedReads:
-                continue
-            else:
-                unmappedReads.update({read: originalReads.get(read)})
-
-        return unmappedReads
+        return self.recordsToDictionary(self.iterUnmappedReads(originalReadsFile, assembledReadsFile, matchBy))
 
     def intersection(self, largerSet, smallerSet):
         """
@@ -92,31 +918,30 @@ class FileHandler:
                 continue
 
             else:
-                print(largerSet)
-                print(smallerSet)
                 leftover.update({read: [int(largerSet.get(read)[0][1:]), int(smallerSet.get(read)[0][1:])]})
 
         return leftover
 
     def writeToFASTQ(self, data, outputName="output"):
         """
-        Writes a dictionary of data to a file in the fastq format.
-        :param data: Dictionary of data
+        Writes data to a file in the fastq format.
+        :param data: Dictionary of data, a ReadBatch, or an iterable of ReadRecord objects, such as from iterRecords().
         :param outputName: Name of output fastq file.
         """
-        with open(f"../Data/output/fastq/{outputName}.fastq", "w+") as file:
-            for read in data:
-                readData = data.get(read)
+        if type(data) == dict:
+            data = data.items()
 
+        with open(f"../Data/output/fastq/{outputName}.fastq", "w+") as file:
+            for read, readData in data:
                 identification = readData[0].strip()
                 positiveNegative = readData[2]
                 quality = readData[3]
                 sequence = read.strip()
 
-            file.write(f"{identification}\n"
-                       f"{sequence}\n"
-                       f"{positiveNegative}\n"
-                       f"{quality}\n")
+                file.write(f"{identification}\n"
+                           f"{sequence}\n"
+                           f"{positiveNegative}\n"
+                           f"{quality}\n")
 
     def convertSAMToFASTA(self, filepath, outputName="output_fasta"):
         """
@@ -128,39 +953,223 @@ class FileHandler:
         command = f"samtools -f 4 {filepath} > ../Data/output/fasta/{outputName}"
         subprocess.run(command.split())
 
-    def getDataFAFile(self, fileName):
-        data = dict()
-        sequences = []
-        ids = []
-        currentContig = ""
+    def iterFAFile(self, fileName):
+        """
+        Generator over the records of a fasta file. Only one record is held in memory at a time.
+        :param fileName: Filepath of the fasta file.
+        :return: Yields a ReadRecord for each record.
+        """
+        currentId = None
+        currentContig = []
 
-        with open(fileName, "r") as file:
+        with self.openInput(fileName) as file:
             for line in file:
                 # If the line begins with a '>', we know until the next line beginning with this, it is a sequence
                 if line[0] == ">":
-                    ids.append(line.strip())
-                    sequences.append(currentContig)  # Append the previous sequence to the list.
-                    currentContig = ""
+                    if currentId is not None and currentContig:
+                        yield ReadRecord(currentId, "".join(currentContig))  # Yield the previous record.
 
-                else:
-                    currentContig += line.strip()
-
-        sequences.append(currentContig)
+                    currentId = line.strip()
+                    currentContig = []
 
-        sequences = [val for val in sequences if val != ""]
+                else:
+                    currentContig.append(line.strip())
 
-        for contig in range(0, len(ids)):
-            data.update({sequences[contig]: [ids[contig]]})
+        if currentId is not None and currentContig:
+            yield ReadRecord(currentId, "".join(currentContig))
 
-        return data
+    def getDataFAFile(self, fileName):
+        return self.recordsToDictionary(self.iterFAFile(fileName))
 
     def convertCSVToDataFrame(self, data="None"):
         """
-        Converts a CSV file to a pandas dataframe
+        Converts a CSV file to a pandas dataframe. Parquet and Arrow files are also read, found from their extension.
+        If the file does not exist, the same table in another format is read, so a table can be named by its CSV file.
         :param data: Filepath of CSV
         :return: The pandas dataframe.
         """
-        return pd.read_csv(data)
+        tables = TableFormatUtils()
+        return tables.readDataFrame(tables.findTableFile(data))
+
+    def getOutputPath(self, outputFile):
+        """
+        Finds the path a table of results is written to, in Data/output/csv, with the extension of outputFormat.
+        :param outputFile: The name of the table. A table extension on the end of it, such as .csv, is replaced.
+        :return: The path.
+        """
+        tables = TableFormatUtils(self.outputFormat)
+        return f"{self.outputDirectory}/{tables.removeExtension(outputFile)}{tables.extensions[self.outputFormat]}"
+
+    def getReaderForFile(self, filepath):
+        """
+        Finds the generator function that can read the records of an input file, from its file extension, ignoring any
+        compression extension. If the extension is not recognised, the type is found from the start of the file.
+        :param filepath: The file to be read.
+        :return: One of the iter... functions of this class, or None if the file type is not supported.
+        """
+        name = filepath
+        for extension in self.compressionExtensions:
+            if name.endswith(extension):
+                name = name[:-len(extension)]
+
+        if name[-2:] == "fa" or name[-5:] == "fasta":
+            return self.iterFAFile
+
+        elif name[-5:] == "fastq" or name[-2:] == "fq":
+            return self.iterFASTQFile
+
+        elif name[-3:] == "map":
+            return self.iterMAPFile
+
+        elif name[-3:] == "sam":
+            return self.iterSAMFile
+
+        return self.findReaderFromContent(filepath)
+
+    def findReaderFromContent(self, filepath):
+        """
+        Finds the type of an input file from its first line: '>' starts a fasta file, and '@' a fastq file, unless it
+        is a sam header line. Tab separated rows are sam if they have the 11 mandatory sam columns, or map otherwise.
+        :param filepath: The file to be read.
+        :return: One of the iter... functions of this class, or None if the type is not recognised.
+        """
+        try:
+            with self.openInput(filepath) as file:
+                line = file.readline()
+
+        except (OSError, UnicodeDecodeError, ImportError):
+            return None
+
+        if line.startswith(">"):
+            return self.iterFAFile
+
+        elif line.startswith("@") and "\t" not in line:
+            return self.iterFASTQFile
+
+        elif line.startswith("@") or len(line.split("\t")) >= 11:
+            return self.iterSAMFile
+
+        elif len(line.split("\t")) >= 6:
+            return self.iterMAPFile
+
+        return None
+
+    def iterRecords(self, filepath):
+        """
+        Streams the records of an input file one at a time, rather than building a dictionary of the whole file.
+        Memory use is constant, regardless of the size of the file.
+        :param filepath: The file to read. Must be fasta, fastq, map or sam.
+        :return: Yields a ReadRecord for each read. Duplicate sequences are all yielded.
+        """
+        reader = self.getReaderForFile(filepath)
+
+        if reader is None:
+            print("File passed must be fasta, fastq, map, or sam")
+            return
+
+        try:
+            yield from reader(filepath)
+
+        except FileNotFoundError:
+            print(f"File path {filepath} not recognised as .fasta (fa), .fastq (fq), .map, or .sam/ "
+                  f"no such file exists. Please try again.")
+
+        except ImportError as error:
+            print(error)
+
+    def iterSequences(self, filepath):
+        """
+        Streams only the sequences of an input file. Used by the per-read analyses.
+        :param filepath: The file to read.
+        :return: Yields each sequence as a string.
+        """
+        for record in self.iterRecords(filepath):
+            yield record.sequence
+
+    def getMappedFile(self, filepath, indexPath=None, saveIndex=False):
+        """
+        Opens an uncompressed fasta or fastq file as a MappedReadFile, for random access to its records.
+        :param filepath: The file.
+        :param indexPath: Where the index is kept. Defaults to beside the file.
+        :param saveIndex: Whether to save the index, if it has to be built.
+        :return: The MappedReadFile, or None if the file is compressed, of another type, or cannot be indexed. Those
+        files can still be read with iterRecords().
+        """
+        try:
+            if self.compression.findCompression(filepath) is not None:
+                return None
+
+            return MappedReadFile(filepath, indexPath, saveIndex)
+
+        except (OSError, ValueError):
+            return None
+
+    def getIndexPath(self, filepath):
+        """
+        Finds where the index of a file is cached. The name is made from the absolute path of the file; the index
+        itself records the fingerprint of the file, so the index of a changed file is rebuilt in its place.
+        :param filepath: The file.
+        :return: The path of the index, in indexDirectory.
+        """
+        key = blake2b(os.path.abspath(filepath).encode(), digest_size=8).hexdigest()
+
+        return f"{self.indexDirectory}/{os.path.basename(filepath)}.{key}.npy"
+
+    def getIndexedFile(self, filepath):
+        """
+        Opens a file as a MappedReadFile, with its index cached in indexDirectory. The index is built on the first
+        use and loaded afterwards, so records can be sampled or sliced without parsing the whole file.
+        :param filepath: The file.
+        :return: The MappedReadFile, or None if the file cannot be indexed.
+        """
+        try:
+            os.makedirs(self.indexDirectory, exist_ok=True)
+            return self.getMappedFile(filepath, self.getIndexPath(filepath), saveIndex=True)
+
+        except OSError:
+            return None
+
+    def iterBatches(self, filepath, batchSize=100000):
+        """
+        Streams the records of an input file in ReadBatch objects, so that they can be processed a chunk at a time.
+        Only one batch is held in memory at once, whatever the size of the file.
+        :param filepath: The file to read.
+        :param batchSize: The maximum number of reads in each batch.
+        :return: Yields ReadBatch objects.
+        """
+        batch = ReadBatch()
+
+        for record in self.iterRecords(filepath):
+            batch.append(record)
+
+            if len(batch) == batchSize:
+                yield batch
+                batch = ReadBatch()
+
+        if len(batch) > 0:
+            yield batch
+
+    def getReadBatch(self, filepath):
+        """
+        Reads a whole input file into a single ReadBatch. Unlike the getData... functions, reads with the same sequence
+        are not merged.
+        :param filepath: The file to read.
+        :return: A ReadBatch of every read in the file.
+        """
+        batch = ReadBatch()
+
+        for record in self.iterRecords(filepath):
+            batch.append(record)
+
+        return batch
+
+    def recordsToDictionary(self, records):
+        """
+        Converts records to the {sequence: [metadata]} dictionaries used throughout the tool.
+        :param records: An iterable of ReadRecord objects, or a ReadBatch.
+        :return: The dictionary. Where sequences are repeated, the last record is kept.
+        """
+        return {record.sequence: record.metadata() for record in records}
 
     def getDataFromInputFile(self, filepath):
         """
@@ -169,97 +1178,90 @@ class FileHandler:
         :return: The data, or an error message.
         """
         try:
-            if filepath[-2:] == "fa" or filepath[-5:] == "fasta":
-                return self.getDataFAFile(filepath)
-
-            elif filepath[-5:] == "fastq" or filepath[-2:] == "fq":
-                return self.getDataFASTQfile(filepath)
-
-            elif filepath[-3:] == "map":
-                return self.getDataMAPFile(filepath)
-
-            elif filepath[-3:] == "csv":
+            if TableFormatUtils().findFormat(filepath) is not None:
                 return self.convertCSVToDataFrame(filepath).to_dict()
 
-            elif filepath[-3:] == "sam":
-                return self.getDatasamFile(filepath)
+            reader = self.getReaderForFile(filepath)
 
-            else:
+            if reader is None:
                 print("File passed must be fasta, fastq, map, sam, or csv")
                 return None
 
+            return self.recordsToDictionary(reader(filepath))
+
         except FileNotFoundError:
             print(f"File path {filepath} not recognised as .fasta (fa), .fastq (fq), .map, .sam, or .csv/ "
                   f"no such file exists. Please try again.")
             return None
 
+        except ImportError as error:
+            print(error)
+            return None
+
         except TypeError:
             print("None type error. Ensure the file passed is correct")
             return None
 
-    def convertToCSVWriteable(self, fields, inputData):
+    def iterCSVRows(self, fields, inputData):
         """
-        Converts an input dictionary to form accepted by the csv.dictwriter() function, which is a 2d list of
-        dictionaries, containing the column header as the key, and the value for that row as its value.
+        Converts input data to rows of a CSV file, one at a time, so the rows are written as they are made, rather than
+        all being held in memory first. The ">" at the start of fasta headers in the metadata is removed.
         :param fields: The column headers for the CSV.
-        :param inputData: The dictionary to convert
-        :return: A list of dictionaries.
+        :param inputData: A filepath of a .fa file, a dictionary of {sequence: [metadata]} or {key: value}, or a
+        ReadBatch or list of ReadRecord objects, in which case every read is kept, even if sequences are repeated.
+        :return: Yields a tuple for each row, with a value for every field.
         """
         if type(inputData) == str:
-            data = self.getDataFAFile(inputData)  # If the input data is a .fa file
+            data = self.getDataFAFile(inputData).items()  # If the input data is a .fa file
 
         elif type(inputData) == dict:
-            data = inputData  # If the input data is a dictionary.
-
-        else:
-            return "Err: Input data must either be a filepath or dictionary."
+            data = inputData.items()  # If the input data is a dictionary.
 
-        listOfDicts = []
-        newFields = fields[1:]
+        elif isinstance(inputData, ReadBatch) or type(inputData) == list:
+            data = ((record.sequence, record.metadata()) for record in inputData)  # If the input data is reads.
 
-        for row in data:
-            dictOfData = dict()
-
-            dictOfData.update({f"{fields[0]}": row})
+        else:
+            raise TypeError("Input data must either be a filepath, dictionary, or reads.")
 
-            if type(data.get(row)) == list:
-                for i in range(0, len(data.get(row))):
-                    # Loop through the length of the list, starting from 1.
-                    # Do the same fields[i+1]: but instead of value do list[i]
-                    # Where list has come from data.get(row). So for i in range(1, len(data.get[row]):
-                    dictValues = data.get(row)
+        width = len(fields)
 
-                    if str(dictValues[i])[:1] == ">":
-                        dictOfData.update({f"{newFields[i]}": f"{dictValues[i][1:]}"})
+        for key, value in data:
+            if type(value) == list:
+                # Only strings can be fasta headers, so nothing else needs to be checked for the ">".
+                row = (key, *(item[1:] if type(item) == str and item[:1] == ">" else item for item in value))
 
-                    else:
-                        dictOfData.update({f"{newFields[i]}": f"{dictValues[i]}"})
+                # Rows with fewer values than fields are filled with blanks, as csv.DictWriter does.
+                yield row + ("",) * (width - len(row)) if len(row) < width else row
 
             else:
-                dictOfData.update({f"{fields[1]}": data.get(row)})
+                yield key, value
 
-            listOfDicts.append(dictOfData)
+    def convertToCSVWriteable(self, fields, inputData):
+        """
+        Converts an input dictionary to form accepted by the csv.dictwriter() function, which is a 2d list of
+        dictionaries, containing the column header as the key, and the value for that row as its value. The
+        writeToCSV... functions use iterCSVRows() instead, so the dictionaries are not made when writing.
+        :param fields: The column headers for the CSV.
+        :param inputData: The dictionary to convert. A ReadBatch or list of ReadRecord objects is also accepted, in
+        which case every read is kept, even if sequences are repeated.
+        :return: A list of dictionaries.
+        """
+        try:
+            return [dict(zip(fields, row)) for row in self.iterCSVRows(fields, inputData)]
 
-        return listOfDicts
+        except TypeError:
+            return "Err: Input data must either be a filepath, dictionary, or reads."
 
     def writeToCSVConvertData(self, fieldNames, inputData, outputFile="output_csv.csv"):
         """
-        Use if input data is not already in list of dicts form.
+        Use if input data is not already in list of dicts form. The rows are streamed to the file as they are
+        converted, by iterCSVRows().
         :param fieldNames: The names of the columns for the CSV file.
-        :param inputData: The input data. Can be a filepath or regular dictionary.
+        :param inputData: The input data. Can be a filepath, regular dictionary, or a ReadBatch.
         :param outputFile: The name of the file to write to.
-        :return: Nothing. Produces file in Data/output/ directory.
+        :return: Nothing. Produces file in Data/output/ directory, in outputFormat.
         """
-
-        data = self.convertToCSVWriteable(fieldNames, inputData)
-        with open(f"../Data/output/csv/{outputFile}.csv", "w") as csvFile:
-            writer = csv.DictWriter(csvFile, fieldnames=fieldNames)
-            # Writes the field headers.
-            writer.writeheader()
-            # Writes the dictionary of data to the csv file.
-            # Data must be in the form of a list of dictionaries, with the keys being the same as the fields,
-            # and values what should be written to those fields.
-            writer.writerows(data)
+        self.writeRowsToCSV(fieldNames, self.iterCSVRows(fieldNames, inputData), outputFile)
 
     def writeToCSVNoConvert(self, fieldNames, inputData, outputFile="output_csv.csv"):
         """
@@ -267,9 +1269,97 @@ class FileHandler:
         :param fieldNames: The names of the columns for the CSV file.
         :param inputData: The input data. Can be a filepath or regular dictionary.
         :param outputFile: The name of the file to write to.
-        :return: Nothing. Produces file in Data/output/ directory.
+        :return: Nothing. Produces file in Data/output/ directory, in outputFormat.
         """
-        with open(f"../Data/output/csv/{outputFile}.csv", "w") as csvFile:
+        if self.outputFormat != "csv":
+            self.writeDictsToTable(fieldNames, inputData, outputFile)
+            return
+
+        with open(self.getOutputPath(outputFile), "w") as csvFile:
             writer = csv.DictWriter(csvFile, fieldnames=fieldNames)
             writer.writeheader()
             writer.writerows(inputData)
+
+    def writeDictsToTable(self, fieldNames, inputData, outputFile):
+        """
+        Writes a list of dictionaries, as given to csv.DictWriter, as a Parquet or Arrow table. Columns of numbers
+        are given number types, as the values may be strings.
+        :param fieldNames: The names of the columns.
+        :param inputData: The list of dictionaries.
+        :param outputFile: The name of the table.
+        """
+        dataframe = pd.DataFrame(inputData, columns=fieldNames)
+
+        for column in fieldNames:
+            try:
+                dataframe[column] = pd.to_numeric(dataframe[column])
+
+            except (ValueError, TypeError):
+                continue
+
+        TableFormatUtils(self.outputFormat).writeDataFrame(self.getOutputPath(outputFile), dataframe)
+
+    def writeRowsToCSV(self, fieldNames, rows, outputFile="output_csv"):
+        """
+        Use if data is an iterable of rows, such as tuples. The rows are written as they are produced, rather than
+        being collected into a list of dictionaries first. They are formatted into a buffer csvChunkSize rows at a
+        time, and each chunk is written to the file in one call, so memory use stays constant however many rows there
+        are.
+        :param fieldNames: The names of the columns for the CSV file.
+        :param rows: An iterable of rows, each with a value for every column.
+        :param outputFile: The name of the file to write to.
+        :return: Nothing. Produces file in Data/output/ directory, in outputFormat.
+        """
+        if self.outputFormat != "csv":
+            TableFormatUtils(self.outputFormat).writeRows(self.getOutputPath(outputFile), fieldNames, rows)
+            return
+
+        rows = iter(rows)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fieldNames)
+
+        with open(self.getOutputPath(outputFile), "w", newline="") as csvFile:
+            while True:
+                chunk = list(islice(rows, self.csvChunkSize))
+                writer.writerows(chunk)
+
+                csvFile.write(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+
+                if len(chunk) < self.csvChunkSize:
+                    break
+
+    def getColumnValues(self, column):
+        """
+        Converts a column of a batch to a list of values to write. NaN in columns of floats is written as a blank, as
+        None is.
+        :param column: A NumPy array, or list, of values.
+        :return: The list of values.
+        """
+        if isinstance(column, np.ndarray):
+            if column.dtype.kind == "f" and np.isnan(column).any():
+                return np.where(np.isnan(column), None, column).tolist()
+
+            return column.tolist()
+
+        return column
+
+    def writeColumnsToCSV(self, fieldNames, batches, outputFile="output_csv"):
+        """
+        Use if data is made in batches of columns, such as NumPy arrays with a value for each read of a ReadBatch.
+        Each batch is written as it is produced. In the Parquet and Arrow formats, the columns keep the types of the
+        arrays.
+        :param fieldNames: The names of the columns for the CSV file.
+        :param batches: An iterable of batches, each a list with a column for every field, as NumPy arrays or lists
+        of the same length.
+        :param outputFile: The name of the file to write to.
+        :return: Nothing. Produces file in Data/output/ directory, in outputFormat.
+        """
+        if self.outputFormat != "csv":
+            TableFormatUtils(self.outputFormat).writeColumns(self.getOutputPath(outputFile), fieldNames, batches)
+            return
+
+        rows = (row for batch in batches for row in zip(*(self.getColumnValues(column) for column in batch)))
+        self.writeRowsToCSV(fieldNames, rows, outputFile)
@@ -0,0 +1,96 @@
+from collections import Counter
+
+from .SequenceUtils import SequenceUtils
+from .StatisticsUtils import Statistics
+
+
+class SimilarityIndex:
+    """
+    An index of sequences by their k-mer minimizers, used to find the closest matches of a sequence without comparing
+    it to every sequence in the index. Sequences that share minimizers with the query are the candidates, and only
+    these are verified with a banded edit distance.
+    """
+
+    def __init__(self, sequences, k=11, window=5, maxCandidates=20, maxBucketSize=1000):
+        """
+        Builds the index.
+        :param sequences: The sequences to index. Usually the keys of a dictionary from FileHandler.
+        :param k: The length of the k-mers.
+        :param window: The number of consecutive k-mers that each minimizer is chosen from.
+        :param maxCandidates: The most candidates to verify for each query, taken in order of shared minimizers.
+        :param maxBucketSize: Minimizers shared by more sequences than this are ignored when querying, as they come
+        from low complexity or repeated sequence and match almost anything.
+        """
+        self.k = k
+        self.window = window
+        self.maxCandidates = maxCandidates
+        self.maxBucketSize = maxBucketSize
+        self.sequences = list(sequences)
+        self.buckets = dict()
+        self.stats = Statistics()
+        self.sequenceUtils = SequenceUtils()
+
+        for sequenceId, sequence in enumerate(self.sequences):
+            for minimizer in self.findMinimizers(sequence):
+                self.buckets.setdefault(minimizer, []).append(sequenceId)
+
+    def findMinimizers(self, sequence):
+        """
+        Finds the minimizers of a sequence: the k-mer with the smallest hash in each window of consecutive k-mers.
+        Similar sequences share most of their minimizers, while only a fraction of all k-mers need to be stored.
+        K-mers are hashed with SequenceUtils.hashStrings(), rather than hash(), which is randomised for each run, so
+        the same minimizers and candidates are found on every run.
+        :param sequence: The sequence.
+        :return: A set of the hashes of the minimizers.
+        """
+        hashes = self.sequenceUtils.hashStrings(sequence[i:i + self.k]
+                                                for i in range(len(sequence) - self.k + 1)).tolist()
+
+        if not hashes:
+            return set()  # The sequence is shorter than k.
+
+        if len(hashes) <= self.window:
+            return {min(hashes)}
+
+        return {min(hashes[i:i + self.window]) for i in range(len(hashes) - self.window + 1)}
+
+    def findCandidates(self, sequence):
+        """
+        Finds the indexed sequences that share minimizers with a sequence.
+        :param sequence: The query sequence.
+        :return: List of the ids of the candidate sequences, most shared minimizers first.
+        """
+        sharedCounts = Counter()
+
+        for minimizer in self.findMinimizers(sequence):
+            bucket = self.buckets.get(minimizer)
+
+            if bucket is not None and len(bucket) <= self.maxBucketSize:
+                sharedCounts.update(bucket)
+
+        return [sequenceId for sequenceId, _ in sharedCounts.most_common(self.maxCandidates)]
+
+    def findClosestMatches(self, sequence, n=3, cutoff=0.6):
+        """
+        Finds the closest matches of a sequence in the index. Similarity is 1 - (edit distance / length of the longer
+        sequence), so a cutoff also sets the band of the edit distance, and candidates outside it are rejected early.
+        :param sequence: The query sequence.
+        :param n: The number of closest matches to find.
+        :param cutoff: The lowest similarity, from 0 to 1, for a candidate to be a match.
+        :return: List of up to n matching sequences, closest first, in the same form as difflib.get_close_matches().
+        """
+        matches = []
+
+        for sequenceId in self.findCandidates(sequence):
+            candidate = self.sequences[sequenceId]
+            longest = max(len(sequence), len(candidate))
+            maxDistance = int((1 - cutoff) * longest)
+
+            distance = self.stats.findBandedEditDistance(sequence, candidate, maxDistance)
+
+            if distance <= maxDistance:
+                matches.append((1 - distance / longest, candidate))
+
+        matches.sort(key=lambda match: match[0], reverse=True)
+
+        return [candidate for _, candidate in matches[:n]]
@@ -0,0 +1,129 @@
+import json
+import numpy as np
+import pandas as pd
+
+from .SequenceUtils import SequenceUtils
+
+
+class KmerCountTable:
+    """
+    The k-mer counts of a file, held as arrays indexed by 2-bit k-mer code rather than as text. It is saved as a .npy
+    file of the counts, and a .json header of k and the totals, so it is loaded in constant time, memory mapped, with
+    nothing to parse.
+
+    For k up to denseMaxK, counts has an entry for every possible k-mer, and the count of a k-mer is counts[code].
+    For larger k, codes is a sorted array of the k-mers that occur, and counts holds the count of each.
+    """
+
+    # The largest k whose tables have an entry for every possible k-mer, which takes 4^k entries.
+    denseMaxK = 13
+
+    def __init__(self, k, counts, codes=None, canonical=False, total=None):
+        """
+        :param k: The length of the k-mers.
+        :param counts: Array of the counts.
+        :param codes: Sorted uint64 array of the codes of the counted k-mers, or None if counts is indexed by code.
+        :param canonical: Whether a k-mer and its reverse complement were counted together.
+        :param total: The total number of k-mers. Found from the counts if not given.
+        """
+        self.k = k
+        self.counts = counts
+        self.codes = codes
+        self.canonical = canonical
+        self.total = int(counts.sum(dtype=np.uint64)) if total is None else total
+
+    @classmethod
+    def fromJellyfishDump(cls, filepath, k, canonical=False):
+        """
+        Makes a table from the column output of 'jellyfish dump -c -t', which has a k-mer and its count on each line.
+        :param filepath: The dump file.
+        :param k: The length of the k-mers.
+        :param canonical: Whether Jellyfish was run with -C.
+        :return: The KmerCountTable.
+        """
+        dump = pd.read_csv(filepath, sep="\t", header=None, names=["kmer", "count"], dtype={"kmer": str})
+        codes = SequenceUtils().encodeKmers(dump["kmer"].tolist())
+        counts = dump["count"].to_numpy(dtype=np.uint64)
+
+        order = np.argsort(codes)
+        codes, counts = codes[order], counts[order]
+
+        if k <= cls.denseMaxK:
+            dense = np.zeros(4 ** k, dtype=np.uint64)
+            dense[codes.astype(np.int64)] = counts
+            return cls(k, dense, canonical=canonical)
+
+        return cls(k, counts, codes, canonical)
+
+    def save(self, filepath):
+        """
+        Saves the table as filepath.npy and filepath.json, and filepath.codes.npy if the table is not indexed by code.
+        Counts are stored as uint32 unless a count is too large for it.
+        :param filepath: The path to save to, without an extension.
+        """
+        counts = self.counts
+        if len(counts) == 0 or counts.max() < 2 ** 32:
+            counts = counts.astype(np.uint32)
+
+        np.save(f"{filepath}.npy", counts)
+        if self.codes is not None:
+            np.save(f"{filepath}.codes.npy", self.codes)
+
+        with open(f"{filepath}.json", "w") as file:
+            json.dump({"k": self.k, "total": self.total, "distinct": len(self), "canonical": self.canonical,
+                       "dense": self.codes is None}, file)
+
+    @classmethod
+    def load(cls, filepath):
+        """
+        Loads a table saved by save(). The arrays are memory mapped, rather than read.
+        :param filepath: The path it was saved to, without an extension.
+        :return: The KmerCountTable.
+        """
+        with open(f"{filepath}.json", "r") as file:
+            header = json.load(file)
+
+        counts = np.load(f"{filepath}.npy", mmap_mode="r")
+        codes = None if header["dense"] else np.load(f"{filepath}.codes.npy", mmap_mode="r")
+
+        return cls(header["k"], counts, codes, header["canonical"], header["total"])
+
+    def getCodesAndCounts(self):
+        """
+        :return: A tuple of the sorted codes of the k-mers that occur, and their counts.
+        """
+        if self.codes is None:
+            codes = np.flatnonzero(self.counts)
+            return codes.astype(np.uint64), np.asarray(self.counts[codes], dtype=np.uint64)
+
+        return np.asarray(self.codes, dtype=np.uint64), np.asarray(self.counts, dtype=np.uint64)
+
+    def iterKmerCountBatches(self, chunkSize=1000000):
+        """
+        Decodes the k-mers that occur a chunk at a time, for FileHandler.writeColumnsToCSV().
+        :param chunkSize: The number of k-mers to decode at a time.
+        :return: Yields [k-mers, counts] batches of columns.
+        """
+        sequenceUtils = SequenceUtils()
+        codes, counts = self.getCodesAndCounts()
+
+        for start in range(0, len(codes), chunkSize):
+            yield [sequenceUtils.decodeKmers(codes[start:start + chunkSize], self.k), counts[start:start + chunkSize]]
+
+    def iterKmerCounts(self, chunkSize=1000000):
+        """
+        Pairs the k-mers that occur with their counts, decoding a chunk at a time.
+        :param chunkSize: The number of k-mers to decode at a time.
+        :return: Yields tuples of k-mer and count.
+        """
+        for kmers, counts in self.iterKmerCountBatches(chunkSize):
+            yield from zip(kmers, counts.tolist())
+
+    def __len__(self):
+        """
+        :return: The number of distinct k-mers that occur.
+        """
+        if self.codes is None:
+            return int(np.count_nonzero(self.counts))
+
+        return len(self.codes)
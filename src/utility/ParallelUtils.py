@@ -0,0 +1,44 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from .FileHandlingUtils import FileHandler
+
+
+def setUpWorker(outputFormat, outputDirectory):
+    """
+    Gives FileHandler, in a worker process, the output settings of the process that made the pool. Forked workers
+    inherit them, but workers started by spawn or forkserver import FileHandler afresh, with its defaults.
+    :param outputFormat: The format to write tables in.
+    :param outputDirectory: The directory to write tables to.
+    """
+    FileHandler.outputFormat = outputFormat
+    FileHandler.outputDirectory = outputDirectory
+
+
+class ParallelUtils:
+    def __init__(self, workers=1):
+        """
+        Initialises the class
+        :param workers: The number of processes to run work in. With 1, work is run in this process.
+        """
+        self.workers = max(1, int(workers))
+
+    def mapOverFiles(self, function, *iterables):
+        """
+        Calls a function on each input file, in a pool of processes. Each file is independent, so the files are
+        processed at the same time, up to the number of workers. Processes are forked where possible, so the function
+        does not need to be importable by a new interpreter.
+        :param function: The function. It, its arguments, and what it returns must be picklable.
+        :param iterables: The arguments of each call, as in map().
+        :return: List of what the function returned for each file, in the order of the files.
+        """
+        if self.workers == 1:
+            return list(map(function, *iterables))
+
+        context = None
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+
+        with ProcessPoolExecutor(self.workers, mp_context=context, initializer=setUpWorker,
+                                 initargs=(FileHandler.outputFormat, FileHandler.outputDirectory)) as executor:
+            return list(executor.map(function, *iterables))
@@ -1,5 +1,6 @@
 import matplotlib.pyplot as plt
 import matplotlib
+import numpy as np
 import seaborn
 
 matplotlib.use('TkAgg')
@@ -26,6 +27,54 @@ class PlotsUtils:
         ax.set_ylabel(f"{yLabel}")
         ax.plot()
 
+    def findAutoBinCount(self, values, counts):
+        """
+        Finds the number of bins numpy's "auto" option would choose for the data, when the data is given as counts of
+        each value rather than the values themselves. The larger of the Sturges and Freedman Diaconis estimates is
+        used, as numpy does.
+        :param values: The sorted values that have been counted.
+        :param counts: The number of times each value occurs.
+        :return: The number of bins.
+        """
+        total = counts.sum()
+        if total == 0:
+            return 1
+
+        cumulative = np.cumsum(counts)
+        valueRange = values[-1] - values[0]
+        if valueRange == 0:
+            return 1
+
+        sturgesWidth = valueRange / (np.log2(total) + 1)
+        upperQuartile = values[np.searchsorted(cumulative, 0.75 * total)]
+        lowerQuartile = values[np.searchsorted(cumulative, 0.25 * total)]
+        fdWidth = 2 * (upperQuartile - lowerQuartile) * total ** (-1 / 3)
+
+        width = min(fdWidth, sturgesWidth) if fdWidth > 0 else sturgesWidth
+        return int(np.ceil(valueRange / width))
+
+    def makeHistogramFromCounts(self, values, counts, yLabel, xLabel, title, ax, barColour="blue"):
+        """
+        Plots a histogram on the axes object passed to it, from counts of each value, so the data itself does not need
+        to be held in memory. The bins are chosen the same way as makeHistogram() does.
+        :param values: The values that have been counted.
+        :param counts: The number of times each value occurs.
+        :param yLabel: Y label for the plot
+        :param xLabel: X label for the plot
+        :param title: Title for the plot
+        :param ax: The axes to plot the histogram on
+        :param barColour: The colour of the bars
+        """
+        present = counts > 0
+        values = values[present]
+        counts = counts[present]
+
+        ax.hist(values, bins=self.findAutoBinCount(values, counts), weights=counts, log=False)
+        ax.set_title(f"{title}")
+        ax.set_xlabel(f"{xLabel}")
+        ax.set_ylabel(f"{yLabel}")
+        ax.plot()
+
     def makeBarChart(self, xData, yData, ax, yLabel="Default Y Label", xLabel="Default X Label", title="Default title"):
         """
         Plots a histogram on the axes object passed to it, using the data passed.
@@ -0,0 +1,170 @@
+from hashlib import blake2b
+import numpy as np
+
+
+class SequenceUtils:
+    def __init__(self):
+        # Maps every byte value to the index of a base: 0 - 3 for A, C, G and T, and 4 for N or any other character.
+        self.baseLookup = np.full(256, 4, dtype=np.uint8)
+        for index, base in enumerate(b"ACGT"):
+            self.baseLookup[base] = index
+            self.baseLookup[base + 32] = index  # The lower case version of the base.
+
+        # The characters that baseLookup gives a code of their own. Lower case bases and other characters, such as
+        # IUPAC codes, share a code with another character, so they are not.
+        self.isStandardByte = np.zeros(256, dtype=bool)
+        self.isStandardByte[np.frombuffer(b"ACGTN", dtype=np.uint8)] = True
+
+    def encodeBatch(self, batch):
+        """
+        Encodes all the sequences of a ReadBatch into one array of base indexes, without copying them into strings.
+        :param batch: A ReadBatch.
+        :return: A tuple of the uint8 array of base indexes, and the int64 array of offsets of each read in it.
+        """
+        codes = self.baseLookup[np.frombuffer(batch.sequences, dtype=np.uint8)]
+        offsets = np.frombuffer(batch.offsets, dtype=np.uint64).astype(np.int64)
+
+        return codes, offsets
+
+    def findNonStandardReads(self, batch):
+        """
+        Finds the reads of a batch with a character other than upper case A, C, G, T or N. The encoded bases of these
+        reads do not tell all their characters apart, so anything that must match a comparison of the characters
+        themselves has to handle them separately.
+        :param batch: A ReadBatch.
+        :return: Array of the positions of the reads in the batch.
+        """
+        isNonStandard = ~self.isStandardByte[np.frombuffer(batch.sequences, dtype=np.uint8)]
+        offsets = np.frombuffer(batch.offsets, dtype=np.uint64).astype(np.int64)
+
+        return np.unique(np.searchsorted(offsets, np.flatnonzero(isNonStandard), side="right") - 1)
+
+    def findNonStandardSequences(self, sequences):
+        """
+        Finds which sequences of a list have a character other than upper case A, C, G, T or N, as
+        findNonStandardReads() does for a batch.
+        :param sequences: List of sequences, as strings.
+        :return: Boolean array, True for each sequence with such a character.
+        """
+        lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+        isNonStandard = ~self.isStandardByte[np.frombuffer("".join(sequences).encode("ascii"), dtype=np.uint8)]
+        readIndexes = np.searchsorted(np.cumsum(lengths), np.flatnonzero(isNonStandard), side="right")
+
+        return np.bincount(readIndexes, minlength=len(sequences)) > 0
+
+    def countBases(self, batch):
+        """
+        Counts the A, C, G, T and N bases of every read in a batch, in a single vectorised pass.
+        :param batch: A ReadBatch.
+        :return: A tuple of the counts, as a matrix with a row for each read and a column for each of A, C, G, T, N,
+        and the array of read lengths.
+        """
+        codes, offsets = self.encodeBatch(batch)
+        lengths = np.diff(offsets)
+
+        # Each base is given the number of the read it belongs to, so that all reads can be counted by one bincount.
+        readIndexes = np.repeat(np.arange(len(lengths)), lengths)
+        counts = np.bincount(readIndexes * 5 + codes, minlength=len(lengths) * 5).reshape(-1, 5)
+
+        return counts, lengths
+
+    def packSequences(self, sequences, words=None):
+        """
+        Packs sequences two bits per base into uint64 words, 32 bases to a word, so that sequences can be compared a
+        word at a time with XOR. As N does not fit in two bits, a second array marks the positions of N, using the low
+        bit of each base's two bits. Any character other than A, C, G or T is treated as N.
+        :param sequences: List of sequences, as strings.
+        :param words: The number of words to pack each sequence into. Enough for the longest sequence if not given.
+        :return: A tuple of the packed bases and the packed N positions, both with a row for each sequence and a column
+        for each word, and the array of sequence lengths.
+        """
+        lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+        if words is None:
+            words = max(1, -(-int(lengths.max(initial=0)) // 32))
+
+        codes = np.zeros((len(sequences), words * 32), dtype=np.uint8)
+        rows = np.repeat(np.arange(len(sequences)), lengths)
+        columns = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        codes[rows, columns] = self.baseLookup[np.frombuffer("".join(sequences).encode("ascii"), dtype=np.uint8)]
+
+        isN = (codes == 4).astype(np.uint64).reshape(len(sequences), words, 32)
+        codes = (codes & 3).astype(np.uint64).reshape(len(sequences), words, 32)
+        shifts = (2 * np.arange(32)).astype(np.uint64)
+
+        return (np.bitwise_or.reduce(codes << shifts, axis=2), np.bitwise_or.reduce(isN << shifts, axis=2),
+                lengths)
+
+    def findLengthMasks(self, lengths, words):
+        """
+        Finds masks that keep the low bit of each base, for only the first length bases of a packed sequence.
+        :param lengths: Array of the number of bases to keep for each row.
+        :param words: The number of words in each row.
+        :return: Array of masks, with a row for each length and a column for each word.
+        """
+        maskTable = np.array([int("01" * bases, 2) if bases else 0 for bases in range(33)], dtype=np.uint64)
+        basesInWord = np.clip(lengths.reshape(-1, 1) - 32 * np.arange(words), 0, 32)
+
+        return maskTable[basesInWord]
+
+    def countSetBits(self, words):
+        """
+        Counts the set bits (popcount) of each value in an array of uint64.
+        :param words: The array.
+        :return: Array of the number of set bits in each value.
+        """
+        if hasattr(np, "bitwise_count"):
+            return np.bitwise_count(words).astype(np.int64)
+
+        # Older numpy has no popcount, so the bits of each byte are looked up instead.
+        byteCounts = np.array([bin(value).count("1") for value in range(256)], dtype=np.int64)
+        return byteCounts[words.view(np.uint8)].reshape(words.shape + (8,)).sum(axis=-1)
+
+    def findMismatchedBases(self, packedOne, nOne, packedTwo, nTwo, masks):
+        """
+        Finds which bases differ between packed sequences. Each base is marked in the low bit of its two bits.
+        :param packedOne: Packed bases of the first sequences.
+        :param nOne: Packed N positions of the first sequences.
+        :param packedTwo: Packed bases of the second sequences.
+        :param nTwo: Packed N positions of the second sequences.
+        :param masks: Masks of the bases to compare, from findLengthMasks().
+        :return: The packed mismatches, with the same shape as the inputs.
+        """
+        difference = packedOne ^ packedTwo
+        return ((difference | (difference >> np.uint64(1))) | (nOne ^ nTwo)) & masks
+
+    def hashStrings(self, strings):
+        """
+        Hashes strings to 64 bits, with blake2b so that the hashes are the same in every process and on every run.
+        :param strings: Iterable of strings, such as sequences or read ids.
+        :return: A uint64 array of the hashes.
+        """
+        return np.fromiter((int.from_bytes(blake2b(string.encode("ascii"), digest_size=8).digest(), "little")
+                            for string in strings), dtype=np.uint64)
+
+    def encodeKmers(self, kmers):
+        """
+        Finds the 2-bit codes of k-mers of the same length, the first base highest, so codes sort in the same order as
+        the k-mers.
+        :param kmers: List of k-mers, as strings of A, C, G and T.
+        :return: A uint64 array of the codes.
+        """
+        if not kmers:
+            return np.zeros(0, dtype=np.uint64)
+
+        k = len(kmers[0])
+        bases = self.baseLookup[np.frombuffer("".join(kmers).encode("ascii"), dtype=np.uint8)].reshape(-1, k)
+        shifts = np.arange(2 * (k - 1), -1, -2, dtype=np.uint64)
+
+        return np.bitwise_or.reduce((bases & 3).astype(np.uint64) << shifts, axis=1)
+
+    def decodeKmers(self, codes, k):
+        """
+        Converts k-mer codes back into strings.
+        :param codes: A uint64 array of codes.
+        :param k: The length of the k-mers.
+        :return: List of the k-mers.
+        """
+        shifts = np.arange(2 * (k - 1), -1, -2, dtype=np.uint64)
+        bases = np.frombuffer(b"ACGT", dtype=np.uint8)[(codes.reshape(-1, 1) >> shifts) & np.uint64(3)]
+
+        return [kmer.decode("ascii") for kmer in np.ascontiguousarray(bases).view(f"S{k}").ravel()]
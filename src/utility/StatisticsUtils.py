@@ -1,13 +1,22 @@
+import csv
+import math
 import random
+from itertools import chain, islice
 
 import numpy as np
 import statsmodels.stats.proportion as proportionStats
 import statsmodels.stats.weightstats as weightStats
 
+from .DataUtils import DataUtils
 from .FileHandlingUtils import *
+from .SequenceUtils import SequenceUtils
+from .TableFormatUtils import TableFormatUtils
 
 
 class Statistics:
+    # The column of the results of testProportions() that each multiple testing correction is read from.
+    correctionColumns = {None: "P-Value", "bonferroni": "Bonferroni P-Value", "bh": "BH P-Value"}
+
     def __init__(self, significanceLevel=0.05):
         self.significance = significanceLevel
 
@@ -73,95 +82,453 @@ class Statistics:
             random.seed(seed)
             return {k: data[k] for k in random.sample(list(data), round((percentage * len(data))))}
 
+    def findUniform(self, generator):
+        """
+        :param generator: A random.Random.
+        :return: A random number in (0, 1), so that its logarithm can be taken.
+        """
+        value = generator.random()
+        while value == 0.0:
+            value = generator.random()
+
+        return value
+
+    def sampleStream(self, items, count=None, fraction=None, seed="Random"):
+        """
+        Samples an iterable in a single pass, holding only the sample in memory, so streams of any length can be
+        sampled. A fixed count is drawn with reservoir sampling (Algorithm L), and a fraction by keeping each item with
+        that probability. Both skip over runs of items with a single random number, rather than one per item.
+        :param items: The iterable, such as FileHandler.iterRecords().
+        :param count: The number of items to sample. All the items are returned if there are fewer.
+        :param fraction: The chance of each item being sampled, if count is not given.
+        :param seed: The seed to sample with. The same seed gives the same sample of the same stream.
+        :return: List of the sampled items, in the order of the stream.
+        """
+        generator = random.Random(None if seed == "Random" else seed)
+        items = iter(items)
+
+        if count is not None:
+            # The sample is kept with the position of each item, so it can be put back in stream order.
+            reservoir = list(enumerate(islice(items, count)))
+            if len(reservoir) < count or count == 0:
+                return [item for _, item in reservoir]
+
+            position = count - 1
+            weight = math.exp(math.log(self.findUniform(generator)) / count)
+
+            while True:
+                # The number of items skipped before the next one that enters the reservoir is geometric.
+                skip = math.floor(math.log(self.findUniform(generator)) / math.log(1 - weight)) if weight < 1 else 0
+                item = next(islice(items, skip, None), StopIteration)
+                if item is StopIteration:
+                    break
+
+                position += skip + 1
+                reservoir[generator.randrange(count)] = (position, item)
+                weight *= math.exp(math.log(self.findUniform(generator)) / count)
+
+            reservoir.sort(key=lambda entry: entry[0])
+            return [item for _, item in reservoir]
+
+        if fraction is None or fraction <= 0:
+            return []
+
+        if fraction >= 1:
+            return list(items)
+
+        sample = []
+        while True:
+            skip = math.floor(math.log(self.findUniform(generator)) / math.log(1 - fraction))
+            item = next(islice(items, skip, None), StopIteration)
+            if item is StopIteration:
+                return sample
+
+            sample.append(item)
+
+    def sampleRecordsOfFile(self, filepath, count=None, fraction=None, seed="Random"):
+        """
+        Samples the reads of an input file as they are streamed, without loading the file. Works for any input file,
+        including those that findRandomSampleFromFile() cannot index.
+        :param filepath: The input file.
+        :param count: The number of reads to sample.
+        :param fraction: The fraction of reads to sample, if count is not given.
+        :param seed: The seed to sample with
+        :return: The sample, as a dictionary in the form of FileHandler.getDataFromInputFile().
+        """
+        handler = FileHandler()
+        return handler.recordsToDictionary(self.sampleStream(handler.iterRecords(filepath), count, fraction, seed))
+
+    def findRandomSampleFromFile(self, filepath, percentage, seed="Random"):
+        """
+        Finds a random sample of the reads of a file, using its cached record index to read only the sampled records,
+        rather than loading the whole file into a dictionary first. Reads are sampled, so a sequence that is repeated
+        in the file is more likely to be chosen.
+        :param filepath: An uncompressed fasta or fastq file.
+        :param percentage: Percentage to sample
+        :param seed: The seed to sample with
+        :return: The sample, as a dictionary in the form of FileHandler.getDataFromInputFile(), or None if the file
+        cannot be indexed.
+        """
+        handler = FileHandler()
+        indexedFile = handler.getIndexedFile(filepath)
+
+        if indexedFile is None:
+            return None
+
+        generator = random.Random(None if seed == "Random" else seed)
+
+        with indexedFile:
+            # Sorted, so that the records are read in file order.
+            chosen = sorted(generator.sample(range(len(indexedFile)), round(percentage * len(indexedFile))))
+            return handler.recordsToDictionary(indexedFile[i] for i in chosen)
+
     def getTotalKmersDataFrame(self, dataframe: pd.DataFrame):
-        totalSetOne = 0
-        totalSetTwo = 0
+        # The number of raw occurrences will always be in columns 1 and 2.
+        return dataframe.iloc[:, 1].sum(), dataframe.iloc[:, 2].sum()
 
-        for i in range(len(dataframe)):
-            # The number of raw occurrences will always be in columns 1 and 2.
-            totalSetOne += dataframe.iloc[i, 1]
-            totalSetTwo += dataframe.iloc[i, 2]
+    def findProportionPValues(self, countsOne, countsTwo, totalOne, totalTwo):
+        """
+        Performs the same two sample z-test as areProportionsSignificant(), for every k-mer at once. The proportions
+        are pooled under the null hypothesis, as in statsmodels' proportions_ztest().
+        :param countsOne: Array of the occurrences of each k-mer in the first set.
+        :param countsTwo: Array of the occurrences of each k-mer in the second set.
+        :param totalOne: The total number of k-mers in the first set.
+        :param totalTwo: The total number of k-mers in the second set.
+        :return: Array of the two-sided p-value of each k-mer. It is NaN where a k-mer is in neither set.
+        """
+        countsOne = np.asarray(countsOne, dtype=np.float64)
+        countsTwo = np.asarray(countsTwo, dtype=np.float64)
 
-        return totalSetOne, totalSetTwo
+        pooled = (countsOne + countsTwo) / (totalOne + totalTwo)
+        standardError = np.sqrt(pooled * (1 - pooled) * (1 / totalOne + 1 / totalTwo))
 
-    def testProportions(self, filepath, outputFile="hypothesis_test_results_for_mapped_vs_unmapped.csv", seed="Random"):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            zScores = (countsOne / totalOne - countsTwo / totalTwo) / standardError
+
+        # The two-sided p-value of the standard normal distribution is erfc(|z| / sqrt(2)).
+        return np.frompyfunc(math.erfc, 1, 1)(np.abs(zScores) / math.sqrt(2)).astype(np.float64)
+
+    def adjustPValues(self, pValues, method="bh"):
+        """
+        Adjusts p-values for testing many k-mers at once, so that the significance level holds over all of them,
+        rather than for each one.
+        :param pValues: Array of p-values. NaN values are ignored, and stay NaN.
+        :param method: "bonferroni", which controls the chance of any false positive, or "bh" (Benjamini-Hochberg),
+        which controls the expected proportion of false positives among the significant k-mers.
+        :return: Array of the adjusted p-values, in the same order.
+        """
+        pValues = np.asarray(pValues, dtype=np.float64)
+        adjusted = np.full(len(pValues), np.nan)
+        isTested = ~np.isnan(pValues)
+        tested = pValues[isTested]
+
+        if method == "bonferroni":
+            adjusted[isTested] = np.minimum(tested * len(tested), 1)
+
+        elif method == "bh":
+            order = np.argsort(tested)
+            ranked = tested[order] * len(tested) / np.arange(1, len(tested) + 1)
+            # Each adjusted p-value is the smallest of those ranked at or above it, so the order is kept.
+            ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+
+            bhValues = np.empty(len(tested))
+            bhValues[order] = np.minimum(ranked, 1)
+            adjusted[isTested] = bhValues
+
+        else:
+            raise ValueError(f"Unknown multiple testing correction {method}. Use bonferroni or bh.")
+
+        return adjusted
+
+    def checkCorrection(self, correction):
+        """
+        Raises a ValueError if a multiple testing correction is not one of those in correctionColumns.
+        :param correction: The correction.
+        """
+        if correction not in self.correctionColumns:
+            raise ValueError(f"Unknown multiple testing correction {correction}. Use bonferroni or bh.")
+
+    def writeSignificantKmers(self, kmers, pValues, testedValues, outputFile, topK=None, correction=None):
+        """
+        Writes the k-mers whose tested p-values are significant, smallest first.
+        :param kmers: Array of the k-mers.
+        :param pValues: Array of their p-values.
+        :param testedValues: Array of the p-values that are compared to the significance level: the p-values, or the
+        adjusted p-values.
+        :param outputFile: The name of the output file.
+        :param topK: The most k-mers to write. Only these are sorted, after being found with a partial sort.
+        :param correction: The correction testedValues were adjusted with, which names their column. If None, only the
+        p-values are written.
+        """
+        significant = np.flatnonzero(testedValues <= self.significance)
+
+        if topK is not None and topK < len(significant):
+            significant = significant[np.argpartition(testedValues[significant], topK - 1)[:topK]]
+
+        significant = significant[np.argsort(testedValues[significant], kind="stable")]
+
+        fieldNames, columns = ["Kmer", "P-Value"], [kmers[significant], pValues[significant]]
+        if correction is not None:
+            fieldNames.append(self.correctionColumns[correction])
+            columns.append(testedValues[significant])
+
+        FileHandler().writeColumnsToCSV(fieldNames, [columns], outputFile=outputFile)
+
+    def testProportions(self, filepath, outputFile="hypothesis_test_results_for_mapped_vs_unmapped.csv", seed="Random",
+                        sample=False, correction=None, significantOutputFile=None, topK=None):
         """
         This function takes the data from the file given when class initialised and converts to dataframe.
-        If there are more than 100 samples, then it takes a sample of 10% of those. This can be controlled with the
-        seed parameter.
-        It loops through this dataframe, and performs a proportion test using areProportionsSignificant() in this class.
+        It tests the proportions of every k-mer at once, with findProportionPValues(), rather than one at a time with
+        areProportionsSignificant(). Bonferroni and Benjamini-Hochberg adjusted p-values are added to the results.
         Then writes the returned data to a new csv file, name specified with the outputFile parameter.
         :param outputFile: The name of the output file the user would like.
         :param seed: The pseudo-random seed the user would like.
+        :param sample: Whether to test a 10% sample of the k-mers, if there are more than 100. This is no longer needed
+        for speed, so is off by default.
+        :param correction: None to give the verdict from the p-values, or "bonferroni" or "bh" to give it from the
+        adjusted p-values.
+        :param significantOutputFile: If given, the significant k-mers are also written to this file, as by
+        extractSignificantKmers(), without reading the results back.
+        :param topK: The most significant k-mers to write to significantOutputFile.
         :return: Nothing. Produces a file in the Data/output directory.
         """
         handler = FileHandler()
+        tables = TableFormatUtils()
+        filepath = tables.findTableFile(filepath)
 
-        dataframe = handler.convertCSVToDataFrame(filepath)
-        if len(dataframe.index) > 100:
-            dataframe = self.findRandomSampleDataframe(dataframe, seed)
+        if sample and tables.findFormat(filepath) in ("parquet", "arrow"):
+            # Columnar tables are loaded without parsing, so the rows are sampled from the loaded table.
+            dataframe = handler.convertCSVToDataFrame(filepath)
+            if len(dataframe) > 100:
+                dataframe = dataframe.iloc[self.sampleStream(range(len(dataframe)), fraction=0.1, seed=seed)]
 
-        totalSetOne, totalSetTwo = self.getTotalKmersDataFrame(dataframe)
+        elif sample:
+            # The rows are streamed, and sampled as they are read, rather than loading the whole file first.
+            with open(filepath, newline="") as file:
+                rows = csv.reader(file)
+                fieldNames = next(rows)
+                sampled = list(islice(rows, 101))
 
-        dataToWrite = []
+                if len(sampled) > 100:
+                    sampled = self.sampleStream(chain(sampled, rows), fraction=0.1, seed=seed)
 
-        for i in range(len(dataframe)):
-            data = dict()
-            # The arrays have to be converted to numpy arrays to ensure that they can be used by the functions.
-            result, pvalue = self.areProportionsSignificant(np.array([dataframe.iloc[i, 1], dataframe.iloc[i, 2]],),
-                                                            np.array([totalSetOne, totalSetTwo]))
+            dataframe = pd.DataFrame(sampled, columns=fieldNames)
+            dataframe[fieldNames[1:]] = dataframe[fieldNames[1:]].apply(pd.to_numeric)
 
-            # Converts data to format used by the write to CSV function.
-            data.update({"Kmer": dataframe.iloc[i, 0], "Verdict": result, "P-Value": pvalue})
-            dataToWrite.append(data)
+        else:
+            dataframe = handler.convertCSVToDataFrame(filepath)
 
-        handler.writeToCSVNoConvert(["Kmer", "Verdict", "P-Value"], dataToWrite,
-                                    outputFile=outputFile)
+        self.testKmerCounts(dataframe.iloc[:, 0].to_numpy(), dataframe.iloc[:, 1].to_numpy(),
+                            dataframe.iloc[:, 2].to_numpy(), outputFile, correction, significantOutputFile, topK)
+
+    def testProportionsOfTables(self, tableOne, tableTwo, outputFile="hypothesis_test_results", seed="Random",
+                                sample=False, correction=None, significantOutputFile=None, topK=None, union=True):
+        """
+        Performs the same tests as testProportions(), on the k-mers of two KmerCountTables, without writing or reading
+        a CSV file of the counts first. K-mers in only one table are tested with a count of 0 in the other, unless
+        union is False.
+        :param tableOne: The first KmerCountTable.
+        :param tableTwo: The second KmerCountTable.
+        :param outputFile: The name of the output file the user would like.
+        :param seed: As in testProportions().
+        :param sample: As in testProportions().
+        :param correction: As in testProportions().
+        :param significantOutputFile: As in testProportions().
+        :param topK: As in testProportions().
+        :param union: Whether to test the k-mers in either table, rather than only those in both. Default True.
+        :return: Nothing. Produces a file in the Data/output directory.
+        """
+        codes, countsOne, countsTwo = DataUtils().alignTables(tableOne, tableTwo, union)
+
+        if sample and len(codes) > 100:
+            sampled = np.array(self.sampleStream(range(len(codes)), fraction=0.1, seed=seed), dtype=np.int64)
+            codes, countsOne, countsTwo = codes[sampled], countsOne[sampled], countsTwo[sampled]
+        kmers = np.array(SequenceUtils().decodeKmers(codes, tableOne.k), dtype=object)
+
+        self.testKmerCounts(kmers, countsOne, countsTwo, outputFile, correction, significantOutputFile, topK)
+
+    def testKmerCounts(self, kmers, countsOne, countsTwo, outputFile, correction=None, significantOutputFile=None,
+                       topK=None):
+        """
+        Tests the proportions of k-mers in two sets, and writes the results. Used by testProportions() and
+        testProportionsOfTables().
+        :param kmers: Array of the k-mers.
+        :param countsOne: Array of their counts in the first set.
+        :param countsTwo: Array of their counts in the second set.
+        :param outputFile: The name of the output file.
+        :param correction: As in testProportions().
+        :param significantOutputFile: As in testProportions().
+        :param topK: As in testProportions().
+        """
+        self.checkCorrection(correction)
+        handler = FileHandler()
+
+        totalSetOne, totalSetTwo = countsOne.sum(), countsTwo.sum()
+        pValues = self.findProportionPValues(countsOne, countsTwo, totalSetOne, totalSetTwo)
+        bonferroniValues = self.adjustPValues(pValues, "bonferroni")
+        bhValues = self.adjustPValues(pValues, "bh")
+        testedValues = {None: pValues, "bonferroni": bonferroniValues, "bh": bhValues}[correction]
+
+        verdicts = np.where(testedValues <= self.significance, "Result is significant", "Result is not significant")
+        # P-values are written to 6 significant figures, as areProportionsSignificant() rounds them.
+        handler.writeColumnsToCSV(["Kmer", "Verdict", "P-Value", "Bonferroni P-Value", "BH P-Value"],
+                                  [[kmers, verdicts, *([float(f"{p:.6}") for p in values.tolist()]
+                                                       for values in (pValues, bonferroniValues, bhValues))]],
+                                  outputFile=outputFile)
+
+        if significantOutputFile is not None:
+            self.writeSignificantKmers(kmers, pValues, testedValues, significantOutputFile, topK, correction)
 
     def extractSignificantKmers(self, data="hypothesis_test_results_for_mapped_vs_unmapped.csv",
-                                outputFile="significant_kmers.csv"):
+                                outputFile="significant_kmers.csv", correction=None, topK=None):
         """
         Extracts the kmers that have significant difference in their proportions in the sets.
-        :param data: The csv file created by testOnMultipleInstances function above.
+        :param data: The name of the csv file created by testProportions(), in Data/output/csv.
         :param outputFile: The name of the output file the user would like.
+        :param correction: None to select k-mers by their p-values, or "bonferroni" or "bh" to select them by the
+        adjusted p-values.
+        :param topK: The most significant k-mers to write.
         :return: Nothing, but creates file in Data/output directory with the kmer and its p-value.
         """
+        self.checkCorrection(correction)
         handler = FileHandler()
-        dataframe = handler.convertCSVToDataFrame(f"../../Data/output/csv{data}")
-        dataToWrite = []
-
-        for i in range(0, len(dataframe)):
-            if dataframe.iloc[i, 1] == "Result is significant":
-                data = dict()
-                data.update({"Kmer": dataframe.iloc[i, 0], "P-Value": dataframe.iloc[i, 2]})
+        dataframe = handler.convertCSVToDataFrame(handler.getOutputPath(data))
+        pValues = dataframe["P-Value"].to_numpy(dtype=np.float64)
 
-                dataToWrite.append(data)
+        if correction is None:
+            testedValues = pValues
+        else:
+            column = self.correctionColumns[correction]
+            # Results written before the adjusted p-values were added are adjusted here.
+            testedValues = dataframe[column].to_numpy(dtype=np.float64) if column in dataframe \
+                else self.adjustPValues(pValues, correction)
 
-        handler = FileHandler()
-        handler.writeToCSVNoConvert(["Kmer", "P-Value"], dataToWrite, outputFile=outputFile)
+        self.writeSignificantKmers(dataframe.iloc[:, 0].to_numpy(), pValues, testedValues, outputFile, topK,
+                                   correction)
 
     def findHamming(self, sequenceOne, sequenceTwo):
         """
-        Finds the Hamming distance of two sequences. Sequences must be of the same length.
+        Finds the Hamming distance of two sequences. If the sequences are of different lengths, only the length of the
+        shorter one is compared.
         :param sequenceOne: The first sequence.
         :param sequenceTwo: The second sequence.
         :return: The distance.
         """
-        distance = 0
+        # zip() stops at the end of the shorter sequence.
+        return sum(baseOne != baseTwo for baseOne, baseTwo in zip(sequenceOne, sequenceTwo))
+
+    def findHammingOneToMany(self, sequence, sequences, maxDistance=None):
+        """
+        Finds the Hamming distance of one sequence to each of many, with the same rules as findHamming(). Sequences are
+        packed two bits per base, and compared 32 bases at a time with XOR and popcount. Packing does not tell lower
+        case bases from upper case, or other characters from N, so sequences with a character other than upper case
+        A, C, G, T or N are compared with findHamming() instead.
+        :param sequence: The query sequence.
+        :param sequences: List of sequences to compare it to.
+        :param maxDistance: If given, a sequence stops being compared once its distance is over this.
+        :return: Array of the distances. Distances over maxDistance are given as maxDistance + 1.
+        """
+        sequenceUtils = SequenceUtils()
+        packed, nPositions, lengths = sequenceUtils.packSequences(sequences)
+        words = packed.shape[1]
+        query, queryN, queryLength = sequenceUtils.packSequences([sequence], words)
+        masks = sequenceUtils.findLengthMasks(np.minimum(lengths, queryLength[0]), words)
+
+        distances = np.zeros(len(sequences), dtype=np.int64)
+        active = np.arange(len(sequences))
+
+        for word in range(words):
+            mismatches = sequenceUtils.findMismatchedBases(packed[active, word], nPositions[active, word],
+                                                           query[0, word], queryN[0, word], masks[active, word])
+            distances[active] += sequenceUtils.countSetBits(mismatches)
+
+            if maxDistance is not None:
+                # Sequences already over the maximum are dropped, so later words are not compared for them.
+                active = active[distances[active] <= maxDistance]
+
+                if len(active) == 0:
+                    break
+
+        if sequenceUtils.findNonStandardSequences([sequence])[0]:
+            isNonStandard = np.ones(len(sequences), dtype=bool)
+        else:
+            isNonStandard = sequenceUtils.findNonStandardSequences(sequences)
+
+        for index in np.flatnonzero(isNonStandard):
+            distances[index] = self.findHamming(sequence, sequences[index])
+
+        if maxDistance is not None:
+            distances = np.minimum(distances, maxDistance + 1)
+
+        return distances
+
+    def findHammingPairs(self, sequencesOne, sequencesTwo):
+        """
+        Finds the Hamming distance of each pair of sequences at the same position in two lists, with the same rules as
+        findHamming(), using the packed sequences. As in findHammingOneToMany(), pairs with a character other than
+        upper case A, C, G, T or N are compared with findHamming() instead.
+        :param sequencesOne: The first sequence of each pair.
+        :param sequencesTwo: The second sequence of each pair.
+        :return: Array of the distances.
+        """
+        if len(sequencesOne) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        sequenceUtils = SequenceUtils()
+        words = max(1, -(-max(max(map(len, sequencesOne)), max(map(len, sequencesTwo))) // 32))
+        packedOne, nOne, lengthsOne = sequenceUtils.packSequences(sequencesOne, words)
+        packedTwo, nTwo, lengthsTwo = sequenceUtils.packSequences(sequencesTwo, words)
+        masks = sequenceUtils.findLengthMasks(np.minimum(lengthsOne, lengthsTwo), words)
+
+        mismatches = sequenceUtils.findMismatchedBases(packedOne, nOne, packedTwo, nTwo, masks)
+        distances = sequenceUtils.countSetBits(mismatches).sum(axis=1)
+
+        isNonStandard = (sequenceUtils.findNonStandardSequences(sequencesOne) |
+                         sequenceUtils.findNonStandardSequences(sequencesTwo))
+        for index in np.flatnonzero(isNonStandard):
+            distances[index] = self.findHamming(sequencesOne[index], sequencesTwo[index])
+
+        return distances
+
+    def findBandedEditDistance(self, sequenceOne, sequenceTwo, maxDistance):
+        """
+        Finds the edit (Levenshtein) distance of two sequences, if it is no more than maxDistance. Only the cells of the
+        table within maxDistance of the diagonal are filled, and the search stops as soon as every cell in a row is
+        over maxDistance, so distant sequences are rejected quickly.
+        :param sequenceOne: The first sequence.
+        :param sequenceTwo: The second sequence.
+        :param maxDistance: The largest distance of interest.
+        :return: The distance, or maxDistance + 1 if the distance is larger than maxDistance.
+        """
+        lengthOne, lengthTwo = len(sequenceOne), len(sequenceTwo)
+        tooFar = maxDistance + 1
+
+        if abs(lengthOne - lengthTwo) > maxDistance:
+            return tooFar
+
+        if lengthOne == lengthTwo:
+            # The Hamming distance is never less than the edit distance, so it can narrow the band.
+            maxDistance = min(maxDistance, self.findHamming(sequenceOne, sequenceTwo))
+
+        previous = [j if j <= maxDistance else tooFar for j in range(lengthTwo + 1)]
+
+        for i in range(1, lengthOne + 1):
+            current = [tooFar] * (lengthTwo + 1)
+            if i <= maxDistance:
+                current[0] = i
+
+            rowMinimum = current[0]
+            for j in range(max(1, i - maxDistance), min(lengthTwo, i + maxDistance) + 1):
+                substitution = previous[j - 1] + (sequenceOne[i - 1] != sequenceTwo[j - 1])
+                value = min(substitution, previous[j] + 1, current[j - 1] + 1, tooFar)
+                current[j] = value
 
-        for i, _ in enumerate(sequenceOne):
-            try:
-                # If the characters at the same position are the same, then they have a distacne of 0.
-                if sequenceOne[i] == sequenceTwo[i]:
-                    continue
+                if value < rowMinimum:
+                    rowMinimum = value
 
-                else:
-                    # If not, then the distance is incremented
-                    distance += 1
+            if rowMinimum > maxDistance:
+                return tooFar
 
-            except IndexError:
-                # If the end of one of the sequences is found, then an Index Error is raised. This provides robustness
-                # for the program.
-                return distance
+            previous = current
 
-        return distance
+        return min(previous[lengthTwo], tooFar)
@@ -0,0 +1,216 @@
+import os
+from itertools import islice
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+class TableFormatUtils:
+    """
+    Reads and writes the tables of results in one of three formats: CSV, Parquet, or Arrow IPC. Parquet and Arrow
+    tables have typed columns, so numbers are stored as binary rather than text, and are loaded without being parsed.
+    Parquet files are compressed, and Arrow files are memory mapped when they are read. Both need pyarrow.
+    """
+
+    # The extension of the files of each format.
+    extensions = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+    def __init__(self, tableFormat="csv", chunkSize=100000):
+        """
+        Initialises the class
+        :param tableFormat: The format to write tables in: csv, parquet or arrow.
+        :param chunkSize: The number of rows to convert into columns at a time when writing rows.
+        """
+        if tableFormat not in self.extensions:
+            raise ValueError(f"Table format must be one of {', '.join(self.extensions)}, not {tableFormat}.")
+
+        self.tableFormat = tableFormat
+        self.chunkSize = chunkSize
+
+    def checkPyarrow(self, tableFormat):
+        """
+        Raises an ImportError if a format needs pyarrow, and it is not installed.
+        :param tableFormat: The format.
+        """
+        if tableFormat != "csv" and pa is None:
+            raise ImportError(f"Tables in {tableFormat} format need pyarrow. Please install it using "
+                              f"'pip install pyarrow', or use csv.")
+
+    def findFormat(self, filepath):
+        """
+        Finds the format of a table from its extension.
+        :param filepath: The table file.
+        :return: The format, or None if the extension is not of a table.
+        """
+        for tableFormat, extension in self.extensions.items():
+            if filepath.endswith(extension):
+                return tableFormat
+
+        return None
+
+    def removeExtension(self, filepath):
+        """
+        :param filepath: A table file, or name of one.
+        :return: The filepath without its table extension, if it has one.
+        """
+        tableFormat = self.findFormat(filepath)
+        if tableFormat is None:
+            return filepath
+
+        return filepath[:-len(self.extensions[tableFormat])]
+
+    def findTableFile(self, filepath):
+        """
+        Finds a table, if it was written in a different format to the one its path is given in. This lets results
+        written as Parquet or Arrow be read by functions that are given the name of the CSV file.
+        :param filepath: The path of the table.
+        :return: The path if it exists, or the path of the same table in another format if that exists, or the path.
+        """
+        if os.path.exists(filepath):
+            return filepath
+
+        basePath = self.removeExtension(filepath)
+        for extension in self.extensions.values():
+            if os.path.exists(f"{basePath}{extension}"):
+                return f"{basePath}{extension}"
+
+        return filepath
+
+    def makeTable(self, fieldNames, columns, schema=None):
+        """
+        Converts columns into a pyarrow table. NumPy arrays keep their types, so uint and float32 columns stay as they
+        are, and NaN is stored as a missing value.
+        :param fieldNames: The names of the columns.
+        :param columns: A list of columns, each a NumPy array or a list of values.
+        :param schema: The schema to convert the columns to, so that every chunk of a file has the same types. If
+        None, the types are found from the values. A column with no values is given floats, and a column of mixed
+        values is given strings.
+        :return: The table.
+        """
+        if schema is not None:
+            return pa.Table.from_arrays([pa.array(column, type=field.type, from_pandas=True)
+                                         for column, field in zip(columns, schema)], schema=schema)
+
+        arrays = []
+        for column in columns:
+            try:
+                array = pa.array(column, from_pandas=True)
+
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                array = pa.array([None if value is None else str(value) for value in column])
+
+            arrays.append(array.cast(pa.float64()) if pa.types.is_null(array.type) else array)
+
+        return pa.Table.from_arrays(arrays, names=list(fieldNames))
+
+    def openWriter(self, filepath, schema):
+        """
+        :param filepath: The file to write.
+        :param schema: The schema of the table.
+        :return: A writer of the table, in the format of this class, with a write_table() function.
+        """
+        if self.tableFormat == "parquet":
+            return pq.ParquetWriter(filepath, schema)
+
+        # Arrow files are left uncompressed, so they can be memory mapped when read.
+        return pa.ipc.new_file(filepath, schema)
+
+    def writeRows(self, filepath, fieldNames, rows):
+        """
+        Writes an iterable of rows to a Parquet or Arrow file, converting a chunk of rows into columns at a time, so
+        the rows are never all held in memory.
+        :param filepath: The file to write.
+        :param fieldNames: The names of the columns.
+        :param rows: An iterable of rows, each with a value for every column.
+        """
+        rows = iter(rows)
+        chunks = iter(lambda: list(islice(rows, self.chunkSize)), [])
+
+        self.writeColumns(filepath, fieldNames, (list(zip(*chunk)) for chunk in chunks))
+
+    def writeColumns(self, filepath, fieldNames, batches):
+        """
+        Writes batches of columns to a Parquet or Arrow file, a batch at a time. The types of the first batch are used
+        for the whole file.
+        :param filepath: The file to write.
+        :param fieldNames: The names of the columns.
+        :param batches: An iterable of batches, each a list with a column for every field, as NumPy arrays or lists.
+        """
+        self.checkPyarrow(self.tableFormat)
+
+        batches = iter(batches)
+        table = self.makeTable(fieldNames, next(batches, [[] for _ in fieldNames]))
+
+        with self.openWriter(filepath, table.schema) as writer:
+            writer.write_table(table)
+
+            for batch in batches:
+                writer.write_table(self.makeTable(fieldNames, batch, table.schema))
+
+    def writeDataFrame(self, filepath, dataframe):
+        """
+        Writes a dataframe in the format of this class.
+        :param filepath: The file to write.
+        :param dataframe: The dataframe.
+        """
+        if self.tableFormat == "csv":
+            dataframe.to_csv(filepath, index=False)
+            return
+
+        self.checkPyarrow(self.tableFormat)
+        table = pa.Table.from_pandas(dataframe, preserve_index=False)
+
+        with self.openWriter(filepath, table.schema) as writer:
+            writer.write_table(table)
+
+    def readDataFrame(self, filepath, columns=None):
+        """
+        Reads a table of any of the formats into a dataframe. The format is found from the extension, and is CSV if the
+        extension is not of a table.
+        :param filepath: The table file.
+        :param columns: The columns to read. All columns if None.
+        :return: The dataframe.
+        """
+        tableFormat = self.findFormat(filepath) or "csv"
+        self.checkPyarrow(tableFormat)
+
+        if tableFormat == "parquet":
+            return pq.read_table(filepath, columns=columns).to_pandas()
+
+        if tableFormat == "arrow":
+            with pa.memory_map(filepath) as source:
+                table = pa.ipc.open_file(source).read_all()
+                return (table if columns is None else table.select(columns)).to_pandas()
+
+        return pd.read_csv(filepath, usecols=columns)
+
+    def iterDataFrames(self, filepath, columns=None, chunkSize=1000000, **csvOptions):
+        """
+        Reads a table of any of the formats a chunk of rows at a time, so large tables need not fit in memory.
+        :param filepath: The table file.
+        :param columns: The columns to read. All columns if None.
+        :param chunkSize: The number of rows in each chunk.
+        :param csvOptions: Options passed to pd.read_csv() if the table is a CSV file.
+        :return: Yields a dataframe of each chunk.
+        """
+        tableFormat = self.findFormat(filepath) or "csv"
+        self.checkPyarrow(tableFormat)
+
+        if tableFormat == "parquet":
+            for batch in pq.ParquetFile(filepath).iter_batches(chunkSize, columns=columns):
+                yield batch.to_pandas()
+
+        elif tableFormat == "arrow":
+            with pa.memory_map(filepath) as source:
+                reader = pa.ipc.open_file(source)
+                for index in range(reader.num_record_batches):
+                    batch = reader.get_batch(index)
+                    yield (batch if columns is None else batch.select(columns)).to_pandas()
+
+        else:
+            yield from pd.read_csv(filepath, usecols=columns, chunksize=chunkSize, **csvOptions)